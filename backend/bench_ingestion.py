@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Tag Ingestion (per-tag vs batch)
+===========================================
+
+เปรียบเทียบ process_tags_to_db_per_tag กับ process_tags_to_db_batch
+ที่ขนาด batch 10, 100 และ 1,000 tags กับฐานข้อมูลที่ตั้งค่าไว้ใน .env
+
+แต่ละขนาดจะวัด 2 รอบ:
+1. ENTER: tag ใหม่ทั้งหมด (INSERT tags/movements/notifications)
+2. EXIT: tag เดิมถูกอ่านซ้ำที่ location เดิม (UPDATE + movement)
+
+ข้อมูลทดสอบใช้ tag_id ขึ้นต้นด้วย BENCH และถูกลบออกหลังวัดผลเสร็จ
+
+การใช้งาน:
+    python bench_ingestion.py
+    python bench_ingestion.py --sizes 10 100 1000 --location-id 1 --device-id 1
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# เพิ่ม path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config.database import get_db_connection
+import routers.scan as scan
+
+class _CountingCursor:
+    """ห่อ cursor เพื่อนับจำนวน statement ที่ส่งไปยังฐานข้อมูล"""
+
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter[0] += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._counter[0] += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class _CountingConnection:
+    def __init__(self, conn, counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._conn.cursor(*args, **kwargs), self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def _cleanup(prefix: str):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM movements WHERE tag_id LIKE %s", (f"{prefix}%",))
+        cur.execute("DELETE FROM notifications WHERE type = 'movement' AND message LIKE %s", (f"Tag {prefix}%",))
+        cur.execute("DELETE FROM tags WHERE tag_id LIKE %s", (f"{prefix}%",))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+def _authorize(prefix: str):
+    """ตั้ง authorized=1 เพื่อไม่ให้รอบ EXIT สร้าง alert จริง"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("UPDATE tags SET authorized = 1 WHERE tag_id LIKE %s", (f"{prefix}%",))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+def _run(fn, session, tags):
+    counter = [0]
+    scan.get_db_connection = lambda *args: _CountingConnection(get_db_connection(*args), counter)
+    try:
+        session.last_db_update_time.clear()
+        start = time.perf_counter()
+        fn(session, tags)
+        elapsed = time.perf_counter() - start
+    finally:
+        scan.get_db_connection = get_db_connection
+    return elapsed, counter[0]
+
+def bench(sizes, location_id: int, device_id: int):
+    session = scan.DeviceSession()
+    session.device_id = device_id
+    session.location_id = location_id
+
+    # DELAY_SECONDS ถูกอ่านทุก batch ทั้งสองโหมด - ตัดออกเพื่อวัดเฉพาะส่วน ingestion
+    scan.get_device_config = lambda *_args, **_kwargs: 0
+    # รอบ exit ตามหลังรอบ enter ทันที - ปิด flap_guard ไม่ให้กัน
+    scan.flap_guard.min_dwell = 0
+    scan.flap_guard.max_per_minute = 0
+
+    modes = [
+        ("per-tag", scan.process_tags_to_db_per_tag),
+        ("batch", scan.process_tags_to_db_batch),
+    ]
+
+    print(f"{'size':>6} {'mode':>8} {'phase':>6} {'seconds':>10} {'tags/s':>10} {'statements':>11}")
+    for size in sizes:
+        for mode, fn in modes:
+            prefix = f"BENCH{mode[0].upper()}{size:05d}"
+            tags = {f"{prefix}{i:08X}" for i in range(size)}
+            _cleanup(prefix)
+            try:
+                enter_s, enter_n = _run(fn, session, tags)
+                _authorize(prefix)
+                exit_s, exit_n = _run(fn, session, tags)
+            finally:
+                _cleanup(prefix)
+            for phase, secs, stmts in (("enter", enter_s, enter_n), ("exit", exit_s, exit_n)):
+                rate = size / secs if secs else 0.0
+                print(f"{size:>6} {mode:>8} {phase:>6} {secs:>10.4f} {rate:>10.0f} {stmts:>11}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-tag vs batch ingestion")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--location-id", type=int, default=1, help="location ของเครื่องอ่านจำลอง (1 หรือ 2)")
+    parser.add_argument("--device-id", type=int, default=1, help="device_id ที่มีอยู่ใน rfid_devices")
+    args = parser.parse_args()
+    bench(args.sizes, args.location_id, args.device_id)
@@ -4,11 +4,13 @@ Config package for RFID Management System
 from .settings import settings, Settings
 from .database import (
     engine, SessionLocal, Base, get_db, get_db_connection,
-    init_database, check_db_connection
+    init_database, check_db_connection, is_connection_error,
+    get_pool_stats, POOL_INGESTION, POOL_INTERACTIVE, POOL_BACKGROUND
 )
 
 __all__ = [
     'settings', 'Settings',
     'engine', 'SessionLocal', 'Base', 'get_db', 'get_db_connection',
-    'init_database', 'check_db_connection'
+    'init_database', 'check_db_connection', 'is_connection_error',
+    'get_pool_stats', 'POOL_INGESTION', 'POOL_INTERACTIVE', 'POOL_BACKGROUND'
 ]
\ No newline at end of file
@@ -6,6 +6,9 @@ from .settings import settings, get_database_url, is_sqlite
 import sqlite3
 import mysql.connector
 import logging
+import threading
+import time
+from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -33,8 +36,8 @@ def create_db_engine():
             echo=settings.db_echo,
             pool_size=settings.db_pool_size,
             max_overflow=settings.db_max_overflow,
-            pool_pre_ping=True,
-            pool_recycle=3600,
+            pool_pre_ping=settings.db_pool_pre_ping,
+            pool_recycle=settings.db_pool_recycle,
         )
     
     logger.info(f"Database engine created for: {DATABASE_URL}")
@@ -55,8 +58,316 @@ def get_db():
     finally:
         db.close()
 
-def get_db_connection():
-    """Get direct database connection (for legacy code compatibility)"""
+def _connect_mysql():
+    """เปิด MySQL connection ใหม่ (TCP + auth) - ใช้โดย connection pool"""
+    try:
+        # Parse connection details from URL or use individual settings
+        if hasattr(settings, 'mysql_host'):
+            return mysql.connector.connect(
+                host=settings.mysql_host,
+                port=settings.mysql_port,
+                user=settings.mysql_user,
+                password=settings.mysql_password,
+                database=settings.mysql_database,
+                charset=settings.mysql_charset,
+                autocommit=False
+            )
+        # Parse from URL (more complex, fallback)
+        import urllib.parse as urlparse
+        parsed = urlparse.urlparse(settings.database_url)
+        return mysql.connector.connect(
+            host=parsed.hostname,
+            port=parsed.port or 3306,
+            user=parsed.username,
+            password=parsed.password,
+            database=parsed.path.lstrip('/'),
+            charset='utf8mb4',
+            autocommit=False
+        )
+    except mysql.connector.Error as e:
+        logger.error(f"MySQL connection failed: {e}")
+        raise
+
+class PooledConnection:
+    """
+    ตัวห่อ connection ที่ยืมจาก ConnectionPool
+
+    ใช้แทน connection ปกติได้ทุกเมธอด (cursor/commit/rollback/...) แต่ close() จะคืน connection เข้า pool
+    """
+
+    def __init__(self, pool: "ConnectionPool", raw, created_at: float):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise mysql.connector.errors.ProgrammingError("Connection already returned to pool")
+        return getattr(raw, name)
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw, self._created_at)
+
+    def __del__(self):
+        # ผู้เรียกลืม close(): สถานะ transaction ไม่แน่นอน จึงปิดทิ้งแทนการคืนเข้า pool
+        raw = self.__dict__.get("_raw")
+        if raw is not None:
+            self._raw = None
+            self._pool._discard(raw)
+
+class OverflowBudget:
+    """
+    โควต้า connection ส่วนเกิน (overflow) ที่หลาย pool ใช้ร่วมกัน
+
+    priority เลขน้อย = สำคัญกว่า: pool จะได้ overflow ก็ต่อเมื่อไม่มี pool ที่สำคัญกว่ารอ connection อยู่
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(0, int(limit))
+        self.used = 0
+        self._waiting: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, priority: int) -> bool:
+        with self._lock:
+            if self.used >= self.limit:
+                return False
+            if any(count for p, count in self._waiting.items() if p < priority):
+                return False
+            self.used += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.used = max(0, self.used - 1)
+
+    def add_waiter(self, priority: int, delta: int = 1):
+        with self._lock:
+            self._waiting[priority] = self._waiting.get(priority, 0) + delta
+
+class ConnectionPool:
+    """
+    Connection pool ของ MySQL (thread-safe)
+
+    - size: จำนวน connection ที่เก็บไว้ใน pool
+    - max_overflow: จำนวน connection ที่เปิดเพิ่มได้ชั่วคราวเมื่อ pool ไม่พอ (ปิดทิ้งเมื่อคืน)
+      หรือ overflow: OverflowBudget ที่ใช้ร่วมกับ pool อื่นตาม priority
+    - timeout: เวลารอสูงสุดเมื่อ connection ถูกยืมหมด (วินาที) เกินแล้วโยน PoolError
+    - pre_ping: ping connection ก่อนส่งให้ผู้ยืม ถ้าหลุดจะเปิดใหม่ให้
+    - max_lifetime: อายุสูงสุดของ connection (วินาที) เกินแล้วปิดและเปิดใหม่
+    connection ที่ว่างถูกใช้แบบ LIFO (connection ที่เพิ่งใช้ยัง warm อยู่)
+    """
+
+    def __init__(self, connect_fn, size: int = 10, max_overflow: int = 20, timeout: float = 30.0,
+                 pre_ping: bool = True, max_lifetime: float = 3600.0, name: str = "default",
+                 priority: int = 0, overflow: Optional[OverflowBudget] = None):
+        self._connect = connect_fn
+        self.name = name
+        self.priority = priority
+        self.size = max(1, int(size))
+        self.overflow = overflow if overflow is not None else OverflowBudget(max_overflow)
+        self._overflow_open = 0  # จำนวน connection ที่เปิดจากโควต้า overflow
+        self.peak_in_use = 0
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.max_lifetime = max_lifetime
+        self._idle = []   # [(raw, created_at)]
+        self._open = 0    # จำนวน connection ที่เปิดอยู่ทั้งหมด (ว่าง + ถูกยืม)
+        self._cond = threading.Condition()
+        self.checkouts = 0
+        self.created = 0
+        self.closed = 0
+        self.ping_failures = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def connect(self) -> PooledConnection:
+        """ยืม connection (คืนด้วย close())"""
+        started = None
+        with self._cond:
+            try:
+                while True:
+                    if self._idle:
+                        raw, created_at = self._idle.pop()
+                        break
+                    if self._open < self.size:
+                        self._open += 1
+                        raw = None
+                        break
+                    if self.overflow.acquire(self.priority):
+                        self._open += 1
+                        self._overflow_open += 1
+                        raw = None
+                        break
+                    if started is None:
+                        started = time.perf_counter()
+                        self.waits += 1
+                        self.overflow.add_waiter(self.priority)
+                    remaining = self.timeout - (time.perf_counter() - started)
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        self.wait_seconds += self.timeout
+                        self.max_wait_seconds = max(self.max_wait_seconds, self.timeout)
+                        raise mysql.connector.errors.PoolError(
+                            f"Connection pool '{self.name}' exhausted ({self._open} open) after waiting {self.timeout}s"
+                        )
+                    # overflow ว่างได้จาก pool อื่นโดยไม่มี notify จึงตรวจซ้ำเป็นระยะ
+                    self._cond.wait(min(remaining, 0.05))
+            finally:
+                if started is not None:
+                    self.overflow.add_waiter(self.priority, -1)
+            if started is not None:
+                waited = time.perf_counter() - started
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            self.checkouts += 1
+            self.peak_in_use = max(self.peak_in_use, self._open - len(self._idle))
+
+        if raw is not None:
+            expired = self.max_lifetime and time.time() - created_at > self.max_lifetime
+            if expired or (self.pre_ping and not self._ping(raw)):
+                self._close_raw(raw)
+                raw = None
+        if raw is None:
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._cond:
+                    self._forget_one()
+                raise
+            created_at = time.time()
+            self.created += 1
+        return PooledConnection(self, raw, created_at)
+
+    def _ping(self, raw) -> bool:
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            self.ping_failures += 1
+            return False
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        self.closed += 1
+
+    def _release(self, raw, created_at: float):
+        try:
+            # ทิ้ง transaction ที่ผู้ยืมไม่ได้ commit
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+        with self._cond:
+            if not self._overflow_open and not (self.max_lifetime and time.time() - created_at > self.max_lifetime):
+                self._idle.append((raw, created_at))
+                self._cond.notify()
+                return
+            self._forget_one()
+        self._close_raw(raw)
+
+    def _discard(self, raw):
+        self._close_raw(raw)
+        with self._cond:
+            self._forget_one()
+
+    def _forget_one(self):
+        """นับว่า connection หนึ่งถูกปิด คืนโควต้า overflow ก่อน (เรียกภายใต้ lock)"""
+        self._open -= 1
+        if self._overflow_open:
+            self._overflow_open -= 1
+            self.overflow.release()
+        self._cond.notify()
+
+    def dispose(self):
+        """ปิด connection ที่ว่างทั้งหมด (connection ที่ถูกยืมอยู่จะถูกปิดเมื่อคืน)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            for _ in idle:
+                self._forget_one()
+        for raw, _created_at in idle:
+            self._close_raw(raw)
+
+    def stats(self) -> dict:
+        with self._cond:
+            idle = len(self._idle)
+            open_ = self._open
+        in_use = open_ - idle
+        return {
+            "priority": self.priority,
+            "size": self.size,
+            "open": open_,
+            "idle": idle,
+            "in_use": in_use,
+            "peak_in_use": self.peak_in_use,
+            "overflow_in_use": self._overflow_open,
+            # > 1.0 = ใช้ overflow อยู่
+            "saturation": round(in_use / self.size, 3),
+            "checkouts": self.checkouts,
+            "created": self.created,
+            "closed": self.closed,
+            "ping_failures": self.ping_failures,
+            "waits": self.waits,
+            "wait_seconds_total": round(self.wait_seconds, 4),
+            "wait_seconds_max": round(self.max_wait_seconds, 4),
+            "timeouts": self.timeouts,
+        }
+
+# ชื่อ pool: งานแต่ละกลุ่มมี connection ของตัวเอง รายงานหนักๆ จึงไม่แย่ง connection ของการเขียนผลสแกน
+POOL_INGESTION = "ingestion"      # เขียนผลสแกน / replay spool
+POOL_INTERACTIVE = "interactive"  # API ที่ผู้ใช้เรียก (ค่าเริ่มต้น)
+POOL_BACKGROUND = "background"    # งานเบื้องหลัง เช่นโหลดแคช, reload กฎ
+# priority ของการใช้ overflow ร่วมกัน (เลขน้อยได้ก่อน)
+POOL_PRIORITIES = {POOL_INGESTION: 0, POOL_INTERACTIVE: 1, POOL_BACKGROUND: 2}
+
+_mysql_pools: Dict[str, "ConnectionPool"] = {}
+_mysql_pool_lock = threading.Lock()
+
+def _pool_size(name: str) -> int:
+    if name == POOL_INGESTION:
+        return settings.db_ingestion_pool_size
+    if name == POOL_BACKGROUND:
+        return settings.db_background_pool_size
+    return settings.db_pool_size
+
+def get_connection_pool(name: str = POOL_INTERACTIVE) -> "ConnectionPool":
+    if name not in POOL_PRIORITIES:
+        raise ValueError(f"Unknown connection pool: {name}")
+    pool = _mysql_pools.get(name)
+    if pool is None:
+        with _mysql_pool_lock:
+            if not _mysql_pools:
+                overflow = OverflowBudget(settings.db_max_overflow)
+                for pool_name, priority in POOL_PRIORITIES.items():
+                    _mysql_pools[pool_name] = ConnectionPool(
+                        _connect_mysql,
+                        size=_pool_size(pool_name),
+                        timeout=settings.db_pool_timeout,
+                        pre_ping=settings.db_pool_pre_ping,
+                        max_lifetime=settings.db_pool_recycle,
+                        name=pool_name,
+                        priority=priority,
+                        overflow=overflow,
+                    )
+            pool = _mysql_pools[name]
+    return pool
+
+def get_db_connection(pool: str = POOL_INTERACTIVE):
+    """
+    Get direct database connection (for legacy code compatibility)
+
+    MySQL: ยืม connection จาก pool ตามชื่อ (ingestion / interactive / background)
+    close() คืน connection เข้า pool
+    """
     if is_sqlite():
         # SQLite connection
         db_path = settings.database_url.replace("sqlite:///", "")
@@ -65,40 +376,36 @@ def get_db_connection():
         return conn
     
     elif settings.database_url.startswith("mysql"):
-        # MySQL connection
-        try:
-            # Parse connection details from URL or use individual settings
-            if hasattr(settings, 'mysql_host'):
-                conn = mysql.connector.connect(
-                    host=settings.mysql_host,
-                    port=settings.mysql_port,
-                    user=settings.mysql_user,
-                    password=settings.mysql_password,
-                    database=settings.mysql_database,
-                    charset=settings.mysql_charset,
-                    autocommit=False
-                )
-            else:
-                # Parse from URL (more complex, fallback)
-                import urllib.parse as urlparse
-                parsed = urlparse.urlparse(settings.database_url)
-                conn = mysql.connector.connect(
-                    host=parsed.hostname,
-                    port=parsed.port or 3306,
-                    user=parsed.username,
-                    password=parsed.password,
-                    database=parsed.path.lstrip('/'),
-                    charset='utf8mb4',
-                    autocommit=False
-                )
-            return conn
-        except mysql.connector.Error as e:
-            logger.error(f"MySQL connection failed: {e}")
-            raise
+        # MySQL connection (pooled)
+        return get_connection_pool(pool).connect()
     
     else:
         raise NotImplementedError(f"Direct connection not implemented for: {settings.database_url}")
 
+def get_pool_stats() -> dict:
+    """ตัวชี้วัดของแต่ละ connection pool (ว่างถ้ายังไม่ได้สร้าง)"""
+    pools = dict(_mysql_pools)
+    stats = {name: pool.stats() for name, pool in pools.items()}
+    if pools:
+        overflow = next(iter(pools.values())).overflow
+        stats["overflow"] = {"limit": overflow.limit, "used": overflow.used}
+    return stats
+
+# client errno ที่หมายถึงติดต่อ server ไม่ได้ (ไม่ว่าจะถูกห่อด้วย exception class ใด)
+# 2002/2003: เชื่อมต่อไม่ได้, 2006: server has gone away, 2013: lost connection, 2055: lost connection (I/O)
+CONNECTION_ERRNOS = {2002, 2003, 2006, 2013, 2055}
+
+def is_connection_error(exc: Exception) -> bool:
+    """
+    True ถ้า exception เกิดจากฐานข้อมูลใช้งานไม่ได้ (ไม่ใช่ข้อผิดพลาดของ SQL/ข้อมูล)
+
+    รวม PoolError (ยืม connection ไม่ได้ภายใน timeout เพราะ DB ช้า/ค้าง) และ errno ใน CONNECTION_ERRNOS
+    """
+    if isinstance(exc, (mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError,
+                        mysql.connector.errors.PoolError)):
+        return True
+    return isinstance(exc, mysql.connector.Error) and getattr(exc, "errno", None) in CONNECTION_ERRNOS
+
 def init_database():
     """Initialize database tables"""
     try:
@@ -7,8 +7,13 @@ class Settings(BaseSettings):
     # Database
     database_url: str = "sqlite:///./rfid_system.db"
     db_echo: bool = False
-    db_pool_size: int = 10
-    db_max_overflow: int = 20
+    db_pool_size: int = 10  # connection ของ pool interactive (API ที่ผู้ใช้เรียก)
+    db_max_overflow: int = 20  # connection ส่วนเกินที่ทุก pool ใช้ร่วมกัน (ingestion ได้ก่อน)
+    db_ingestion_pool_size: int = 8  # connection ของ pool ingestion (เขียนผลสแกน)
+    db_background_pool_size: int = 2  # connection ของ pool background (โหลดแคช/reload กฎ)
+    db_pool_timeout: float = 30.0  # เวลารอ connection สูงสุดเมื่อ pool ถูกยืมหมด (วินาที)
+    db_pool_pre_ping: bool = True  # ping connection ก่อนส่งให้ผู้ยืม (เปิดใหม่ถ้าหลุด)
+    db_pool_recycle: int = 3600  # อายุสูงสุดของ connection ใน pool (วินาที)
     
     # MySQL specific settings (ถ้าไม่ใช้ DATABASE_URL)
     mysql_host: str = "127.0.0.1"
@@ -24,6 +29,10 @@ class Settings(BaseSettings):
     # WebSocket
     ws_port: int = 8000
     ws_host: str = "0.0.0.0"
+    ws_client_queue_size: int = 256  # จำนวน frame สดที่ค้างได้ต่อ client (เต็มแล้วรวม/ทิ้ง frame เก่าสุด แล้วแจ้ง snapshot_required)
+    ws_send_timeout: float = 5.0  # ส่ง frame หนึ่งให้ client นานเกินกี่วินาทีถือว่าค้าง (ตัดการเชื่อมต่อ)
+    ws_batch_window: float = 0.1  # client ที่ขอ batch (?batch=1) ได้รับ frame รวมทุกกี่วินาที (0 = ปิดโหมด batch)
+    ws_replay_size: int = 2000  # จำนวน broadcast ล่าสุดที่เก็บไว้ส่งซ้ำให้ client ที่ resume (?resume=<seq>) - replay ได้โควตาคิวแยกจาก ws_client_queue_size
     
     # Security
     secret_key: str = "your-secret-key-change-in-production"
@@ -39,6 +48,33 @@ class Settings(BaseSettings):
     scanner_baudrate: int = 115200
     scanner_timeout: int = 5
     scanner_auto_reconnect: bool = True
+    scan_batch_ingestion: bool = True  # ประมวลผล tags ทั้ง batch ด้วย set-based SQL
+    tag_cache_max_entries: int = 2000000  # จำนวน tag สูงสุดในแคชสถานะ (LRU)
+    ingestion_workers: int = 4  # จำนวน worker ที่เขียนผลสแกนลงฐานข้อมูล
+    scan_ring_capacity: int = 8192  # จำนวน read record ใน shared-memory ring ต่อเครื่อง
+    scan_streaming: bool = True  # เปิด inventory ค้างไว้และส่งผลเป็น micro-batch
+    scan_flush_interval: float = 0.1  # ระยะเวลาสูงสุดของ micro-batch (วินาที)
+    scan_flush_max_records: int = 256  # จำนวน tag สูงสุดต่อ micro-batch
+    scan_min_rssi: Optional[float] = None  # ตัด tag ที่ RSSI สูงสุดต่ำกว่าค่านี้ (dBm)
+    scan_min_read_count: int = 1  # ตัด tag ที่อ่านเจอน้อยกว่านี้ต่อ window
+    scan_edge_debounce: bool = True  # กรอง tag ที่ report แล้วภายใน DELAY_SECONDS ตั้งแต่ใน subprocess
+    scan_keepalive_interval: float = 2.0  # ช่วงเวลาส่งสรุป tag ที่ยังอยู่ในพื้นที่ (วินาที)
+    presence_ttl: float = 10.0  # tag ที่ไม่เห็นเกินกี่วินาทีถือว่าออกจากพื้นที่ของเครื่อง (โหมด absence ใช้ ABSENCE_TIMEOUT)
+    presence_max_tags: int = 100000  # จำนวน tag สูงสุดใน presence index ต่อเครื่อง
+    scan_exit_mode: str = "absence"  # absence = EXIT เมื่อหายไปเกิน ABSENCE_TIMEOUT, toggle = สลับเข้า/ออกทุก DELAY_SECONDS
+    absence_timeout: float = 30.0  # ค่าเริ่มต้นของ ABSENCE_TIMEOUT (วินาที) ถ้าไม่ได้ตั้งใน system_config/device_configs
+    scan_arbitration_window: float = 0.3  # รวม read จากทุกเครื่องกี่วินาทีก่อนเลือกเครื่องที่ tag อยู่ (0 = ตัดสินทันที)
+    scan_arbitration_count_weight: float = 3.0  # คะแนน (dB) ต่อจำนวนครั้งที่อ่านเพิ่มเป็น 2 เท่า
+    scan_min_dwell: float = 5.0  # tag ต้องอยู่ที่ตำแหน่งเดิมกี่วินาทีก่อนย้ายได้อีก (0 = ไม่จำกัด)
+    scan_max_transitions_per_minute: int = 6  # จำนวนการเปลี่ยนตำแหน่งสูงสุดต่อ tag ต่อนาที (0 = ไม่จำกัด)
+    scan_spool_enabled: bool = True  # เก็บผลสแกนลง spool บนดิสก์ (data/spool) เมื่อ DB ใช้งานไม่ได้
+    scan_spool_max_mb: int = 512  # ขนาดรวมสูงสุดของ spool (MB) เกินแล้ว batch ใหม่จะถูกทิ้ง
+    scan_spool_segment_mb: int = 16  # ขนาดต่อไฟล์ segment (MB)
+    scan_spool_fsync_interval: float = 0.2  # fsync ข้อมูลใน spool ทุกกี่วินาที
+    scan_spool_replay_rate: float = 200.0  # จำนวน batch สูงสุดที่ replay ลง DB ต่อวินาที
+    scan_notification_window: float = 0.25  # รวม movement notification กี่วินาทีก่อนเขียน/broadcast เป็นชุด (0 = ทีละรายการ)
+    scan_notification_max_batch: int = 500  # จำนวน notification สูงสุดต่อ INSERT / WebSocket frame
+    runtime_config_refresh: float = 60.0  # โหลด system_config/device_configs ใหม่ทุกกี่วินาที (รับค่าที่แก้จากที่อื่น, 0 = ไม่ refresh)
     
     # Logging
     log_level: str = "INFO"
@@ -8,19 +8,19 @@ RFID Device Scanner Service - บริการสแกน RFID แบบ Stan
 โครงสร้างการทำงาน:
 1. DeviceScannerService: คลาสหลักที่จัดการการเชื่อมต่อและการสแกน
 2. run_device_scanner(): Entry point สำหรับการรัน subprocess
-3. การสื่อสารระหว่าง process ผ่าน Queue
+3. การสื่อสารระหว่าง process ผ่าน shared-memory ring (ผลสแกน) และ Queue (คำสั่ง)
 
 คุณสมบัติหลัก:
 - เชื่อมต่อผ่าน COM port หรือ Network
 - สแกน RFID tags อย่างต่อเนื่อง
-- ส่งผลลัพธ์กลับไป main process ผ่าน Queue
+- ส่งผลลัพธ์กลับไป main process ผ่าน ReadRing (record ขนาดคงที่ ไม่ต้อง pickle)
 - รองรับการรับคำสั่งจาก main process
 - ดึง Serial Number จริงของอุปกรณ์
 
 การใช้งาน:
 - ถูกเรียกใช้จาก main process ผ่าน multiprocessing
 - แต่ละอุปกรณ์จะมี process แยกกัน
-- สื่อสารผ่าน result_queue และ cmd_queue
+- ผลสแกนผ่าน ReadRing, คำสั่งผ่าน cmd_queue และคำตอบผ่าน reply_queue
 """
 
 import sys
@@ -33,9 +33,24 @@ from uhf.struct import TagInfo, GetDeviceInfo as GDI_Struct
 from ctypes import c_void_p, c_byte, pointer
 import argparse
 import queue as _queue
+from scan_transport import (
+    ReadRing, ReadAggregator, merge_reads, EPC_MAX_BYTES, FLAG_KEEPALIVE,
+    STATE_CONNECTED, STATE_CONNECTION_FAILED, STATE_STOPPED,
+)
 
 logger = logging.getLogger(__name__)
 
+# ค่าที่เปลี่ยนได้ระหว่างทำงานผ่านคำสั่ง update_config (ไม่ต้อง restart subprocess)
+RUNTIME_CONFIG_FIELDS = {
+    'scan_interval': float,
+    'db_update_interval': float,
+    'report_window': float,
+    'flush_interval': float,
+    'keepalive_interval': float,
+}
+# คำสั่งที่ไม่ต้องใช้เครื่อง - โหมด streaming ไม่ต้องหยุด inventory
+LOCAL_COMMANDS = {'update_config'}
+
 class DeviceScannerService:
     """
     คลาสสำหรับจัดการการสแกน RFID ของอุปกรณ์หนึ่งเครื่อง
@@ -49,8 +64,11 @@ class DeviceScannerService:
         hComm: Handle ของการเชื่อมต่อ
         is_connected: สถานะการเชื่อมต่อ
         running: สถานะการทำงานของ service
-        scan_interval: ช่วงเวลาระหว่างการสแกน (วินาที)
+        scan_interval: ช่วงเวลาระหว่างการสแกน (วินาที, โหมด cycle)
         db_update_interval: ช่วงเวลาการอัพเดตฐานข้อมูล (วินาที)
+        streaming: เปิด inventory ค้างไว้และส่งผลเป็น micro-batch
+        flush_interval / flush_max_records: เงื่อนไข flush micro-batch (เวลา / จำนวน)
+        edge_debounce / report_window / keepalive_interval: การกรอง tag ซ้ำที่ฝั่ง subprocess
     """
     
     def __init__(self, device_config):
@@ -65,6 +83,12 @@ class DeviceScannerService:
                 - connection_info: ข้อมูลการเชื่อมต่อ
                 - scan_interval: ช่วงเวลาสแกน (optional)
                 - db_update_interval: ช่วงเวลาอัพเดต DB (optional)
+                - streaming: True = เปิด inventory ค้างไว้ (optional)
+                - flush_interval: ระยะเวลาสูงสุดของ micro-batch ในโหมด streaming (optional)
+                - flush_max_records: จำนวน EPC สูงสุดต่อ micro-batch (optional)
+                - edge_debounce: กรอง tag ที่ report ไปแล้วใน subprocess (optional)
+                - report_window: ช่วงเวลาที่ถือว่า tag "report แล้ว" (วินาที, ปกติ = DELAY_SECONDS)
+                - keepalive_interval: ช่วงเวลาส่ง keep-alive summary (optional)
         """
         self.device_id = device_config['device_id']
         self.location_id = device_config['location_id']
@@ -77,8 +101,20 @@ class DeviceScannerService:
         # อ่านค่าที่ส่งมาจาก main process (ถ้ามี)
         self.scan_interval = float(device_config.get('scan_interval', 0.3))
         self.db_update_interval = float(device_config.get('db_update_interval', 1.0))
-        self.result_queue = None
+        # โหมด streaming: เปิด inventory ค้างไว้และส่งผลเป็น micro-batch
+        self.streaming = bool(device_config.get('streaming', True))
+        self.flush_interval = float(device_config.get('flush_interval', 0.1))
+        self.flush_max_records = int(device_config.get('flush_max_records', 256))
+        # edge debounce: ส่ง tag ที่ report ไปแล้วภายใน report_window เฉพาะใน keep-alive summary
+        self.edge_debounce = bool(device_config.get('edge_debounce', True))
+        self.report_window = float(device_config.get('report_window', 20))
+        self.keepalive_interval = float(device_config.get('keepalive_interval', 2.0))
+        self._reported = {}  # EPC -> เวลาที่ report ล่าสุด
+        self._held = {}      # EPC -> TagRead ที่ถูกพักไว้รอ keep-alive
+        self._last_keepalive = time.time()
+        self.ring = None
         self.cmd_queue = None
+        self.reply_queue = None
 
     def get_device_sn_internal(self):
         """
@@ -183,91 +219,238 @@ class DeviceScannerService:
             logger.error(f"Device {self.device_id} connection error: {e}")
             return False
     
-    def scan_loop(self, result_queue, cmd_queue):
+    def _handle_command(self, cmd):
+        """
+        ประมวลผลคำสั่งจาก main process แล้วตอบกลับทาง reply_queue
+
+        คำตอบทุกรายการมี 'id' เดียวกับคำขอ (correlation id) เพื่อให้ผู้ขอจับคู่ได้
+        """
+        if not isinstance(cmd, dict):
+            return
+        request_id = cmd.get('id')
+        if cmd.get('cmd') == 'get_params':
+            # อ่านพารามิเตอร์ปัจจุบันจากอุปกรณ์แล้วส่งกลับ
+            response = {'id': request_id, 'cmd': 'params', 'device_id': self.device_id, 'timestamp': time.time()}
+            try:
+                from uhf.struct import DeviceFullInfo
+                from ctypes import byref
+                info = DeviceFullInfo()
+                res = self.api.GetDevicePara(self.hComm, byref(info))
+                if res == 0:
+                    response['params'] = {
+                        'WORKMODE': info.WORKMODE,
+                        'REGION': info.REGION,
+                        'RFIDPOWER': info.RFIDPOWER,
+                        'ANT': info.ANT,
+                        'QVALUE': info.QVALUE,
+                        'SESSION': info.SESSION,
+                        'INTERFACE': hex(info.INTERFACE),
+                        'BAUDRATE': info.BAUDRATE,
+                        'FILTERTIME': info.FILTERTIME,
+                        'BUZZERTIME': info.BUZZERTIME
+                    }
+                else:
+                    response['error'] = f'GetDevicePara failed: {res}'
+                    logger.error(f"Device {self.device_id} GetDevicePara failed: {res}")
+            except Exception as e:
+                response['error'] = str(e)
+                logger.error(f"Device {self.device_id} get_params exception: {e}")
+        elif cmd.get('cmd') == 'update_config':
+            # เปลี่ยนค่า runtime (เช่น SCAN_INTERVAL / DELAY_SECONDS) โดยไม่ restart
+            response = {'id': request_id, 'cmd': 'config_updated', 'device_id': self.device_id, 'timestamp': time.time()}
+            applied = {}
+            try:
+                for field, value in (cmd.get('config') or {}).items():
+                    if field in RUNTIME_CONFIG_FIELDS:
+                        setattr(self, field, RUNTIME_CONFIG_FIELDS[field](value))
+                        applied[field] = getattr(self, field)
+                response['applied'] = applied
+                logger.info(f"Device {self.device_id} runtime config updated: {applied}")
+            except Exception as e:
+                response['error'] = str(e)
+                logger.error(f"Device {self.device_id} update_config exception: {e}")
+        else:
+            response = {'id': request_id, 'device_id': self.device_id, 'error': f"Unknown command: {cmd.get('cmd')}", 'timestamp': time.time()}
+        try:
+            self.reply_queue.put(response, timeout=1.0)
+        except Exception as e:
+            logger.error(f"Device {self.device_id} reply error: {e}")
+
+    def _poll_command(self):
+        """อ่านคำสั่งจาก parent แบบ non-blocking (None ถ้าไม่มี)"""
+        try:
+            return self.cmd_queue.get_nowait()
+        except _queue.Empty:
+            return None
+        except Exception as e:
+            logger.debug(f"Device {self.device_id} cmd_queue error: {e}")
+            return None
+
+    def _read_tag(self, collected, timeout_ms=20):
+        """
+        อ่าน tag หนึ่งตัวจาก buffer ของเครื่องแล้วรวมลง collected (ReadAggregator)
+        เก็บ RSSI, antenna, channel และจำนวนครั้งที่อ่าน ไม่ใช่แค่ EPC
+
+        Returns:
+            int: ผลของ GetTagUii (0 = อ่านได้, -249 = inventory จบแล้ว, -238 = ไม่มี tag)
+        """
+        tagInfo = TagInfo()
+        r = self.api.GetTagUii(self.hComm, tagInfo, timeout_ms)
+        if r == 0 and 1 <= tagInfo.m_ant <= 4:
+            length = min(tagInfo.m_len, EPC_MAX_BYTES)
+            epc = bytes(tagInfo.m_code[:length])
+            collected.add(epc, tagInfo.m_ant, tagInfo.m_rssi, tagInfo.m_channel, time.time())
+        return r
+
+    def _debounce(self, reads, now):
+        """
+        กรอง tag ที่ report ไปแล้วภายใน report_window
+
+        - tag ใหม่ หรือพ้น report_window แล้ว: ส่งทันที
+        - tag ที่เพิ่ง report: รวมไว้ใน _held แล้วส่งรวดเดียวทุก keepalive_interval
+          (ติด FLAG_KEEPALIVE) เพื่อให้ main process ยังรู้ว่า tag อยู่ในพื้นที่
+        ปริมาณ IPC จึงขึ้นกับจำนวน tag ที่เปลี่ยนแปลง ไม่ใช่จำนวน tag ทั้งหมดในพื้นที่
+        """
+        out = []
+        for r in reads:
+            last = self._reported.get(r.epc)
+            if last is None or now - last >= self.report_window:
+                self._reported[r.epc] = now
+                out.append(r)
+            else:
+                held = self._held.get(r.epc)
+                self._held[r.epc] = r if held is None else merge_reads(held, r)
+
+        if now - self._last_keepalive >= self.keepalive_interval:
+            out.extend(r._replace(flags=r.flags | FLAG_KEEPALIVE) for r in self._held.values())
+            self._held = {}
+            self._last_keepalive = now
+            # ลืม tag ที่พ้น report_window แล้ว (ครั้งหน้าจะถูกส่งเป็น tag ใหม่)
+            self._reported = {epc: t for epc, t in self._reported.items() if now - t < self.report_window}
+        return out
+
+    def _flush(self, collected):
+        """เขียน TagRead ของ window ปัจจุบันลง ring ครั้งเดียว (1 record ต่อ tag)"""
+        reads = collected.drain() if collected else []
+        if self.edge_debounce:
+            reads = self._debounce(reads, time.time())
+        if not reads:
+            return
+        written = self.ring.push_many(reads)
+        if written < len(reads):
+            logger.warning(f"Device {self.device_id} ring full, dropped {len(reads) - written} reads")
+
+    def scan_loop(self, ring, cmd_queue, reply_queue):
         """
         Loop หลักสำหรับการสแกน RFID tags อย่างต่อเนื่อง
         
         Args:
-            result_queue: Queue สำหรับส่งผลลัพธ์กลับ main process
+            ring: ReadRing (shared memory) สำหรับส่ง read record กลับ main process
             cmd_queue: Queue สำหรับรับคำสั่งจาก main process
+            reply_queue: Queue สำหรับตอบคำสั่ง (แยกจากผลสแกน)
             
-        Process:
-            1. ตรวจสอบคำสั่งจาก main process (non-blocking)
-            2. ประมวลผลคำสั่ง (เช่น get_params)
-            3. เริ่ม inventory operation
-            4. อ่าน tags ภายในช่วงเวลา read_window
-            5. รวบรวม tag IDs ที่ไม่ซ้ำกัน
-            6. หยุด inventory operation
-            7. ส่งผลลัพธ์ผ่าน result_queue
-            8. รอตาม scan_interval แล้วทำซ้ำ
+        Modes:
+            - streaming (ค่าเริ่มต้น): ดู _stream_loop
+            - cycle: ดู _cycle_loop (start/stop inventory ทุกรอบแบบเดิม)
             
         Commands รองรับ:
             - get_params: ขอข้อมูลพารามิเตอร์ปัจจุบันของอุปกรณ์
             
-        Result Format:
-            {
-                'device_id': int,
-                'location_id': int,
-                'tags': list[str],  # Tag IDs in hex format
-                'timestamp': float,
-                'real_sn': str      # Device serial number
-            }
+        Record Format (ดู scan_transport.TagRead):
+            1 record ต่อ tag ต่อ window: first/last seen, read count,
+            peak/mean RSSI (0.1 dBm), antenna bitmap และ channel
         """
-        self.result_queue = result_queue
+        self.ring = ring
         self.cmd_queue = cmd_queue
+        self.reply_queue = reply_queue
+        
+        if self.streaming:
+            self._stream_loop()
+        else:
+            self._cycle_loop()
+
+    def _stream_loop(self):
+        """
+        โหมด streaming: เปิด inventory ค้างไว้และส่งผลเป็น micro-batch
+        
+        Process:
+            1. เริ่ม InventoryContinue ครั้งเดียว
+            2. อ่าน tag ต่อเนื่อง รวมผลการอ่านของแต่ละ EPC
+            3. flush ลง ring เมื่อครบ flush_interval หรือมี EPC ครบ flush_max_records
+            4. ตรวจคำสั่งทุกครั้งที่ flush - ถ้ามีคำสั่ง หยุด inventory ตอบคำสั่ง แล้วเริ่มใหม่
+            5. ถ้าเครื่องจบ inventory เอง (-249) ให้เริ่มใหม่ทันที
+        """
+        collected = ReadAggregator()
+        inventory_running = False
+        batch_start = time.time()
         
         while self.running and self.is_connected:
             try:
-                # ตรวจสอบคำสั่งจาก parent (non-blocking) - ย้ายมาด้านบน
-                cmd = None
-                try:
-                    # เช็คคำสั่งก่อนทำ scan หลัก
-                    cmd = self.cmd_queue.get_nowait()
-                except _queue.Empty:
-                    cmd = None
-                except Exception as e:
-                    logger.debug(f"Device {self.device_id} cmd_queue error: {e}")
-                    cmd = None
+                if not inventory_running:
+                    res = self.api.InventoryContinue(self.hComm, 0, None)
+                    if res != 0:
+                        logger.debug(f"Device {self.device_id} InventoryContinue failed: {res}")
+                        time.sleep(0.1)
+                        continue
+                    inventory_running = True
+                    batch_start = time.time()
+
+                r = self._read_tag(collected)
+                if r == -249:
+                    inventory_running = False
+                elif r not in (0, -238):
+                    time.sleep(0.01)  # error อื่นจากเครื่อง - ไม่วนถี่
 
+                now = time.time()
+                if now - batch_start < self.flush_interval and len(collected) < self.flush_max_records:
+                    continue
+                self._flush(collected)
+                batch_start = now
+
+                # หยุด inventory เฉพาะเมื่อมีคำสั่งที่ต้องใช้เครื่อง
+                cmd = self._poll_command()
                 if cmd:
-                    #logger.info(f"Device {self.device_id} received command: {cmd}")
-                    if isinstance(cmd, dict) and cmd.get('cmd') == 'get_params':
-                        # อ่านพารามิเตอร์ปัจจุบันจากอุปกรณ์แล้วส่งกลับ
+                    if inventory_running and not (isinstance(cmd, dict) and cmd.get('cmd') in LOCAL_COMMANDS):
                         try:
-                            #logger.info(f"Device {self.device_id} processing get_params...")
-                            from uhf.struct import DeviceFullInfo
-                            from ctypes import byref
-                            info = DeviceFullInfo()
-                            res = self.api.GetDevicePara(self.hComm, byref(info))
-                            if res == 0:
-                                params = {
-                                    'WORKMODE': info.WORKMODE,
-                                    'REGION': info.REGION,
-                                    'RFIDPOWER': info.RFIDPOWER,
-                                    'ANT': info.ANT,
-                                    'QVALUE': info.QVALUE,
-                                    'SESSION': info.SESSION,
-                                    'INTERFACE': hex(info.INTERFACE),
-                                    'BAUDRATE': info.BAUDRATE,
-                                    'FILTERTIME': info.FILTERTIME,
-                                    'BUZZERTIME': info.BUZZERTIME
-                                }
-                                response = {'cmd': 'params', 'device_id': self.device_id, 'params': params, 'timestamp': time.time()}
-                                self.result_queue.put(response, timeout=1.0)
-                                #logger.info(f"Device {self.device_id} sent params response: {len(params)} parameters")
-                            else:
-                                response = {'cmd': 'params', 'device_id': self.device_id, 'error': f'GetDevicePara failed: {res}', 'timestamp': time.time()}
-                                self.result_queue.put(response, timeout=1.0)
-                                logger.error(f"Device {self.device_id} GetDevicePara failed: {res}")
-                        except Exception as e:
-                            response = {'cmd': 'params', 'device_id': self.device_id, 'error': str(e), 'timestamp': time.time()}
-                            self.result_queue.put(response, timeout=1.0)
-                            logger.error(f"Device {self.device_id} get_params exception: {e}")
-                        # หลังจากตอบคำสั่งแล้ว ให้สานงานสแกนต่อ (ไม่หยุด subprocess)
-                        continue  # ข้ามการสแกนรอบนี้ ให้ตอบคำสั่งก่อน
+                            self.api.InventoryStop(self.hComm, 50)
+                        except:
+                            pass
+                        inventory_running = False
+                    self._handle_command(cmd)
+            except Exception as e:
+                logger.error(f"Device {self.device_id} scan error: {e}")
+                inventory_running = False
+                time.sleep(1.0)
+        
+        self._flush(collected)
+        if inventory_running:
+            try:
+                self.api.InventoryStop(self.hComm, 50)
+            except:
+                pass
 
-                # --- existing scanning logic ---
-                collected = set()
+    def _cycle_loop(self):
+        """
+        โหมด cycle (เดิม): start/stop inventory ทุกรอบ
+        
+        Process:
+            1. ตรวจสอบคำสั่งจาก main process (non-blocking)
+            2. ประมวลผลคำสั่ง (เช่น get_params) แล้วตอบทาง reply_queue
+            3. เริ่ม inventory operation
+            4. อ่าน tags ภายในช่วงเวลา read_window
+            5. หยุด inventory operation
+            6. เขียน record ลง ring ครั้งเดียวต่อรอบ
+            7. รอตาม scan_interval แล้วทำซ้ำ
+        """
+        while self.running and self.is_connected:
+            try:
+                # ตรวจสอบคำสั่งจาก parent (non-blocking) ก่อนทำ scan หลัก
+                cmd = self._poll_command()
+                if cmd:
+                    self._handle_command(cmd)
+                    continue  # ข้ามการสแกนรอบนี้ ให้ตอบคำสั่งก่อน
+
+                collected = ReadAggregator()
                 # เริ่ม inventory
                 res = self.api.InventoryContinue(self.hComm, 0, None)
                 if res != 0:
@@ -279,20 +462,8 @@ class DeviceScannerService:
                 read_window = max(0.05, min(self.scan_interval, 0.5))
                 while time.time() - scan_start < read_window:
                     try:
-                        tagInfo = TagInfo()
-                        r = self.api.GetTagUii(self.hComm, tagInfo, 20)
-                        if r == 0:
-                            if 1 <= tagInfo.m_ant <= 4:
-                                length = tagInfo.m_len
-                                raw = list(tagInfo.m_code)[:length]
-                                code = ''.join(f"{b:02X}" for b in raw)
-                                collected.add(code.upper())
-                        elif r == -249:
+                        if self._read_tag(collected) == -249:
                             break
-                        elif r == -238:
-                            continue
-                        else:
-                            continue
                     except Exception:
                         break
                 # หยุด inventory
@@ -300,18 +471,7 @@ class DeviceScannerService:
                     self.api.InventoryStop(self.hComm, 50)
                 except:
                     pass
-                if collected:
-                    try:
-                        result_data = {
-                            'device_id': self.device_id,
-                            'location_id': self.location_id,
-                            'tags': list(collected),
-                            'timestamp': time.time(),
-                            'real_sn': getattr(self, 'real_sn', None)
-                        }
-                        result_queue.put(result_data, timeout=0.1)
-                    except:
-                        pass
+                self._flush(collected)
                 # ใช้ scan_interval เป็น delay ระหว่างรอบ
                 time.sleep(self.scan_interval)
             except Exception as e:
@@ -335,53 +495,45 @@ class DeviceScannerService:
                 pass
         self.is_connected = False
 
-def run_device_scanner(device_config, result_queue, cmd_queue):
+def run_device_scanner(device_config, ring_name, cmd_queue, reply_queue):
     """
     Entry point สำหรับรัน scanner service ใน subprocess
     
     Args:
         device_config (dict): การตั้งค่าอุปกรณ์
-        result_queue: Queue สำหรับส่งผลลัพธ์
+        ring_name (str): ชื่อ shared memory ของ ReadRing ที่ main process สร้างไว้
         cmd_queue: Queue สำหรับรับคำสั่ง
+        reply_queue: Queue สำหรับตอบคำสั่ง
         
     Process:
         1. ตั้งค่า logging
-        2. สร้าง DeviceScannerService instance
+        2. เปิด ReadRing และสร้าง DeviceScannerService instance
         3. ลองเชื่อมต่ออุปกรณ์
-        4. ส่งสถานะการเชื่อมต่อกลับ main process
+        4. เขียนสถานะการเชื่อมต่อลง header ของ ring
         5. เริ่ม scan loop ถ้าเชื่อมต่อสำเร็จ
         6. ปิดการเชื่อมต่อเมื่อเสร็จสิ้น
         
-    Status Messages:
-        - 'connected': เชื่อมต่อสำเร็จ พร้อม real_sn
-        - 'connection_failed': เชื่อมต่อล้มเหลว
+    Ring States:
+        - STATE_CONNECTED: เชื่อมต่อสำเร็จ พร้อม real_sn
+        - STATE_CONNECTION_FAILED: เชื่อมต่อล้มเหลว
+        - STATE_STOPPED: scan loop จบแล้ว
     """
     logging.basicConfig(level=logging.INFO)
     logger.info(f"Starting scanner service for device {device_config['device_id']}")
     
+    ring = ReadRing.attach(ring_name)
     service = DeviceScannerService(device_config)
     
-    # ส่งสถานะการเชื่อมต่อกลับไป main process
-    if service.connect():
-        # ส่งสัญญาณว่าเชื่อมต่อสำเร็จ
-        result_queue.put({
-            'device_id': service.device_id,
-            'status': 'connected',
-            'real_sn': getattr(service, 'real_sn', None),
-            'timestamp': time.time()
-        })
-        
-        # เริ่มสแกน (ส่ง cmd_queue เข้าไปด้วย)
-        service.scan_loop(result_queue, cmd_queue)
-    else:
-        # ส่งสัญญาณว่าเชื่อมต่อล้มเหลว
-        result_queue.put({
-            'device_id': service.device_id,
-            'status': 'connection_failed',
-            'timestamp': time.time()
-        })
-    
-    service.disconnect()
+    try:
+        if service.connect():
+            ring.set_state(STATE_CONNECTED, getattr(service, 'real_sn', None) or "")
+            service.scan_loop(ring, cmd_queue, reply_queue)
+            ring.set_state(STATE_STOPPED)
+        else:
+            ring.set_state(STATE_CONNECTION_FAILED)
+    finally:
+        service.disconnect()
+        ring.close()
 
 # Standalone Testing Section
 if __name__ == "__main__":
@@ -417,6 +569,10 @@ if __name__ == "__main__":
     }
     
     from multiprocessing import Queue
-    q = Queue()
+    ring = ReadRing.create()
     cmdq = Queue()
-    run_device_scanner(config, q, cmdq)
\ No newline at end of file
+    replyq = Queue()
+    try:
+        run_device_scanner(config, ring.name, cmdq, replyq)
+    finally:
+        ring.close()
@@ -0,0 +1,107 @@
+"""
+Flap Guard - กัน tag ที่อยู่บนรอยต่อระหว่างสองโซนไม่ให้สร้าง movement สลับไปมา
+=========================================================================
+
+tag ที่วางอยู่ระหว่างสนามของสองเครื่องอ่านจะถูกย้ายไปมา แต่ละครั้งมี INSERT movements,
+INSERT notifications และ broadcast ทาง WebSocket
+
+หลักการ (hysteresis ต่อ tag):
+- min_dwell: tag ต้องอยู่ที่ตำแหน่งปัจจุบันอย่างน้อยกี่วินาทีก่อนจะย้ายได้อีก
+- max_per_minute: จำนวนการเปลี่ยนตำแหน่งสูงสุดต่อ tag ใน 60 วินาทีล่าสุด
+- การเปลี่ยนที่ถูกกันจะไม่ถูกเขียน และนับใน stats() (แยกตามสาเหตุ)
+- เก็บประวัติใน PresenceIndex: tag ที่ไม่เปลี่ยนตำแหน่งนานกว่า window จะถูกลืมเอง
+
+การใช้งาน:
+    from flap_guard import flap_guard
+
+    if flap_guard.allow(tag_id):
+        ... เขียน movement ...
+        flap_guard.record(tag_id)
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+from config.settings import settings
+from presence_index import PresenceIndex
+
+RATE_WINDOW = 60.0  # วินาที (ต่อนาที)
+
+class FlapGuard:
+    """
+    ตัวกรอง hysteresis ของการเปลี่ยนตำแหน่งต่อ tag (thread-safe)
+
+    Args:
+        min_dwell: เวลาขั้นต่ำระหว่างการเปลี่ยนตำแหน่งสองครั้งของ tag เดียวกัน (วินาที, 0 = ไม่จำกัด)
+        max_per_minute: จำนวนการเปลี่ยนตำแหน่งสูงสุดต่อ tag ต่อนาที (0 = ไม่จำกัด)
+        max_tags: จำนวน tag สูงสุดที่เก็บประวัติ
+    """
+
+    def __init__(self, min_dwell: float = 5.0, max_per_minute: int = 6, max_tags: int = 100_000):
+        self.min_dwell = max(0.0, float(min_dwell))
+        self.max_per_minute = max(0, int(max_per_minute))
+        # tag_id -> deque ของเวลาที่เปลี่ยนตำแหน่ง (ภายใน RATE_WINDOW)
+        self._history = PresenceIndex(ttl=max(RATE_WINDOW, self.min_dwell), max_entries=max_tags)
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.suppressed_dwell = 0
+        self.suppressed_rate = 0
+
+    def enabled(self) -> bool:
+        return self.min_dwell > 0 or self.max_per_minute > 0
+
+    def allow(self, tag_id: str, now: Optional[float] = None) -> bool:
+        """ตรวจว่า tag เปลี่ยนตำแหน่งได้ตอนนี้หรือไม่ (ไม่บันทึก - เรียก record() หลังเขียนสำเร็จ)"""
+        if not self.enabled():
+            return True
+        now = time.time() if now is None else now
+        with self._lock:
+            changes = self._history.get(tag_id)
+            if changes:
+                if now - changes[-1] < self.min_dwell:
+                    self.suppressed_dwell += 1
+                    return False
+                if self.max_per_minute:
+                    while changes and changes[0] <= now - RATE_WINDOW:
+                        changes.popleft()
+                    if len(changes) >= self.max_per_minute:
+                        self.suppressed_rate += 1
+                        return False
+            self.allowed += 1
+            return True
+
+    def record(self, tag_id: str, now: Optional[float] = None):
+        """บันทึกว่า tag เปลี่ยนตำแหน่งแล้ว"""
+        self.record_many((tag_id,), now)
+
+    def record_many(self, tag_ids: Iterable[str], now: Optional[float] = None):
+        if not self.enabled():
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            for tid in tag_ids:
+                changes = self._history.get(tid)
+                if changes is None:
+                    changes = deque(maxlen=max(self.max_per_minute, 1))
+                changes.append(now)
+                self._history.touch(tid, changes, now)
+
+    def stats(self) -> dict:
+        return {
+            "min_dwell": self.min_dwell,
+            "max_per_minute": self.max_per_minute,
+            "tracked_tags": len(self._history),
+            "allowed": self.allowed,
+            "suppressed_dwell": self.suppressed_dwell,
+            "suppressed_rate": self.suppressed_rate,
+            "suppressed": self.suppressed_dwell + self.suppressed_rate,
+        }
+
+# Global instance
+flap_guard = FlapGuard(
+    min_dwell=settings.scan_min_dwell,
+    max_per_minute=settings.scan_max_transitions_per_minute,
+    max_tags=settings.presence_max_tags,
+)
@@ -0,0 +1,376 @@
+"""
+Ingestion Pool - ขั้นตอนรับผลสแกนจากทุกเครื่องแบบรวมศูนย์
+=========================================================
+
+แทนที่ result_processor_loop ที่เดิมมี 1 thread ต่อ 1 เครื่อง
+
+โครงสร้าง:
+1. Intake thread เดียว วนอ่าน ReadRing (shared memory) ของทุกเครื่อง
+   - สถานะใน header ของ ring (connected / connection_failed) -> อัปเดต session
+   - TagRead (ผลรวมการอ่านต่อ tag ต่อ window) -> กรองด้วย RSSI / จำนวนครั้งที่อ่าน
+   - ReaderArbiter รวม read ของทุกเครื่องใน sliding window แล้วเลือกเครื่องผู้ชนะต่อ tag
+     (tag ที่หลายเครื่องอ่านเจอพร้อมกันจึงถูกส่งให้เครื่องเดียว) จากนั้นแบ่งตาม shard
+   คำตอบของคำสั่ง (เช่น params) ไม่ผ่าน intake แล้ว ดู scan_transport.ControlChannel
+   โหมด absence: ส่งเข้า worker เฉพาะ tag ที่เพิ่งปรากฏ (ARRIVAL) และทุก sweep_interval
+   ส่ง tag ที่หายไปเกิน ttl ของ session.presence (DEPARTURE)
+2. Worker pool ขนาดคงที่ แต่ละ worker เป็นเจ้าของ shard ของ tag
+   tag เดียวกันจะถูกประมวลผลโดย worker เดียวเสมอ จึงไม่มีสองเครื่องแย่งเขียน row เดียวกัน
+   worker รวม batch ที่ค้างในคิวของ device เดียวกันก่อนเรียก process_fn / departure_fn ครั้งเดียว
+   งานแต่ละ tag มี event id ที่กำหนดครั้งเดียวตอน submit (device, ลำดับต่อเครื่อง, เวลาของเครื่องอ่าน)
+   และติดไปกับ batch จนถึง DB / spool การ retry หรือ replay จึงได้ id เดิม (ดู make_event_id)
+3. ScanSpool (ถ้ามี): เมื่อ DB เชื่อมต่อไม่ได้ worker เขียน batch ลง spool บนดิสก์แทนการทิ้ง
+   และเขียนต่อลง spool จนกว่า replay จะตามทัน (รักษาลำดับ)
+
+ตัวชี้วัด: ความยาวคิว intake/worker, จำนวน batch/tag ที่ประมวลผล และ throughput ต่อ worker
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+
+from config.database import is_connection_error
+from reader_arbiter import ReaderArbiter
+from scan_transport import FLAG_KEEPALIVE, STATE_CONNECTED, STATE_CONNECTION_FAILED
+
+logger = logging.getLogger(__name__)
+
+# ชนิดของงานใน worker queue
+ARRIVAL = "arrival"
+DEPARTURE = "departure"
+
+def make_event_id(device_id: int, seq: int, reader_ts: float) -> str:
+    """event id ของงานหนึ่ง tag: device-ลำดับ-เวลาของเครื่องอ่าน (ms) เวลาทำให้ไม่ซ้ำแม้ลำดับเริ่มใหม่หลัง restart"""
+    return f"{device_id}-{seq}-{int(reader_ts * 1000)}"
+
+class _WorkerStats:
+    """ตัวนับของ worker หนึ่งตัว"""
+
+    def __init__(self):
+        self.batches = 0
+        self.tags = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.started_at = time.time()
+        self.last_batch_at = None
+
+    def snapshot(self) -> dict:
+        uptime = max(time.time() - self.started_at, 1e-6)
+        return {
+            "batches": self.batches,
+            "tags": self.tags,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "utilization": round(self.busy_seconds / uptime, 4),
+            "tags_per_second": round(self.tags / uptime, 2),
+            "tags_per_busy_second": round(self.tags / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+            "last_batch_at": self.last_batch_at,
+        }
+
+class IngestionPool:
+    """
+    รวมการรับผลสแกนจากทุก DeviceSession แล้วกระจายให้ worker pool
+
+    Args:
+        process_fn: ฟังก์ชัน (session, {tag_id: (event_id, reader_ts)}) -> list ที่เขียนผลลง DB
+        workers: จำนวน worker
+        max_merge: จำนวน batch สูงสุดที่ worker รวมต่อรอบ
+        min_rssi: ตัด tag ที่ RSSI สูงสุดใน window ต่ำกว่าค่านี้ (dBm, None = ไม่กรอง)
+        min_read_count: ตัด tag ที่อ่านเจอน้อยกว่าจำนวนครั้งนี้ใน window
+        departure_fn: ฟังก์ชัน (session, {tag_id: (event_id, reader_ts)}) สำหรับ tag ที่หายไป - มีค่า = โหมด absence
+        sweep_interval: ระยะเวลาระหว่างการตรวจ tag ที่หายไป (วินาที)
+        arbitration_window: ระยะเวลารวม read จากทุกเครื่องก่อนเลือกเครื่องผู้ชนะ (วินาที, 0 = ตัดสินทุกรอบ intake)
+        arbitration_count_weight: คะแนนต่อจำนวนครั้งที่อ่านเพิ่มเป็น 2 เท่า (dB)
+        spool: ScanSpool สำหรับเก็บ batch ระหว่างที่ DB ใช้งานไม่ได้ (None = ทิ้ง batch ที่เขียนไม่สำเร็จ)
+    """
+
+    def __init__(self, process_fn: Callable, workers: int = 4, max_merge: int = 64, poll_interval: float = 0.01,
+                 min_rssi: Optional[float] = None, min_read_count: int = 1,
+                 departure_fn: Optional[Callable] = None, sweep_interval: float = 0.5,
+                 arbitration_window: float = 0.0, arbitration_count_weight: float = 3.0,
+                 spool=None):
+        self.process_fn = process_fn
+        self.departure_fn = departure_fn
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+        self.workers = max(1, int(workers))
+        self.max_merge = max_merge
+        self.poll_interval = poll_interval
+        # TagRead เก็บ RSSI หน่วย 0.1 dBm
+        self.min_rssi = None if min_rssi is None else int(min_rssi * 10)
+        self.min_read_count = max(1, int(min_read_count))
+        self.spool = spool
+        self.spooled = 0
+        self.arbiter = ReaderArbiter(window=arbitration_window, count_weight=arbitration_count_weight)
+        self._sessions: Dict[int, object] = {}
+        self._sessions_lock = threading.Lock()
+        self._worker_queues: List[queue.Queue] = []
+        self._worker_stats: List[_WorkerStats] = []
+        self._threads: List[threading.Thread] = []
+        self._intake_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._ring_states: Dict[int, int] = {}
+        self._event_seqs: Dict[int, itertools.count] = {}
+        self.intake_records = 0
+        self.intake_keepalive_records = 0
+        self.intake_filtered = 0
+        self.intake_batches = 0
+        self.arrivals = 0
+        self.departures = 0
+
+    # ---------- lifecycle ----------
+    def start(self):
+        """เริ่ม intake thread และ worker pool (เรียกซ้ำได้)"""
+        with self._start_lock:
+            if self.is_running():
+                return
+            self._stop.clear()
+            self._worker_queues = [queue.Queue() for _ in range(self.workers)]
+            self._worker_stats = [_WorkerStats() for _ in range(self.workers)]
+            self._threads = []
+            for index in range(self.workers):
+                t = threading.Thread(target=self._worker_loop, args=(index,), name=f"ingest-worker-{index}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            self._intake_thread = threading.Thread(target=self._intake_loop, name="ingest-intake", daemon=True)
+            self._intake_thread.start()
+            logger.info(f"Ingestion pool started with {self.workers} workers")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for t in self._threads + ([self._intake_thread] if self._intake_thread else []):
+            t.join(timeout=timeout)
+        logger.info("Ingestion pool stopped")
+
+    def is_running(self) -> bool:
+        return bool(self._intake_thread and self._intake_thread.is_alive() and not self._stop.is_set())
+
+    def register(self, session):
+        """เพิ่ม session เข้า intake (session.ring ถูกอ่านใหม่ทุกรอบ จึงเปลี่ยน ring ได้ภายหลัง)"""
+        with self._sessions_lock:
+            self._sessions[session.device_id] = session
+            self._ring_states.pop(session.device_id, None)
+        self.start()
+
+    def unregister(self, device_id: int):
+        with self._sessions_lock:
+            session = self._sessions.pop(device_id, None)
+            self._ring_states.pop(device_id, None)
+        if session is not None:
+            self.arbiter.forget(session)
+
+    # ---------- intake ----------
+    def _active_sessions(self) -> list:
+        with self._sessions_lock:
+            sessions = list(self._sessions.values())
+        return [s for s in sessions if getattr(s, "ring", None) is not None and not s.thread_stop.is_set()]
+
+    def _intake_loop(self):
+        logger.info("Ingestion intake started")
+        while not self._stop.is_set():
+            try:
+                sessions = self._active_sessions()
+                drained = 0
+                for s in sessions:
+                    self._check_state(s)
+                    drained += self._drain(s)
+                self._dispatch(self.arbiter.decide())
+                if self.departure_fn is not None and time.time() - self._last_sweep >= self.sweep_interval:
+                    self._sweep(sessions)
+                # ring ไม่มีการแจ้งเตือน จึง poll เมื่อไม่มีข้อมูลใหม่
+                if drained == 0:
+                    time.sleep(self.poll_interval if sessions else 0.1)
+            except Exception as e:
+                logger.error(f"Ingestion intake error: {e}")
+                time.sleep(0.5)
+        logger.info("Ingestion intake stopped")
+
+    def _check_state(self, session):
+        """อ่านสถานะการเชื่อมต่อที่ subprocess เขียนไว้ใน header ของ ring"""
+        state = session.ring.state
+        if self._ring_states.get(session.device_id) == state:
+            return
+        self._ring_states[session.device_id] = state
+        if state == STATE_CONNECTION_FAILED:
+            logger.error(f"Device {session.device_id} subprocess connection failed")
+            session.is_connected = False
+        elif state == STATE_CONNECTED:
+            logger.info(f"Device {session.device_id} subprocess connected successfully")
+            real_sn = session.ring.real_sn
+            if real_sn:
+                session.device_sn = real_sn
+
+    def _drain(self, session, limit: int = 4096) -> int:
+        records = session.ring.pop_many(limit)
+        if not records:
+            return 0
+        self.intake_records += len(records)
+        self.intake_keepalive_records += sum(1 for r in records if r.flags & FLAG_KEEPALIVE)
+        if not session.is_connected:
+            return len(records)
+        reads = self._filter_reads(records)
+        if reads:
+            self.arbiter.offer(session, reads)
+        return len(records)
+
+    def _dispatch(self, decisions: list):
+        """ส่ง tag ที่ตัดสินแล้วให้เครื่องผู้ชนะ (touch presence แล้ว submit)"""
+        if not decisions:
+            return
+        by_session: Dict[int, tuple] = {}
+        for tid, read, winner, previous in decisions:
+            if previous is not None:
+                # tag ย้ายไปเครื่องอื่น: ลบออกจาก presence ของเครื่องเดิมโดยไม่นับเป็น DEPARTURE
+                # (ถ้าเครื่องเดิมชนะอีกครั้งจะนับเป็น ARRIVAL ใหม่)
+                previous.presence.discard(tid)
+            entry = by_session.get(winner.device_id)
+            if entry is None:
+                entry = by_session[winner.device_id] = (winner, {})
+            entry[1][tid] = read
+
+        for session, latest in by_session.values():
+            if not session.is_connected:
+                continue
+            arrived = session.presence.touch_many(latest)
+            if self.departure_fn is None:
+                # โหมด toggle: ทุก tag ที่อ่านได้ผ่านไปให้ process_fn กรองด้วย DELAY_SECONDS
+                self.submit(session, {tid: r.last_seen for tid, r in latest.items()})
+            elif arrived:
+                self.arrivals += len(arrived)
+                self.submit(session, {tid: latest[tid].first_seen for tid in arrived})
+
+    def _sweep(self, sessions: list):
+        """ส่ง tag ที่ไม่ถูกอ่านเกิน ttl ของ presence index เป็น DEPARTURE (ต้นทุนตามจำนวนที่หมดอายุ)"""
+        self._last_sweep = time.time()
+        for s in sessions:
+            if not s.is_connected:
+                continue
+            expired = s.presence.pop_expired()
+            if expired:
+                self.departures += len(expired)
+                self.submit(s, {tid: read.last_seen for tid, read in expired}, DEPARTURE)
+
+    def _filter_reads(self, records: list) -> list:
+        """กรอง TagRead ที่สัญญาณอ่อนหรืออ่านเจอน้อยเกินไป (มักเป็น tag จากโซนข้างเคียง)"""
+        if self.min_rssi is None and self.min_read_count <= 1:
+            return records
+        kept = [
+            r for r in records
+            if r.read_count >= self.min_read_count and (self.min_rssi is None or r.rssi_peak >= self.min_rssi)
+        ]
+        self.intake_filtered += len(records) - len(kept)
+        return kept
+
+    def submit(self, session, tags: Dict[str, float], kind: str = ARRIVAL):
+        """
+        กำหนด event id ให้แต่ละ tag แล้วแบ่งตาม shard ส่งเข้า worker queue
+
+        Args:
+            tags: tag_id -> เวลาของเครื่องอ่านที่ทำให้เกิดงาน (first_seen ของ ARRIVAL, last_seen ของ DEPARTURE)
+        """
+        seq = self._event_seqs.get(session.device_id)
+        if seq is None:
+            seq = self._event_seqs[session.device_id] = itertools.count(1)
+        shards: Dict[int, dict] = {}
+        for tid, reader_ts in tags.items():
+            event = (make_event_id(session.device_id, next(seq), reader_ts), reader_ts)
+            shards.setdefault(self._shard_of(tid), {})[tid] = event
+        for index, subset in shards.items():
+            self._worker_queues[index].put((session, subset, kind))
+        self.intake_batches += 1
+
+    def _shard_of(self, tag_id: str) -> int:
+        return zlib.crc32(tag_id.encode("utf-8")) % self.workers
+
+    # ---------- workers ----------
+    def _worker_loop(self, index: int):
+        q = self._worker_queues[index]
+        stats = self._worker_stats[index]
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            # รวม batch ที่ค้างอยู่ของแต่ละ (device, ชนิดงาน) ให้เหลือการเขียนครั้งเดียว
+            # แต่ไม่รวมข้าม batch ชนิดตรงข้ามของ device เดียวกัน เพื่อรักษาลำดับ ARRIVAL/DEPARTURE
+            items = [item]
+            while len(items) < self.max_merge:
+                try:
+                    items.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            groups = []  # [(session, kind, tags)]
+            last_group = {}  # (device_id, kind) -> index ใน groups
+            for s, more, kind in items:
+                group_idx = last_group.get((s.device_id, kind))
+                other = last_group.get((s.device_id, DEPARTURE if kind == ARRIVAL else ARRIVAL))
+                if group_idx is not None and groups[group_idx][0] is s and (other is None or other < group_idx):
+                    batch = groups[group_idx][2]
+                    for tid, event in more.items():
+                        # tag เดียวกันซ้ำใน batch ที่รวม: ใช้ event แรก
+                        batch.setdefault(tid, event)
+                else:
+                    last_group[(s.device_id, kind)] = len(groups)
+                    groups.append((s, kind, dict(more)))
+
+            for s, kind, batch in groups:
+                if s.thread_stop.is_set() or not s.is_connected:
+                    continue
+                if self.spool is not None and self.spool.should_spool():
+                    self._spool(s, kind, batch)
+                    continue
+                fn = self.departure_fn if kind == DEPARTURE else self.process_fn
+                start = time.perf_counter()
+                try:
+                    fn(s, batch)
+                except Exception as e:
+                    if self.spool is not None and is_connection_error(e):
+                        self.spool.mark_unavailable(e)
+                        self._spool(s, kind, batch)
+                    else:
+                        stats.errors += 1
+                        logger.error(f"Ingestion worker {index} error (device {s.device_id}): {e}")
+                stats.busy_seconds += time.perf_counter() - start
+                stats.batches += 1
+                stats.tags += len(batch)
+                stats.last_batch_at = time.time()
+
+    def _spool(self, session, kind: str, batch: dict):
+        if self.spool.append(session.device_id, session.location_id, kind, batch):
+            self.spooled += 1
+
+    # ---------- metrics ----------
+    def stats(self) -> dict:
+        with self._sessions_lock:
+            registered = len(self._sessions)
+        depths = [q.qsize() for q in self._worker_queues]
+        intake_depth = 0
+        ring_dropped = 0
+        for s in self._active_sessions():
+            intake_depth += s.ring.pending()
+            ring_dropped += s.ring.dropped
+        return {
+            "running": self.is_running(),
+            "workers": self.workers,
+            "registered_devices": registered,
+            "intake_queue_depth": intake_depth,
+            "intake_records": self.intake_records,
+            "intake_keepalive_records": self.intake_keepalive_records,
+            "intake_filtered": self.intake_filtered,
+            "ring_dropped": ring_dropped,
+            "intake_batches": self.intake_batches,
+            "exit_mode": "absence" if self.departure_fn is not None else "toggle",
+            "arrivals": self.arrivals,
+            "departures": self.departures,
+            "arbitration": self.arbiter.stats(),
+            "spooled_batches": self.spooled,
+            "spool": self.spool.stats() if self.spool is not None else None,
+            "worker_queue_depth": depths,
+            "total_queue_depth": intake_depth + sum(depths),
+            "per_worker": [s.snapshot() for s in self._worker_stats],
+        }
@@ -0,0 +1,197 @@
+"""
+Location Directory - ข้อมูล locations ในหน่วยความจำแบบ snapshot ที่แก้ไขไม่ได้
+=====================================================================
+
+ตาราง locations แทบไม่เปลี่ยน (เดือนละครั้ง) แต่ถูกอ่านหลายพันครั้งต่อชั่วโมง
+(ชื่อ location ใน notification, alert, ประวัติ movement และกฎการเปลี่ยนตำแหน่ง)
+
+หลักการ:
+- โหลดครั้งเดียวเป็น snapshot: location_id -> LocationInfo (namedtuple) ห่อด้วย MappingProxyType
+- reload() สร้าง snapshot ใหม่แล้วสลับทั้งก้อน ผู้อ่านไม่ต้องล็อกและไม่เห็นข้อมูลครึ่ง ๆ กลาง ๆ
+- reload_if_changed(): ตรวจ COUNT(*)/MAX(updated_at) ก่อน จึงตรวจถี่ได้โดยไม่ต้องโหลดทั้งตาราง
+- subscribe(fn): fn(snapshot) ถูกเรียกทุกครั้งที่สลับ snapshot (เช่น location_rules สร้างกฎใหม่)
+- ยังโหลดไม่ได้: ใช้ DEFAULT_LOCATIONS (ตรงกับข้อมูลตั้งต้นใน READMe)
+
+การใช้งาน:
+    from location_directory import location_directory
+
+    location_directory.name(location_id)       # "โรงงาน"
+    snapshot = location_directory.snapshot()   # อ่านหลายค่าจาก snapshot เดียวกัน
+"""
+
+import logging
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+from typing import Callable, List, Mapping, Optional
+
+from config.database import get_db_connection, POOL_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+LocationInfo = namedtuple("LocationInfo", ["location_id", "name", "direction", "ip_address", "port"])
+
+DEFAULT_LOCATIONS = {
+    1: LocationInfo(1, "โรงงาน", "gate", None, None),
+    2: LocationInfo(2, "ห้องช่าง", "gate", None, None),
+    3: LocationInfo(3, "นอกพื้นที่", "out", None, None),
+}
+
+UNKNOWN_LOCATION_NAME = "ไม่ระบุ"
+
+class LocationDirectory:
+    """
+    snapshot ของตาราง locations (อ่านได้จากทุก thread โดยไม่ล็อก)
+
+    Attributes:
+        version: เพิ่มขึ้นทุกครั้งที่สลับ snapshot
+        loaded: True เมื่อโหลดจากฐานข้อมูลสำเร็จอย่างน้อยครั้งหนึ่ง
+    """
+
+    def __init__(self):
+        self._snapshot: Mapping[int, LocationInfo] = MappingProxyType(dict(DEFAULT_LOCATIONS))
+        self._lock = threading.Lock()
+        self._signature = None
+        self._listeners: List[Callable] = []
+        self._auto_reload_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.version = 0
+        self.loaded = False
+        self.reloads = 0
+        self.misses = 0
+
+    # ---------- read ----------
+    def snapshot(self) -> Mapping[int, LocationInfo]:
+        return self._snapshot
+
+    def get(self, location_id) -> Optional[LocationInfo]:
+        return self._snapshot.get(location_id)
+
+    def name(self, location_id, default: Optional[str] = None) -> str:
+        """ชื่อ location (None -> "ไม่ระบุ", ไม่รู้จัก -> default หรือ "Location {id}")"""
+        if location_id is None:
+            return UNKNOWN_LOCATION_NAME
+        info = self._snapshot.get(location_id)
+        if info is None:
+            self.misses += 1
+            return default if default is not None else f"Location {location_id}"
+        return info.name
+
+    def outside_ids(self) -> List[int]:
+        return sorted(loc for loc, info in self._snapshot.items() if info.direction == "out")
+
+    # ---------- swap ----------
+    def _swap(self, locations: dict):
+        with self._lock:
+            self._snapshot = MappingProxyType(locations)
+            self.version += 1
+            snapshot = self._snapshot
+        for fn in list(self._listeners):
+            try:
+                fn(snapshot)
+            except Exception as e:
+                logger.error(f"Location directory listener failed: {e}")
+
+    def subscribe(self, fn: Callable):
+        """fn(snapshot) ถูกเรียกทุกครั้งที่ snapshot เปลี่ยน (และทันทีด้วย snapshot ปัจจุบัน)"""
+        if fn not in self._listeners:
+            self._listeners.append(fn)
+        fn(self._snapshot)
+
+    # ---------- reload ----------
+    def reload(self) -> bool:
+        """อ่านตาราง locations แล้วสลับ snapshot (คืน True ถ้าสำเร็จ)"""
+        conn = cur = None
+        try:
+            conn = get_db_connection(POOL_BACKGROUND)
+            cur = conn.cursor(dictionary=True)
+            cur.execute("""
+                SELECT location_id, name, direction, ip_address, port
+                FROM locations ORDER BY location_id
+            """)
+            rows = cur.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to load locations: {e}")
+            return False
+        finally:
+            try:
+                if cur:
+                    cur.close()
+                if conn:
+                    conn.close()
+            except Exception:
+                pass
+
+        if not rows:
+            logger.warning("locations table is empty - keeping current location directory")
+            return False
+        locations = {
+            row["location_id"]: LocationInfo(
+                row["location_id"],
+                row.get("name") or f"Location {row['location_id']}",
+                row.get("direction") or "gate",
+                row.get("ip_address"),
+                row.get("port"),
+            )
+            for row in rows
+        }
+        self.loaded = True
+        self.reloads += 1
+        self._swap(locations)
+        logger.info(f"Location directory loaded: {len(locations)} locations (version {self.version})")
+        return True
+
+    def _current_signature(self):
+        conn = get_db_connection(POOL_BACKGROUND)
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT COUNT(*), MAX(updated_at) FROM locations")
+            return tuple(cur.fetchone())
+        finally:
+            cur.close()
+            conn.close()
+
+    def reload_if_changed(self) -> bool:
+        """reload เฉพาะเมื่อจำนวนแถวหรือ updated_at ล่าสุดของ locations เปลี่ยน"""
+        try:
+            signature = self._current_signature()
+        except Exception as e:
+            logger.error(f"Failed to check locations for changes: {e}")
+            return False
+        if signature == self._signature:
+            return False
+        if self.reload():
+            self._signature = signature
+            return True
+        return False
+
+    def start_auto_reload(self, interval: float = 30.0):
+        """โหลดตอนเริ่ม แล้วตรวจการเปลี่ยนแปลงของ locations ทุก interval วินาทีใน background"""
+        if self._auto_reload_thread and self._auto_reload_thread.is_alive():
+            return self._auto_reload_thread
+        self._stop.clear()
+
+        def _loop():
+            while True:
+                self.reload_if_changed()
+                if self._stop.wait(interval):
+                    break
+
+        self._auto_reload_thread = threading.Thread(target=_loop, name="location-directory-reload", daemon=True)
+        self._auto_reload_thread.start()
+        return self._auto_reload_thread
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "loaded": self.loaded,
+            "locations": len(self._snapshot),
+            "reloads": self.reloads,
+            "misses": self.misses,
+        }
+
+# Global instance
+location_directory = LocationDirectory()
@@ -0,0 +1,133 @@
+"""
+Location Rules - ตารางการเปลี่ยนตำแหน่งของ tag ตามชนิดของ location
+===================================================================
+
+แทนเงื่อนไข location 1/2/3 ที่เขียนตายตัวใน routers/scan.py
+กฎถูกสร้างจากคอลัมน์ direction ของตาราง locations:
+
+- gate / both: ประตู - อ่านเจอขณะอยู่นอกพื้นที่ = ENTER, อ่านเจอซ้ำขณะอยู่ที่ประตูนี้ = EXIT (โหมด toggle)
+               โหมด absence: ปรากฏ = ENTER, หายไปเกิน ABSENCE_TIMEOUT = EXIT
+- in: จุดรับเข้า - อ่านเจอ = ENTER เท่านั้น ไม่มี EXIT
+- out: นอกพื้นที่ - อ่านเจอ = ENTER เข้าโซนนอกพื้นที่ (location แรกที่เป็น out คือปลายทางของ EXIT)
+
+ตารางถูกคำนวณล่วงหน้าสำหรับทุกคู่ (เครื่องอ่าน, ตำแหน่งปัจจุบัน) การตัดสินแต่ละครั้งจึงเป็น dict lookup เดียว
+ข้อมูล locations มาจาก location_directory: ทุกครั้งที่ snapshot เปลี่ยน ตารางจะถูกสร้างใหม่แล้วสลับทั้งก้อน
+(ผู้อ่านไม่ต้องล็อก)
+
+การใช้งาน:
+    from location_rules import transition_table, READ
+
+    transition = transition_table.resolve(READ, reader_location_id, current_location_id, status)
+"""
+
+import logging
+import threading
+from collections import namedtuple
+from typing import Dict, Mapping
+
+from location_directory import location_directory, DEFAULT_LOCATIONS
+
+logger = logging.getLogger(__name__)
+
+# ชนิดเหตุการณ์ที่ใช้ค้นตาราง
+READ = "read"            # โหมด toggle: อ่านเจอหลังพ้น DELAY_SECONDS
+ARRIVAL = "arrival"      # โหมด absence: tag เพิ่งปรากฏที่เครื่อง
+DEPARTURE = "departure"  # โหมด absence: tag หายไปเกิน ABSENCE_TIMEOUT
+
+# ค่าเริ่มต้นเมื่ออ่านตาราง locations ไม่ได้ (ตรงกับข้อมูลตั้งต้นใน READMe)
+DEFAULT_DIRECTIONS = {loc: info.direction for loc, info in DEFAULT_LOCATIONS.items()}
+DEFAULT_OUTSIDE_LOCATION_ID = 3
+
+# keep_borrowed: ถ้า tag ถูกยืมอยู่ ให้คงสถานะ borrowed แทน status ของกฎ
+Rule = namedtuple("Rule", ["to_location_id", "event_type", "status", "action", "keep_borrowed"])
+
+class TransitionTable:
+    """
+    ตาราง (event, reader_location_id, current_location_id) -> Rule
+
+    Attributes:
+        directions: location_id -> direction ที่ใช้สร้างตารางล่าสุด
+        outside_location_id: location ปลายทางของ EXIT
+        version: เพิ่มขึ้นทุกครั้งที่สร้างตารางใหม่
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = 0
+        self._build(DEFAULT_DIRECTIONS)
+
+    # ---------- build ----------
+    def _build(self, directions: Dict[int, str]):
+        outside_ids = sorted(loc for loc, d in directions.items() if d == "out")
+        outside = outside_ids[0] if outside_ids else DEFAULT_OUTSIDE_LOCATION_ID
+
+        rules = {}
+        currents = list(directions) + [None]
+        for reader, direction in directions.items():
+            for current in currents:
+                if current == reader:
+                    # tag อยู่ที่เครื่องนี้อยู่แล้ว: ประตูในโหมด toggle และ absence (เมื่อหายไป) = EXIT
+                    if direction in ("gate", "both"):
+                        exit_rule = Rule(outside, "exit", "idle", "EXIT", False)
+                        rules[(READ, reader, current)] = exit_rule
+                        rules[(DEPARTURE, reader, current)] = exit_rule
+                    continue
+
+                if direction == "out":
+                    enter_rule = Rule(reader, "enter", "idle", "ENTER", False)
+                else:
+                    enter_rule = Rule(reader, "enter", "in_use", "ENTER", True)
+                rules[(ARRIVAL, reader, current)] = enter_rule
+                # โหมด toggle (เดิม): ประตูรับ ENTER เฉพาะจากนอกพื้นที่ ส่วน in/out รับจากทุกที่
+                if direction not in ("gate", "both") or current in outside_ids or current == outside:
+                    rules[(READ, reader, current)] = enter_rule
+
+        with self._lock:
+            self._rules = rules
+            self.directions = dict(directions)
+            self.outside_location_id = outside
+            self.version += 1
+
+    # ---------- resolve ----------
+    def resolve(self, event: str, reader_location_id, current_location_id, current_status):
+        """
+        Returns:
+            tuple: (to_loc, event_type, new_status, action) หรือ None ถ้าไม่มีการเปลี่ยนแปลง
+        """
+        rules = self._rules
+        rule = rules.get((event, reader_location_id, current_location_id))
+        if rule is None and current_location_id not in self.directions:
+            # tag อยู่ที่ location ที่ยังไม่อยู่ในตาราง (เช่นเพิ่งเพิ่ม) ใช้กฎเดียวกับ tag ที่ไม่มี location
+            rule = rules.get((event, reader_location_id, None))
+        if rule is None:
+            return None
+        status = "borrowed" if rule.keep_borrowed and current_status == "borrowed" else rule.status
+        return rule.to_location_id, rule.event_type, status, rule.action
+
+    def is_outside(self, location_id) -> bool:
+        return location_id == self.outside_location_id
+
+    # ---------- reload ----------
+    def rebuild(self, snapshot: Mapping):
+        """สร้างกฎใหม่จาก snapshot ของ location_directory (listener)"""
+        directions = {loc: (info.direction or "gate") for loc, info in snapshot.items()}
+        if not directions:
+            return
+        self._build(directions)
+        logger.info(f"Location rules rebuilt: {len(directions)} locations, outside={self.outside_location_id}, {len(self._rules)} rules")
+
+    def reload(self) -> bool:
+        """โหลดตาราง locations ใหม่ทันที (กฎถูกสร้างใหม่ผ่าน listener)"""
+        return location_directory.reload()
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "locations": len(self.directions),
+            "rules": len(self._rules),
+            "outside_location_id": self.outside_location_id,
+        }
+
+# Global instance
+transition_table = TransitionTable()
+location_directory.subscribe(transition_table.rebuild)
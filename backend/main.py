@@ -31,6 +31,12 @@ import asyncio
 from datetime import datetime
 from fastapi.websockets import WebSocket, WebSocketDisconnect
 from ws_manager import manager
+from tag_state_cache import tag_cache
+from location_directory import location_directory
+from notification_buffer import notification_buffer
+from runtime_config import runtime_config
+from migrations import apply_migrations
+from config.settings import is_mysql
 import json
 
 # นำเข้า routers ทั้งหมด - แต่ละ router จัดการ endpoint ที่เกี่ยวข้อง
@@ -44,6 +50,8 @@ from routers.notifications import router as notifications_router  # จัดก
 from routers.system_config import router as system_config_router  # จัดการการตั้งค่าระบบ
 from routers.scanner_config import router as scanner_config_router  # จัดการการตั้งค่าเครื่องสแกน
 from routers.scan import router as scan_router             # จัดการการสแกน RFID
+from routers.scan import ingestion_pool                     # ingestion stage กลางของผลสแกน
+from routers.scan import scan_spool, start_scan_spool       # spool ผลสแกนระหว่างที่ DB ล่ม
 from routers.borrowing import router as borrowing_router   # จัดการระบบยืม-คืน
 
 # ตั้งค่า logging ระบบ
@@ -72,12 +80,38 @@ async def lifespan(app: FastAPI):
     logger.info(f"   Database: {settings.database_url}")
     logger.info(f"   Debug Mode: {settings.debug}")
     
+    # apply schema migrations ที่ค้าง (เช่น notifications.dedupe_key) ก่อนเริ่ม pipeline
+    if is_mysql():
+        try:
+            result = apply_migrations()
+            logger.info(f"Schema migrations: current={result['current']} applied={result['applied']} pending={result['pending']}")
+        except Exception as e:
+            logger.error(f"Failed to apply schema migrations: {e}")
+    
+    # โหลดสถานะ tag เข้าแคชใน background (scan pipeline ใช้แทนการ SELECT)
+    tag_cache.start_warm()
+    # โหลด system_config/device_configs เข้าแคช และ reload เป็นระยะ
+    runtime_config.reload()
+    runtime_config.start_auto_refresh(settings.runtime_config_refresh)
+    # โหลด locations เข้า location_directory (ชื่อ + กฎการเปลี่ยนตำแหน่ง) และตรวจการแก้ไขเป็นระยะ
+    location_directory.start_auto_reload()
+    # replay ผลสแกนที่ค้างใน spool จากการทำงานครั้งก่อน
+    start_scan_spool()
+    # เขียน/broadcast movement notification เป็นชุด
+    notification_buffer.start()
+    
     # TODO: เพิ่มการเริ่มต้น background tasks, database connections, etc.
     
     yield  # ระบบทำงาน
     
     # === SHUTDOWN ===
     logger.info("🛑 RFID Management System shutting down")
+    ingestion_pool.stop()
+    notification_buffer.stop()
+    if scan_spool is not None:
+        scan_spool.stop()
+    location_directory.stop()
+    runtime_config.stop()
     # TODO: ปิดการเชื่อมต่อฐานข้อมูล, ล้างทรัพยากร
 
 # สร้าง FastAPI application instance
@@ -156,10 +190,14 @@ def websocket_status():
         "client_info": {
             client_id: {
                 "connected_at": info["connected_at"].isoformat(),
-                "client_address": info["client_address"]
+                "client_address": info["client_address"],
+                "topics": manager.get_subscriptions(info["websocket"]),
+                "sender": manager.get_sender_stats(info["websocket"])
             }
             for client_id, info in manager.get_client_info().items()
         },
+        "subscriptions": manager.get_subscription_stats(),
+        "replay": manager.get_replay_stats(),
         "status": "running" if manager.get_connection_count() > 0 else "idle"
     }
 
@@ -277,13 +315,31 @@ async def websocket_endpoint(websocket: WebSocket):
     - scan_result: ผลการสแกน RFID
     - asset_update: การอัปเดตข้อมูลสินทรัพย์
     - system_status: สถานะระบบ
+    - subscribed: ยืนยัน topic ที่สมัคร
+
+    Message Types ที่รับจาก client:
+    - ping
+    - subscribe: {"type": "subscribe", "topics": {"location": [1], "device": [2], "type": ["tag_update"], "priority": ["high"]}}
+      รับเฉพาะ payload ที่ตรง topic (มิติที่ไม่ระบุไม่กรอง) หรือกำหนดตอนเชื่อมต่อ: /ws/realtime?location=1&type=tag_update
+    - unsubscribe: กลับไปรับทุกอย่าง
+    - batching: {"type": "batching", "enabled": true} รับข้อความเป็น frame รวม
+      {"type": "batch", "count": n, "messages": [...]} ทุก WS_BATCH_WINDOW วินาที (หรือ /ws/realtime?batch=1)
+
+    Resume: ทุก broadcast มี "seq" - เชื่อมต่อใหม่ด้วย /ws/realtime?resume=<seq ล่าสุด>&epoch=<epoch>
+    เพื่อรับเฉพาะข้อความที่พลาด ตามด้วย "resumed" หรือได้ "snapshot_required" ถ้าต้องโหลดข้อมูลใหม่ทั้งหมด
     """
     client_address = websocket.client.host if websocket.client else 'unknown'
     client_id = f"client_{client_address}_{datetime.now().strftime('%H%M%S')}"
     
     try:
-        # เชื่อมต่อ WebSocket
-        await manager.connect(websocket, client_id)
+        # เชื่อมต่อ WebSocket (subscription เริ่มต้นจาก query string ถ้ามี)
+        topics = {dim: websocket.query_params[dim] for dim in ("location", "device", "type", "priority")
+                  if websocket.query_params.get(dim)}
+        batch = websocket.query_params.get("batch", "").lower() in ("1", "true", "yes")
+        resume = websocket.query_params.get("resume")
+        await manager.connect(websocket, client_id, topics, batch=batch,
+                              resume_seq=resume if resume not in (None, "") else None,
+                              epoch=websocket.query_params.get("epoch"))
         
         # รอรับข้อความจาก client
         while True:
@@ -304,6 +360,17 @@ async def websocket_endpoint(websocket: WebSocket):
                             'type': 'pong',
                             'message': 'Server is alive'
                         })
+                    elif message_type == 'batching':
+                        await manager.send_to_websocket(websocket, {
+                            'type': 'batching',
+                            'window': manager.set_batching(websocket, bool(message.get('enabled', True)))
+                        })
+                    elif message_type in ('subscribe', 'unsubscribe'):
+                        topics = message.get('topics') if message_type == 'subscribe' else None
+                        await manager.send_to_websocket(websocket, {
+                            'type': 'subscribed',
+                            'topics': manager.subscribe(websocket, topics)
+                        })
                     
                 except json.JSONDecodeError:
                     logger.warning(f"Invalid JSON from {client_id}: {data}")
@@ -8,7 +8,9 @@ Command Line Interface สำหรับจัดการระบบ RFID Man
 
 Available Commands:
 - create-mysql-db: สร้างฐานข้อมูล MySQL
-- init-db: สร้างตารางฐานข้อมูล
+- init-db: สร้างตารางฐานข้อมูล + apply migrations
+- migrate: apply schema migrations (indexes ของ hot query)
+- index-advisor: EXPLAIN hot queries และแจ้ง full table scan
 - check-db: ตรวจสอบการเชื่อมต่อฐานข้อมูล
 - backup-db: สำรองฐานข้อมูล (SQLite only)
 - reset-db: รีเซ็ตฐานข้อมูล (development only)
@@ -122,7 +124,7 @@ def init_db():
     1. ตรวจสอบว่าฐานข้อมูลเชื่อมต่อได้
     2. สร้าง directories ที่จำเป็น
     3. สร้างตารางจาก models.py
-    4. เพิ่มข้อมูลเริ่มต้น (ถ้ามี)
+    4. apply schema migrations (migrations.py)
     """
     print("🔧 Initializing database...")
     try:
@@ -135,6 +137,7 @@ def init_db():
             print("✅ Database initialized successfully")
             print(f"   Database: {settings.database_url}")
             print("   All tables created successfully")
+            migrate()
         else:
             print("❌ Database initialization failed")
             sys.exit(1)
@@ -149,6 +152,45 @@ def init_db():
         print("3. Make sure database exists (use create-mysql-db command)")
         sys.exit(1)
 
+def migrate():
+    """
+    apply schema migrations ที่ยังไม่ได้ใช้ (ดู migrations.py)
+    บันทึกเวอร์ชันไว้ในตาราง schema_migrations จึงรันซ้ำได้
+    """
+    from migrations import apply_migrations
+
+    print("🔧 Applying schema migrations...")
+    result = apply_migrations()
+    if result["applied"]:
+        print(f"✅ Applied migrations: {', '.join(str(v) for v in result['applied'])}")
+    else:
+        print("✅ Schema is up to date")
+    if result["pending"]:
+        print(f"⚠️  Pending (missing tables): {', '.join(str(v) for v in result['pending'])}")
+    print(f"   Current schema version: {result['current']}")
+
+def index_advisor():
+    """
+    รัน EXPLAIN กับ hot queries ที่ลงทะเบียนไว้ใน migrations.HOT_QUERIES
+    แจ้งตารางที่ถูก full scan / filesort เพื่อเพิ่ม migration ใหม่
+    """
+    from migrations import explain_hot_queries
+
+    print("🔍 Explaining hot queries...")
+    report = explain_hot_queries()
+    problems = 0
+    for row in report:
+        flag = "❌" if row["problem"] else "✅"
+        print(f"{flag} {row['query']:<22} table={row['table']} type={row['type']} "
+              f"key={row['key']} rows={row['rows']}")
+        if row["problem"]:
+            problems += 1
+            print(f"     → {row['problem']} {row['extra'] or ''}".rstrip())
+    if problems:
+        print(f"\n⚠️  {problems} plan(s) need attention - run 'python manage.py migrate'")
+        sys.exit(1)
+    print("\n✅ All hot queries use indexes")
+
 def check_db():
     """
     ตรวจสอบการเชื่อมต่อฐานข้อมูล
@@ -439,6 +481,8 @@ Examples:
   python manage.py config           # Show current configuration
   python manage.py init-db          # Initialize database
   python manage.py check-db         # Check database connection
+  python manage.py migrate          # Apply schema migrations
+  python manage.py index-advisor    # EXPLAIN hot queries
   python manage.py create-mysql-db  # Create MySQL database
         """
     )
@@ -446,7 +490,8 @@ Examples:
     # เพิ่ม command choices
     parser.add_argument('command', choices=[
         'init-db', 'check-db', 'backup-db', 'reset-db', 'create-mysql-db',
-        'config', 'create-env', 'check-scanner', 'install-deps', 'structure'
+        'config', 'create-env', 'check-scanner', 'install-deps', 'structure',
+        'migrate', 'index-advisor'
     ], help='Command to run')
     
     # ถ้าไม่มี arguments แสดง help
@@ -482,6 +527,10 @@ Examples:
             install_deps()
         elif args.command == 'structure':
             show_structure()
+        elif args.command == 'migrate':
+            migrate()
+        elif args.command == 'index-advisor':
+            index_advisor()
             
     except KeyboardInterrupt:
         print("\n⚠️  Operation cancelled by user")
@@ -0,0 +1,242 @@
+"""
+Schema Migrations - migration แบบมีเวอร์ชันและ index advisor สำหรับ query ที่ใช้บ่อย
+=====================================================================
+
+create_database.sql สร้างแค่ฐานข้อมูล ส่วน index ที่ query หลักต้องใช้ไม่มีที่ไหนกำหนดไว้
+โมดูลนี้เก็บรายการ migration ตามลำดับเวอร์ชัน และบันทึกเวอร์ชันที่ใช้แล้วในตาราง schema_migrations
+
+หลักการ:
+- MIGRATIONS: (version, description, steps) เรียงตาม version ห้ามแก้ migration ที่ปล่อยไปแล้ว ให้เพิ่มเวอร์ชันใหม่
+- step แต่ละแบบตรวจ information_schema ก่อน จึงรันซ้ำได้ (เช่นฐานข้อมูลที่สร้างจาก README มี index บางตัวอยู่แล้ว)
+- index ถือว่ามีอยู่แล้วถ้ามี index อื่นที่คอลัมน์นำหน้าตรงกัน (เช่น index ของ foreign key)
+- ถ้าตารางยังไม่มี step นั้นจะถูกข้าม และ migration จะยังไม่ถูกบันทึก (รันใหม่ได้เมื่อสร้างตารางแล้ว)
+- HOT_QUERIES: query ที่อยู่ใน hot path ใช้กับ explain_hot_queries() เพื่อหา full table scan
+
+การใช้งาน:
+    python manage.py init-db         # สร้างตาราง + apply migrations
+    python manage.py migrate         # apply migrations อย่างเดียว
+    python manage.py index-advisor   # EXPLAIN hot queries
+"""
+
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+from config.database import get_db_connection, POOL_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------
+# Migrations
+# ----------------------------
+
+# step: ("column", table, column, definition) หรือ ("index", table, index_name, columns, unique)
+MIGRATIONS: List[Tuple[int, str, list]] = [
+    (1, "movements.event_id สำหรับ dedupe การ retry/replay", [
+        ("column", "movements", "event_id", "VARCHAR(64) NULL"),
+        ("index", "movements", "uq_movements_event_id", ("event_id",), True),
+    ]),
+    (2, "indexes ของ hot query (tags, movements, notifications, borrowing_records)", [
+        # GET /api/tags และ monitor: ORDER BY last_seen DESC
+        ("index", "tags", "idx_tags_last_seen", ("last_seen",), False),
+        # /api/scan/status: LEFT JOIN tags ... GROUP BY device_id
+        ("index", "tags", "idx_tags_device_id", ("device_id",), False),
+        # GET /api/movements: ORDER BY m.timestamp DESC LIMIT
+        ("index", "movements", "idx_movements_timestamp", ("timestamp",), False),
+        # ประวัติของ asset: WHERE asset_id = %s ORDER BY timestamp DESC
+        ("index", "movements", "idx_movements_asset_ts", ("asset_id", "timestamp"), False),
+        # รายการ notification ตาม type: WHERE type = %s ORDER BY created_at DESC
+        ("index", "notifications", "idx_notifications_type_created", ("type", "created_at"), False),
+        # รายการยืมที่ยังไม่คืน / เกินกำหนด
+        ("index", "borrowing_records", "idx_borrowing_status_return", ("status", "return_date"), False),
+    ]),
+    (3, "notifications.dedupe_key สำหรับกันซ้ำข้าม process (notification_dedupe.py)", [
+        ("column", "notifications", "dedupe_key", "VARCHAR(64) NULL"),
+        ("index", "notifications", "uq_notifications_dedupe_key", ("dedupe_key",), True),
+    ]),
+]
+
+SCHEMA_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+def _table_exists(cur, table: str) -> bool:
+    cur.execute(
+        "SELECT 1 FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+        (table,),
+    )
+    return cur.fetchone() is not None
+
+def _column_exists(cur, table: str, column: str) -> bool:
+    cur.execute(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+        (table, column),
+    )
+    return cur.fetchone() is not None
+
+def _index_columns(cur, table: str) -> dict:
+    """คืน {index_name: (unique, [columns ตามลำดับ])} ของตาราง"""
+    cur.execute(
+        "SELECT index_name, non_unique, column_name FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s ORDER BY index_name, seq_in_index",
+        (table,),
+    )
+    indexes = {}
+    for name, non_unique, column in cur.fetchall():
+        entry = indexes.setdefault(name, (not int(non_unique), []))
+        entry[1].append(column.lower())
+    return indexes
+
+def _find_covering_index(cur, table: str, columns: Sequence[str], unique: bool) -> Optional[str]:
+    wanted = [c.lower() for c in columns]
+    for name, (is_unique, cols) in _index_columns(cur, table).items():
+        if unique:
+            # unique ต้องตรงทุกคอลัมน์ ไม่งั้นความหมายต่างกัน
+            if is_unique and cols == wanted:
+                return name
+        elif cols[:len(wanted)] == wanted:
+            return name
+    return None
+
+def _apply_step(cur, step) -> bool:
+    """รัน step เดียว คืน False ถ้าข้ามเพราะตารางยังไม่มี"""
+    kind, table = step[0], step[1]
+    if not _table_exists(cur, table):
+        logger.warning(f"Migration step skipped: table '{table}' does not exist")
+        return False
+
+    if kind == "column":
+        _, _, column, definition = step
+        if _column_exists(cur, table, column):
+            logger.info(f"Column {table}.{column} already exists")
+            return True
+        cur.execute(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
+        logger.info(f"Added column {table}.{column}")
+        return True
+
+    if kind == "index":
+        _, _, name, columns, unique = step
+        existing = _find_covering_index(cur, table, columns, unique)
+        if existing:
+            logger.info(f"Index on {table}({', '.join(columns)}) already exists as {existing}")
+            return True
+        cols_sql = ", ".join(f"`{c}`" for c in columns)
+        cur.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX `{name}` ON `{table}` ({cols_sql})")
+        logger.info(f"Created index {name} on {table}({', '.join(columns)})")
+        return True
+
+    raise ValueError(f"Unknown migration step: {kind}")
+
+def get_applied_versions(cur) -> set:
+    cur.execute(SCHEMA_TABLE_SQL)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {int(row[0]) for row in cur.fetchall()}
+
+def apply_migrations() -> dict:
+    """
+    apply migration ที่ยังไม่ได้ใช้ตามลำดับเวอร์ชัน
+
+    Returns:
+        {"applied": [...], "pending": [...], "current": version สูงสุดที่ใช้แล้ว}
+    """
+    conn = get_db_connection(POOL_BACKGROUND)
+    cur = conn.cursor()
+    applied, pending = [], []
+    try:
+        done = get_applied_versions(cur)
+        for version, description, steps in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if version in done:
+                continue
+            logger.info(f"Applying migration {version}: {description}")
+            # DDL ของ MySQL commit เอง - step จึงต้องรันซ้ำได้เสมอ
+            complete = all([_apply_step(cur, step) for step in steps])
+            if not complete:
+                pending.append(version)
+                continue
+            cur.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description[:255]),
+            )
+            conn.commit()
+            done.add(version)
+            applied.append(version)
+        return {"applied": applied, "pending": pending, "current": max(done) if done else 0}
+    finally:
+        cur.close()
+        conn.close()
+
+# ----------------------------
+# Index advisor
+# ----------------------------
+
+# (name, sql, params) - ใช้ค่าตัวอย่างแทน parameter จริง
+HOT_QUERIES: List[Tuple[str, str, tuple]] = [
+    ("tags.recent",
+     "SELECT tag_id, status, asset_id, current_location_id, last_seen "
+     "FROM tags ORDER BY last_seen DESC LIMIT 100", ()),
+    ("scan.status",
+     "SELECT d.device_id, COUNT(t.tag_id) AS tracked_count FROM rfid_devices d "
+     "LEFT JOIN tags t ON d.device_id = t.device_id GROUP BY d.device_id", ()),
+    ("movements.recent",
+     "SELECT movement_id, tag_id, `timestamp` FROM movements ORDER BY `timestamp` DESC LIMIT 100", ()),
+    ("movements.by_asset",
+     "SELECT movement_id, from_location_id, to_location_id, `timestamp` "
+     "FROM movements WHERE asset_id = %s ORDER BY `timestamp` DESC", (1,)),
+    ("notifications.by_type",
+     "SELECT id, title, created_at FROM notifications "
+     "WHERE type = %s ORDER BY created_at DESC LIMIT 50", ("movement",)),
+    ("borrowing.active",
+     "SELECT id FROM borrowing_records "
+     "WHERE status = 'borrowed' AND (return_date IS NULL OR return_date = '')", ()),
+]
+
+def explain_hot_queries(min_rows: int = 1000) -> List[dict]:
+    """
+    รัน EXPLAIN กับ HOT_QUERIES แล้วรายงานตารางที่ถูก full scan
+
+    Args:
+        min_rows: ตารางที่ประมาณการแถวน้อยกว่านี้ไม่นับว่าเป็นปัญหา (optimizer มักเลือก scan เองเมื่อตารางเล็ก)
+
+    Returns:
+        รายการ {"query", "table", "type", "key", "rows", "extra", "problem"} ต่อแถวของ EXPLAIN
+    """
+    conn = get_db_connection(POOL_BACKGROUND)
+    cur = conn.cursor(dictionary=True)
+    report = []
+    try:
+        for name, sql, params in HOT_QUERIES:
+            try:
+                cur.execute("EXPLAIN " + sql, params)
+                plan = cur.fetchall() or []
+            except Exception as e:
+                report.append({"query": name, "table": None, "type": None, "key": None,
+                               "rows": None, "extra": None, "problem": f"EXPLAIN failed: {e}"})
+                continue
+            for row in plan:
+                access = (row.get("type") or "").upper()
+                rows = int(row.get("rows") or 0)
+                extra = row.get("Extra") or ""
+                problem = None
+                if access == "ALL" and rows >= min_rows:
+                    problem = "full table scan"
+                elif access == "INDEX" and rows >= min_rows:
+                    problem = "full index scan"
+                elif "Using filesort" in extra and rows >= min_rows:
+                    problem = "filesort"
+                report.append({
+                    "query": name,
+                    "table": row.get("table"),
+                    "type": row.get("type"),
+                    "key": row.get("key"),
+                    "rows": rows,
+                    "extra": extra,
+                    "problem": problem,
+                })
+        return report
+    finally:
+        cur.close()
+        conn.close()
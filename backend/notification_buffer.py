@@ -0,0 +1,225 @@
+"""
+Notification Buffer - รวม movement notification เป็นชุดก่อนเขียนและ broadcast
+========================================================================
+
+เดิมทุก movement สร้าง INSERT notifications 1 แถวและ WebSocket frame 1 frame
+ช่วง peak จึงมี statement และ frame ย่อย ๆ หลายพันต่อวินาที
+
+หลักการ:
+- add()/add_many(): ใส่ notification เข้า buffer (ไม่แตะ DB ใน thread ที่เรียก)
+- flusher thread รอ window วินาทีหลังมีรายการแรก แล้วเขียนทั้งชุดด้วย multi-row INSERT ครั้งเดียว
+  และ broadcast เป็น frame เดียว: {"type": "notifications_batch", "count": n, "notifications": [...]}
+- ชุดละไม่เกิน max_batch แถว
+- เขียนไม่สำเร็จเพราะ DB ขาด: คืนรายการกลับเข้า buffer (ไม่เกิน max_pending) แล้วลองใหม่รอบถัดไป
+- window = 0 หรือยังไม่ start(): enabled() เป็น False ผู้เรียกใช้ทางเดิม (เขียนทันที)
+
+การใช้งาน:
+    from notification_buffer import notification_buffer
+
+    if notification_buffer.enabled():
+        notification_buffer.add({"type": "movement", "title": ..., "message": ..., "location_id": ...})
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from config.database import get_db_connection, is_connection_error, POOL_INGESTION
+from config.settings import settings
+from ws_manager import manager
+
+logger = logging.getLogger(__name__)
+
+RETRY_INTERVAL = 2.0  # วินาที - รอก่อนลองเขียนใหม่เมื่อ DB ขาด
+
+NOTIFICATION_BATCH_SQL = """
+    INSERT INTO notifications
+    (type, title, message, asset_id, location_id, related_id, priority, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, FROM_UNIXTIME(%s))
+"""
+
+class NotificationBuffer:
+    """
+    buffer ของ notification ที่ flush เป็นชุดตามเวลา (thread-safe)
+
+    Args:
+        window: เวลารวบรวมก่อน flush (วินาที, 0 = ปิด)
+        max_batch: จำนวนแถวสูงสุดต่อ INSERT / frame
+        max_pending: จำนวนรายการสูงสุดที่ค้างใน buffer (เกินแล้วทิ้งรายการเก่าสุด)
+    """
+
+    def __init__(self, window: float = 0.25, max_batch: int = 500, max_pending: int = 50_000):
+        self.window = max(0.0, float(window))
+        self.max_batch = max(1, int(max_batch))
+        self._pending = deque(maxlen=max_pending)
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.queued = 0
+        self.written = 0
+        self.batches = 0
+        self.frames = 0
+        self.failed = 0
+        self.last_batch_size = 0
+        self._deferred = False
+
+    def enabled(self) -> bool:
+        return self.window > 0 and self._thread is not None and self._thread.is_alive()
+
+    # ---------- write ----------
+    def add(self, notification: dict):
+        self.add_many((notification,))
+
+    def add_many(self, notifications: Iterable[dict]):
+        now = time.time()
+        with self._cond:
+            for notif in notifications:
+                notif.setdefault("created_ts", now)
+                self._pending.append(notif)
+                self.queued += 1
+            self._cond.notify()
+
+    # ---------- flush ----------
+    def _take(self) -> List[dict]:
+        with self._cond:
+            count = min(len(self._pending), self.max_batch)
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _requeue(self, batch: List[dict]):
+        with self._cond:
+            self._pending.extendleft(reversed(batch))
+
+    def _write(self, batch: List[dict]) -> Optional[int]:
+        """เขียนทั้งชุดใน transaction เดียว คืน id ของแถวแรก"""
+        conn = get_db_connection(POOL_INGESTION)
+        cur = conn.cursor()
+        try:
+            cur.executemany(NOTIFICATION_BATCH_SQL, [
+                (n.get("type", "movement"), n["title"], n["message"], n.get("asset_id"),
+                 n.get("location_id"), n.get("related_id"), n.get("priority", "normal"), n["created_ts"])
+                for n in batch
+            ])
+            # multi-row INSERT ได้ auto-increment ต่อเนื่อง: lastrowid คือ id ของแถวแรก
+            first_id = cur.lastrowid
+            conn.commit()
+            return first_id
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    def _broadcast(self, batch: List[dict], first_id: Optional[int]):
+        items = []
+        for offset, n in enumerate(batch):
+            notif_id = first_id + offset if first_id else None
+            created = datetime.fromtimestamp(n["created_ts"]).isoformat()
+            items.append({
+                "notif_id": notif_id,
+                "id": notif_id,
+                "type": n.get("type", "movement"),
+                "title": n["title"],
+                "message": n["message"],
+                "asset_id": n.get("asset_id"),
+                "user_id": None,
+                "location_id": n.get("location_id"),
+                "related_id": n.get("related_id"),
+                "tag_id": n.get("tag_id"),
+                "is_read": False,
+                "is_acknowledged": False,
+                "priority": n.get("priority", "normal"),
+                "timestamp": created,
+                "created_at": created,
+            })
+        manager.queue_message({"type": "notifications_batch", "count": len(items), "notifications": items})
+        self.frames += 1
+
+    def flush(self) -> int:
+        """เขียนและ broadcast ทุกรายการที่ค้างอยู่ คืนจำนวนแถวที่เขียน"""
+        total = 0
+        while True:
+            batch = self._take()
+            if not batch:
+                return total
+            try:
+                first_id = self._write(batch)
+            except Exception as e:
+                if is_connection_error(e):
+                    logger.warning(f"Notification batch deferred ({len(batch)} rows), database unavailable: {e}")
+                    self._requeue(batch)
+                    self._deferred = True
+                    return total
+                logger.error(f"Failed to write notification batch ({len(batch)} rows): {e}")
+                self.failed += len(batch)
+                continue
+            self._deferred = False
+            self.written += len(batch)
+            self.batches += 1
+            self.last_batch_size = len(batch)
+            total += len(batch)
+            try:
+                self._broadcast(batch, first_id)
+            except Exception as e:
+                logger.error(f"Failed to broadcast notification batch: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                while not self._pending and not self._stop.is_set():
+                    self._cond.wait(1.0)
+            # รวบรวมรายการที่ตามมาภายใน window (หรือรอ DB กลับมา)
+            if self._stop.wait(RETRY_INTERVAL if self._deferred else self.window):
+                break
+            self.flush()
+        self.flush()
+
+    def start(self):
+        """เริ่ม flusher thread (ไม่ทำอะไรถ้า window = 0)"""
+        if self.window <= 0:
+            return None
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="notification-buffer", daemon=True)
+        self._thread.start()
+        logger.info(f"Notification buffer started (window={self.window}s, max_batch={self.max_batch})")
+        return self._thread
+
+    def stop(self, timeout: float = 5.0):
+        """หยุด thread และ flush รายการที่เหลือ"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "enabled": self.enabled(),
+            "window": self.window,
+            "pending": pending,
+            "queued": self.queued,
+            "written": self.written,
+            "batches": self.batches,
+            "frames": self.frames,
+            "failed": self.failed,
+            "deferred": self._deferred,
+            "last_batch_size": self.last_batch_size,
+            "avg_batch_size": round(self.written / self.batches, 1) if self.batches else 0.0,
+        }
+
+# Global instance
+notification_buffer = NotificationBuffer(
+    window=settings.scan_notification_window,
+    max_batch=settings.scan_notification_max_batch,
+)
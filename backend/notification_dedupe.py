@@ -0,0 +1,107 @@
+"""
+Notification Dedupe - ดัชนีกัน notification ซ้ำในหน่วยความจำ
+=========================================================
+
+แทนการ query `message LIKE '%...%' AND created_at >= NOW() - INTERVAL` ทุกครั้งที่สร้าง notification
+(scan ทั้งตาราง notifications และช้าลงเรื่อย ๆ ตามขนาดตาราง)
+
+หลักการ:
+- key = (type, key ที่ normalize แล้ว เช่น tag_id / related_id) อายุเท่ากับ cooldown ของ notification นั้น
+- claim(): O(1) - คืน False ถ้า key เดียวกันถูกสร้างไปแล้วภายใน cooldown (ไม่ต้อง query)
+- entry หมดอายุตามลำดับเวลาผ่าน heap จึงใช้ cooldown ต่างกันได้ (5 วินาที - 1 ชั่วโมง)
+- db_key(): ค่าสำหรับคอลัมน์ notifications.dedupe_key (UNIQUE) ผูกกับช่วงเวลา cooldown
+  process อื่น (หรือหลัง restart) ที่ insert ซ้ำในช่วงเดียวกันจะชน unique key แทน
+
+การใช้งาน:
+    from notification_dedupe import notification_dedupe
+
+    if notification_dedupe.claim("alert", tag_id, 30):
+        ... INSERT ... dedupe_key = notification_dedupe.db_key("alert", tag_id, 30) ...
+"""
+
+import hashlib
+import heapq
+import re
+import threading
+import time
+from typing import Optional
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_key(value) -> str:
+    """ตัดช่องว่างซ้ำ / ตัวพิมพ์ และจำกัดความยาว (ข้อความยาวใช้ 60 ตัวแรกเหมือน LIKE เดิม)"""
+    return _WHITESPACE.sub(" ", str(value or "")).strip().lower()[:60]
+
+class NotificationDedupe:
+    """
+    set ของ (type, key) ที่มีอายุต่อ entry (thread-safe)
+
+    Args:
+        max_entries: จำนวน entry สูงสุด เต็มแล้วตัด entry ที่ใกล้หมดอายุที่สุดทิ้ง
+    """
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._expires = {}  # (type, key) -> เวลาหมดอายุ
+        self._heap = []     # (เวลาหมดอายุ, (type, key))
+        self._lock = threading.Lock()
+        self.claimed = 0
+        self.suppressed = 0
+
+    def _prune(self, now: float):
+        heap = self._heap
+        while heap and (heap[0][0] <= now or len(self._expires) >= self.max_entries):
+            expires_at, key = heapq.heappop(heap)
+            # entry ที่ถูก claim ใหม่จะมี heap item ใหม่ - ข้าม item เก่า
+            if self._expires.get(key) == expires_at:
+                del self._expires[key]
+
+    def is_recent(self, notif_type: str, key, now: Optional[float] = None) -> bool:
+        """ตรวจว่า key ถูก claim ภายใน cooldown หรือไม่ (ไม่ claim)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            expires_at = self._expires.get((notif_type, normalize_key(key)))
+            return expires_at is not None and expires_at > now
+
+    def claim(self, notif_type: str, key, cooldown: float, now: Optional[float] = None) -> bool:
+        """คืน True ถ้าสร้าง notification ได้ (และจองไว้ cooldown วินาที), False ถ้าซ้ำ"""
+        now = time.time() if now is None else now
+        entry = (notif_type, normalize_key(key))
+        with self._lock:
+            self._prune(now)
+            expires_at = self._expires.get(entry)
+            if expires_at is not None and expires_at > now:
+                self.suppressed += 1
+                return False
+            expires_at = now + cooldown
+            self._expires[entry] = expires_at
+            heapq.heappush(self._heap, (expires_at, entry))
+            self.claimed += 1
+            return True
+
+    def release(self, notif_type: str, key):
+        """ยกเลิกการจอง (เช่น INSERT ล้มเหลว) - heap item ที่ค้างจะถูกข้ามตอน prune"""
+        with self._lock:
+            self._expires.pop((notif_type, normalize_key(key)), None)
+
+    @staticmethod
+    def db_key(notif_type: str, key, cooldown: float, now: Optional[float] = None) -> str:
+        """ค่า dedupe_key ของช่วง cooldown ปัจจุบัน (sha1 hex, 40 ตัวอักษร)"""
+        now = time.time() if now is None else now
+        window = int(now // max(cooldown, 1))
+        raw = f"{notif_type}|{normalize_key(key)}|{int(cooldown)}|{window}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tracked_keys": len(self._expires),
+                "claimed": self.claimed,
+                "suppressed": self.suppressed,
+            }
+
+# Global instance
+notification_dedupe = NotificationDedupe()
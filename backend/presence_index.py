@@ -0,0 +1,167 @@
+"""
+Presence Index - รายการ tag ที่ "อยู่ในพื้นที่ตอนนี้" ของแต่ละเครื่อง
+==================================================================
+
+แทนที่ set/dict ที่โตไม่สิ้นสุดใน DeviceSession (current_scanned_tags, last_db_update_time)
+
+หลักการ (timing wheel แบบ TTL เดียว):
+- entry เรียงตามเวลา touch ล่าสุด (OrderedDict) เมื่อ TTL เท่ากันทุก entry
+  ลำดับนี้ก็คือลำดับการหมดอายุ
+- touch(): O(1) - ย้าย entry ไปท้ายสุด
+- expire(): O(จำนวนที่หมดอายุ) - ตัดจากหัวจนเจอ entry ที่ยังไม่หมดอายุ
+- จำกัดจำนวน entry (max_entries) - เกินแล้วตัด entry ที่เก่าสุดทิ้ง
+- เปลี่ยน ttl ระหว่างทำงานได้ (เช่น DELAY_SECONDS ถูกแก้)
+- track_expired=True: เก็บ entry ที่หมดอายุ (และที่ถูกตัดเพราะเกินขนาด) ไว้ให้ pop_expired() (ใช้ตรวจจับ tag ที่ออกจากพื้นที่)
+
+การใช้งาน:
+    presence = PresenceIndex(ttl=10)
+    presence.touch_many(tag_reads)   # tag_id -> ข้อมูลล่าสุด
+    len(presence)                    # จำนวน tag ในพื้นที่ตอนนี้
+    presence.items()                 # [(tag_id, value), ...]
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+class PresenceIndex:
+    """
+    Map ที่ entry หมดอายุเมื่อไม่ถูก touch ภายใน ttl วินาที (thread-safe)
+
+    ใช้แทน dict ได้ในจุดที่ต้องการ (get / [] / in / clear)
+
+    Attributes:
+        ttl: อายุของ entry นับจาก touch ล่าสุด (วินาที)
+        max_entries: จำนวน entry สูงสุด
+        expired / evicted: ตัวนับ entry ที่หมดอายุ / ถูกตัดเพราะเกินขนาด
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 100_000, track_expired: bool = False):
+        self.ttl = float(ttl)
+        self.max_entries = max_entries
+        self.track_expired = track_expired
+        self._entries: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        self._expired_entries: List[Tuple[str, object]] = []
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    # ---------- internal (เรียกภายใต้ lock) ----------
+    def _expire(self, now: float):
+        deadline = now - self.ttl
+        entries = self._entries
+        while entries:
+            key, (touched, _value) = next(iter(entries.items()))
+            if touched > deadline:
+                break
+            entries.popitem(last=False)
+            self.expired += 1
+            if self.track_expired:
+                self._expired_entries.append((key, _value))
+
+    def _put(self, key: str, value, now: float) -> bool:
+        """คืน True ถ้า key ยังไม่มีอยู่ (เพิ่งเข้ามาใหม่)"""
+        entry = self._entries.get(key)
+        is_new = entry is None or entry[0] <= now - self.ttl
+        self._entries[key] = (now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted_key, (_touched, evicted_value) = self._entries.popitem(last=False)
+            self.evicted += 1
+            # entry ที่ถูกตัดก็ถือว่า "ออก" - ไม่งั้น tag นั้นจะไม่มี DEPARTURE และค้างสถานะอยู่ในพื้นที่
+            if self.track_expired:
+                self._expired_entries.append((evicted_key, evicted_value))
+        return is_new
+
+    # ---------- write ----------
+    def touch(self, key: str, value=None, now: Optional[float] = None):
+        """บันทึกว่าเห็น key ตอนนี้ (ต่ออายุ entry)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            self._put(key, value, now)
+
+    def touch_many(self, items: Dict[str, object], now: Optional[float] = None) -> List[str]:
+        """touch หลาย key พร้อมกัน คืน key ที่เพิ่งเข้ามาใหม่ (ไม่มีอยู่หรือหมดอายุไปแล้ว)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            # expire ก่อน เพื่อให้ key ที่หมดอายุถูกนับเป็น "ออก" แล้ว "เข้าใหม่" ตามลำดับ
+            self._expire(now)
+            return [key for key, value in items.items() if self._put(key, value, now)]
+
+    def pop_expired(self, now: Optional[float] = None) -> List[Tuple[str, object]]:
+        """คืน entry ที่หมดอายุตั้งแต่ครั้งก่อน (ต้องเปิด track_expired) - ต้นทุนตามจำนวนที่หมดอายุ"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            expired, self._expired_entries = self._expired_entries, []
+            return expired
+
+    def __setitem__(self, key: str, value):
+        self.touch(key, value)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # ---------- read ----------
+    def get(self, key: str, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now - self.ttl:
+                return default
+            return entry[1]
+
+    def __getitem__(self, key: str):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire(time.time())
+            return len(self._entries)
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            self._expire(time.time())
+            return list(self._entries)
+
+    def items(self, limit: Optional[int] = None) -> List[Tuple[str, object]]:
+        """entry ที่ยังไม่หมดอายุ เรียงจากที่เห็นล่าสุดก่อน"""
+        with self._lock:
+            self._expire(time.time())
+            result = []
+            for key in reversed(self._entries):
+                if limit is not None and len(result) >= limit:
+                    break
+                result.append((key, self._entries[key][1]))
+            return result
+
+    def last_touched(self, key: str) -> Optional[float]:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.time())
+            return {
+                "size": len(self._entries),
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+_MISSING = object()
@@ -0,0 +1,148 @@
+"""
+Reader Arbiter - ตัดสินว่า tag อยู่ที่เครื่องอ่านไหน เมื่อหลายเครื่องอ่านเจอพร้อมกัน
+================================================================================
+
+ปัญหา: เครื่องที่ติดตั้งใกล้กัน (เช่น location 1 และ 2) อ่าน tag เดียวกันได้ทั้งคู่
+ถ้าส่งผลของทุกเครื่องไปเขียน DB ตรงๆ tag จะถูกย้ายไปมา (ping-pong) และแย่ง row lock กัน
+
+หลักการ (sliding window ต่อ tag):
+- offer(): รับ TagRead ของทุกเครื่องจาก intake เก็บเป็นผู้สมัครต่อ tag (รวม read ของเครื่องเดียวกันด้วย merge_reads)
+- window ของ tag เปิดเมื่อเห็นครั้งแรก และปิดหลังผ่านไป window วินาที
+- decide(): ตัดสิน tag ที่ window ปิดแล้ว เลือกเครื่องที่ได้คะแนนสูงสุดเพียงเครื่องเดียว
+  คะแนน (หน่วย dB) = RSSI สูงสุด + count_weight * log2(จำนวนครั้งที่อ่าน) - age_weight * อายุของ read ล่าสุด
+  คะแนนเท่ากัน: ผู้ชนะครั้งก่อนได้ต่อ (ลดการสลับไปมา)
+- window = 0: ตัดสินทุกรอบของ intake (ยังรวมเครื่องที่อ่านเจอในรอบเดียวกัน)
+
+ต้นทุน: offer O(จำนวน read), decide O(จำนวน tag ที่ window ปิด) - pending เรียงตามเวลาเปิด window
+
+การใช้งาน:
+    arbiter = ReaderArbiter(window=0.3)
+    arbiter.offer(session, reads)
+    for tag_id, read, winner, previous in arbiter.decide():
+        ...
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from presence_index import PresenceIndex
+from scan_transport import TagRead, merge_reads
+
+class ReaderArbiter:
+    """
+    รวม read ของทุกเครื่องใน sliding window แล้วเลือกเครื่องผู้ชนะต่อ tag
+
+    Args:
+        window: ระยะเวลารวม read ก่อนตัดสิน (วินาที)
+        count_weight: คะแนนที่ได้ต่อจำนวนครั้งที่อ่านเพิ่มเป็น 2 เท่า (dB)
+        age_weight: คะแนนที่เสียต่ออายุของ read ล่าสุด 1 วินาที (dB)
+        winner_ttl: เวลาที่จำผู้ชนะครั้งก่อนของ tag (วินาที)
+        max_tags: จำนวน tag สูงสุดที่จำผู้ชนะไว้
+    """
+
+    def __init__(self, window: float = 0.3, count_weight: float = 3.0, age_weight: float = 10.0,
+                 winner_ttl: float = 300.0, max_tags: int = 100_000):
+        self.window = max(0.0, float(window))
+        self.count_weight = count_weight
+        self.age_weight = age_weight
+        # tag_id -> [opened_at, {device_id: (session, TagRead)}]
+        self._pending: "OrderedDict[str, list]" = OrderedDict()
+        self._winners = PresenceIndex(ttl=winner_ttl, max_entries=max_tags)
+        self._lock = threading.Lock()
+        self.offered = 0
+        self.decided = 0
+        self.contested = 0
+        self.suppressed = 0
+        self.winner_changes = 0
+
+    def offer(self, session, reads: List[TagRead], now: Optional[float] = None):
+        """เพิ่ม read ของ session เข้า window ของแต่ละ tag"""
+        now = time.time() if now is None else now
+        device_id = session.device_id
+        with self._lock:
+            pending = self._pending
+            for r in reads:
+                tid = r.epc.hex().upper()
+                entry = pending.get(tid)
+                if entry is None:
+                    entry = pending[tid] = [now, {}]
+                candidates = entry[1]
+                current = candidates.get(device_id)
+                candidates[device_id] = (session, merge_reads(current[1], r) if current else r)
+            self.offered += len(reads)
+
+    def score(self, read: TagRead, now: float) -> float:
+        """คะแนนของ read (dB) ยิ่งสูงยิ่งน่าจะอยู่ใกล้เครื่องนี้"""
+        return (
+            read.rssi_peak / 10.0
+            + self.count_weight * math.log2(max(read.read_count, 1))
+            - self.age_weight * max(now - read.last_seen, 0.0)
+        )
+
+    def decide(self, now: Optional[float] = None) -> List[Tuple[str, TagRead, object, Optional[object]]]:
+        """
+        ตัดสิน tag ที่ window ปิดแล้ว
+
+        Returns:
+            list: [(tag_id, read_ของผู้ชนะ, session_ผู้ชนะ, session_ผู้ชนะครั้งก่อน_ถ้าเปลี่ยนเครื่อง), ...]
+        """
+        now = time.time() if now is None else now
+        deadline = now - self.window
+        decisions = []
+        with self._lock:
+            pending = self._pending
+            while pending:
+                tid, (opened, candidates) = next(iter(pending.items()))
+                if opened > deadline:
+                    break
+                pending.popitem(last=False)
+                decisions.append((tid, candidates))
+
+        result = []
+        for tid, candidates in decisions:
+            previous = self._winners.get(tid)
+            live = [c for c in candidates.values() if not c[0].thread_stop.is_set()]
+            if not live:
+                continue
+            if len(live) == 1:
+                winner, read = live[0]
+            else:
+                self.contested += 1
+                self.suppressed += len(live) - 1
+                winner, read = max(
+                    live,
+                    key=lambda c: (self.score(c[1], now), c[0] is previous),
+                )
+            self.decided += 1
+            self._winners.touch(tid, winner, now)
+            if previous is not None and previous is not winner:
+                self.winner_changes += 1
+                result.append((tid, read, winner, previous))
+            else:
+                result.append((tid, read, winner, None))
+        return result
+
+    def forget(self, session):
+        """ลบ read ที่ค้างของ session ที่ถูกปิด"""
+        with self._lock:
+            for tid in list(self._pending):
+                candidates = self._pending[tid][1]
+                candidates.pop(session.device_id, None)
+                if not candidates:
+                    del self._pending[tid]
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "window": self.window,
+            "pending_tags": pending,
+            "offered_reads": self.offered,
+            "decided_tags": self.decided,
+            "contested_tags": self.contested,
+            "suppressed_reads": self.suppressed,
+            "winner_changes": self.winner_changes,
+        }
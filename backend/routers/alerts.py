@@ -4,6 +4,9 @@ from datetime import datetime, timedelta
 from config.database import get_db_connection
 from routers.notifications import create_notification  # ใช้ฟังก์ชันที่มีอยู่
 from ws_manager import manager
+from notification_dedupe import notification_dedupe
+from tag_state_cache import tag_cache
+from location_directory import location_directory
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,17 +15,9 @@ router = APIRouter(prefix="/api/alerts", tags=["alerts"])
 # ถ้า alert เดิมถูกสร้างมาแล้วภายใน cooldown_seconds จะไม่สร้างซ้ำ
 ALERT_COOLDOWN_SECONDS = 30
 
-def _was_recently_alerted(conn, notif_type: str, message_like: str, cooldown_seconds: int = ALERT_COOLDOWN_SECONDS) -> bool:
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            SELECT 1 FROM notifications
-            WHERE type = %s AND message LIKE %s AND created_at >= (NOW() - INTERVAL %s SECOND)
-            LIMIT 1
-        """, (notif_type, f"%{message_like}%", cooldown_seconds))
-        return cur.fetchone() is not None
-    finally:
-        cur.close()
+def _was_recently_alerted(notif_type: str, key: str) -> bool:
+    """ตรวจจาก dedupe index ในหน่วยความจำ (ไม่ query ตาราง notifications)"""
+    return notification_dedupe.is_recent(notif_type, key)
 
 def check_unauthorized_movement(conn=None, cur=None, tag_id: str = None, to_location_id: Optional[int] = None, operator: Optional[str] = None):
     """
@@ -36,27 +31,31 @@ def check_unauthorized_movement(conn=None, cur=None, tag_id: str = None, to_loca
         if not tag_id:
             return False
 
-        if conn is None or cur is None:
-            own_conn = get_db_connection()
-            own_cur = own_conn.cursor(dictionary=True)
-            cur_to_use = own_cur
-            conn_to_use = own_conn
+        # ดึงสถานะ authorized จาก tag_cache ก่อน ถ้าไม่มีจึงอ่านจากฐานข้อมูล
+        state = tag_cache.get(tag_id)
+        if state is not None:
+            authorized = state.authorized
+        elif tag_cache.is_known_absent(tag_id):
+            return False
         else:
-            cur_to_use = cur
-            conn_to_use = conn
+            if conn is None or cur is None:
+                own_conn = get_db_connection()
+                own_cur = own_conn.cursor(dictionary=True)
+                cur_to_use = own_cur
+            else:
+                cur_to_use = cur
 
-        # ดึงสถานะ authorized และชื่อ location (ถ้ามี)
-        cur_to_use.execute("SELECT COALESCE(authorized,0) as authorized, current_location_id FROM tags WHERE tag_id=%s", (tag_id,))
-        tag_row = cur_to_use.fetchone()
-        if not tag_row:
-            return False
+            cur_to_use.execute("SELECT COALESCE(authorized,0) as authorized, current_location_id FROM tags WHERE tag_id=%s", (tag_id,))
+            tag_row = cur_to_use.fetchone()
+            if not tag_row:
+                return False
 
-        authorized = tag_row.get('authorized', 0)
+            authorized = tag_row.get('authorized', 0)
         if authorized:  # 1 => authorized -> ไม่มี alert
             return False
 
         # สร้างข้อความแจ้งเตือน (simple)
-        loc_text = f"Location ID {to_location_id}" if to_location_id else "unknown location"
+        loc_text = location_directory.name(to_location_id) if to_location_id else "unknown location"
         op_text = operator or "system"
         title = "⚠️ Tag เคลื่อนที่ที่ไม่ได้รับอนุญาต"
         message = f"Tag {tag_id} (unauthorized) เคลื่อนที่ไปยัง {loc_text} โดย {op_text}"
@@ -71,7 +70,8 @@ def check_unauthorized_movement(conn=None, cur=None, tag_id: str = None, to_loca
                 user_id=None,
                 location_id=to_location_id,
                 related_id=None,
-                priority="high"
+                priority="high",
+                dedupe_key=tag_id,
             )
             logger.info(f"Unauthorized movement alert created for tag {tag_id} -> {loc_text}")
         except Exception as e:
@@ -127,9 +127,10 @@ def notify_unauthorized_movement(tag_id: str, tag_epc: str, from_location: int,
                 unauthorized = (to_location != allowed_loc)
 
             if unauthorized:
-                msg_short = f"Tag {tag_epc} เคลื่อนที่ที่ไม่ได้รับอนุญาต: {from_location}→{to_location}"
+                msg_short = (f"Tag {tag_epc} เคลื่อนที่ที่ไม่ได้รับอนุญาต: "
+                             f"{location_directory.name(from_location)}→{location_directory.name(to_location)}")
                 # ป้องกัน duplicate
-                if not _was_recently_alerted(conn, "alert", tag_epc):
+                if not _was_recently_alerted("alert", tag_epc):
                     create_notification(
                         type="alert",
                         title="Tag เคลื่อนที่ที่ไม่ได้รับอนุญาต",
@@ -138,7 +139,9 @@ def notify_unauthorized_movement(tag_id: str, tag_epc: str, from_location: int,
                         user_id=None,
                         location_id=to_location,
                         related_id=None,
-                        priority="high"
+                        priority="high",
+                        dedupe_key=tag_epc,
+                        cooldown_seconds=ALERT_COOLDOWN_SECONDS,
                     )
                     logger.info("Created unauthorized alert for tag %s", tag_epc)
                 else:
@@ -171,7 +174,7 @@ def check_overdue_returns(overdue_days: int = 0):
             tag_epc = r["tag_epc"]
             msg_short = f"Tag {tag_epc} เกินกำหนดคืน (due {r['due_at']})"
             # ป้องกัน duplicate alert ก่อน insert
-            if not _was_recently_alerted(conn, "alert", tag_epc, cooldown_seconds=3600):
+            if not _was_recently_alerted("alert", f"overdue:{tag_epc}"):
                 create_notification(
                     type="alert",
                     title="Tag เกินกำหนดคืน",
@@ -180,7 +183,9 @@ def check_overdue_returns(overdue_days: int = 0):
                     user_id=None,
                     location_id=None,
                     related_id=r.get("id"),
-                    priority="high"
+                    priority="high",
+                    dedupe_key=f"overdue:{tag_epc}",
+                    cooldown_seconds=3600,
                 )
                 created += 1
         return {"created": created, "checked": len(rows)}
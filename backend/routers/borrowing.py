@@ -5,6 +5,7 @@ from config.database import get_db_connection
 from pydantic import BaseModel
 from routers.notifications import create_notification
 from ws_manager import manager
+from tag_state_cache import tag_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -105,6 +106,7 @@ def borrow_item(req: BorrowRequest):
         
         borrow_id = cur.lastrowid
         conn.commit()
+        tag_cache.invalidate(req.tag_id)  # สถานะ tag อาจถูกเปลี่ยนโดย trigger ของ borrowing_records
 
         # fetch full record
         cur.execute("""
@@ -208,6 +210,8 @@ def return_item(req: ReturnRequest):
         """, (now, actual_days, is_overdue, overdue_days, req.return_notes, now, req.borrow_id))
         
         conn.commit()
+        if row.get("tag_id"):
+            tag_cache.invalidate(row["tag_id"])
 
         # fetch updated record
         cur.execute("""
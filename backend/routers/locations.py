@@ -5,6 +5,9 @@ from config.database import get_db_connection
 from models import Location, ScanModel, Movement, LocationRead
 from routers.notifications import create_notification
 from ws_manager import manager
+from tag_state_cache import tag_cache
+from location_rules import transition_table
+from location_directory import location_directory
 import logging
 
 logger = logging.getLogger(__name__)
@@ -58,23 +61,31 @@ def get_active_locations():
                    NOW() as created_at,
                    NOW() as updated_at
             FROM locations
-            WHERE location_id != 3
+            WHERE direction IS NULL OR direction != 'out'
             ORDER BY location_id
         """)
         return cur.fetchall()
     finally:
         cur.close(); conn.close()
 
+@router.post("/reload-rules")
+def reload_location_rules():
+    """โหลด locations ใหม่และสร้างกฎการเปลี่ยนตำแหน่งใหม่ทันที (ปกติตรวจการแก้ไขอัตโนมัติทุก 30 วินาที)"""
+    if not transition_table.reload():
+        raise HTTPException(status_code=500, detail="Failed to reload location rules")
+    return {**transition_table.stats(), "directory": location_directory.stats()}
+
 @router.post("/{location_id}/scan", response_model=Movement)
 def scan_at_location(location_id: int, s: ScanModel):
     """POST /api/locations/{location_id}/scan – รับข้อมูล scan จาก Handheld Scanner (tagId, timestamp, operator)"""
     ts = s.timestamp or datetime.now()
     conn, cur = _open_dict_cursor()
     try:
-        # 1) ตรวจว่ามี location นี้จริง
-        cur.execute("SELECT 1 FROM locations WHERE location_id=%s", (location_id,))
-        if not cur.fetchone():
-            raise HTTPException(status_code=404, detail="Location not found")
+        # 1) ตรวจว่ามี location นี้จริง (location ที่เพิ่งเพิ่มยังไม่อยู่ใน snapshot: reload ก่อนตัดสิน)
+        if location_directory.get(location_id) is None:
+            location_directory.reload_if_changed()
+            if location_directory.get(location_id) is None:
+                raise HTTPException(status_code=404, detail="Location not found")
 
         # 2) หา asset ที่ผูกกับ tag
         cur.execute(
@@ -102,12 +113,13 @@ def scan_at_location(location_id: int, s: ScanModel):
                 (location_id, s.tag_id),
             )
             conn.commit()
+            tag_cache.update(s.tag_id, current_location_id=location_id)
             
             # สร้าง notification
             create_notification(
                 type="movement",
                 title="ตรวจพบการเคลื่อนย้าย",
-                message=f"Asset ID {aid} เคลื่อนย้ายจาก Location {prev_loc} ไปยัง Location {location_id}",
+                message=f"Asset ID {aid} เคลื่อนย้ายจาก {location_directory.name(prev_loc)} ไปยัง {location_directory.name(location_id)}",
                 asset_id=aid,
                 location_id=location_id
             )
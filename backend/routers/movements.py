@@ -6,6 +6,7 @@ from routers.notifications import create_notification
 from routers.alerts import check_unauthorized_movement
 import logging
 from ws_manager import manager
+from location_directory import location_directory
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -42,13 +43,9 @@ def list_movements(
         sql = """
             SELECT m.movement_id, m.asset_id, m.tag_id, m.from_location_id, m.to_location_id,
                    m.timestamp, m.operator, m.event_type,
-                   a.name as asset_name,
-                   fl.name as from_location_name,
-                   tl.name as to_location_name
+                   a.name as asset_name
             FROM movements m
             LEFT JOIN assets a ON m.asset_id = a.asset_id
-            LEFT JOIN locations fl ON m.from_location_id = fl.location_id
-            LEFT JOIN locations tl ON m.to_location_id = tl.location_id
         """
         params: list = []
         if asset_id is not None:
@@ -57,7 +54,14 @@ def list_movements(
         sql += " ORDER BY m.timestamp DESC LIMIT %s OFFSET %s"
         params.extend([limit, skip])
         cur.execute(sql, tuple(params))
-        return cur.fetchall()
+        rows = cur.fetchall()
+        # ชื่อ location จาก snapshot เดียวกันทั้งหน้า (แทน LEFT JOIN locations สองครั้ง)
+        locations = location_directory.snapshot()
+        for row in rows:
+            for prefix in ("from", "to"):
+                info = locations.get(row.get(f"{prefix}_location_id"))
+                row[f"{prefix}_location_name"] = info.name if info else None
+        return rows
     finally:
         cur.close(); conn.close()
 
@@ -69,16 +73,8 @@ def create_movement(m: Movement):
 
     conn = get_db_connection(); cur = conn.cursor(dictionary=True)
     try:
-        # ดึงข้อมูล asset และ location สำหรับสร้างการแจ้งเตือน
-        cur.execute("""
-            SELECT a.name as asset_name, a.asset_id,
-                   fl.name as from_location_name,
-                   tl.name as to_location_name
-            FROM assets a
-            LEFT JOIN locations fl ON %s = fl.location_id
-            LEFT JOIN locations tl ON %s = tl.location_id
-            WHERE a.asset_id = %s
-        """, (m.from_location_id, m.to_location_id, m.asset_id))
+        # ดึงข้อมูล asset สำหรับ broadcast (ชื่อ location มาจาก location_directory)
+        cur.execute("SELECT a.name as asset_name, a.asset_id FROM assets a WHERE a.asset_id = %s", (m.asset_id,))
         
         asset_info = cur.fetchone()
         
@@ -95,7 +91,7 @@ def create_movement(m: Movement):
         create_notification(
             type="movement",
             title="ตรวจพบการเคลื่อนย้ายทรัพย์สิน",
-            message=f"ทรัพย์สิน ID {m.asset_id} ถูกเคลื่อนย้ายไปยัง Location ID {m.to_location_id}",
+            message=f"ทรัพย์สิน ID {m.asset_id} ถูกเคลื่อนย้ายไปยัง {location_directory.name(m.to_location_id)}",
             asset_id=m.asset_id,
             location_id=m.to_location_id
         )
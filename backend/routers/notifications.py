@@ -4,13 +4,37 @@ from typing import List, Optional
 from config.database import get_db_connection  # ✅ เปลี่ยนกลับเป็น config.database
 from pydantic import BaseModel
 from ws_manager import manager
+from notification_dedupe import notification_dedupe
 import asyncio
 import threading
+import time
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/notifications", tags=["notifications"])
 
+# notifications.dedupe_key มีเฉพาะหลัง migration 3 - ตรวจครั้งเดียว (ถ้ายังไม่มี ตรวจใหม่ทุก DEDUPE_COLUMN_RECHECK วินาที)
+DEDUPE_COLUMN_RECHECK = 300
+_dedupe_column = {"present": None, "checked_at": 0.0}
+
+def _has_dedupe_column(cur) -> bool:
+    state = _dedupe_column
+    if state["present"] or (state["present"] is False and time.time() - state["checked_at"] < DEDUPE_COLUMN_RECHECK):
+        return state["present"]
+    try:
+        cur.execute(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = 'notifications' AND column_name = 'dedupe_key'"
+        )
+        state["present"] = cur.fetchone() is not None
+    except Exception as e:
+        logger.error(f"Failed to check notifications.dedupe_key column: {e}")
+        state["present"] = False
+    state["checked_at"] = time.time()
+    if not state["present"]:
+        logger.warning("notifications.dedupe_key missing (run `python manage.py migrate`) - inserting without it")
+    return state["present"]
+
 def _open_dict_cursor():
     """เปิด cursor แบบ dictionary จาก config.database"""
     conn = get_db_connection()
@@ -26,8 +50,15 @@ def _open_dict_cursor():
         }
     return conn, cur
 
-def create_notification(type: str, title: str, message: str, asset_id=None, user_id=None, location_id=None, related_id=None, priority="normal"):
-    """สร้าง notification ใหม่และ broadcast ผ่าน WebSocket (Thread-safe)"""
+def create_notification(type: str, title: str, message: str, asset_id=None, user_id=None, location_id=None, related_id=None, priority="normal",
+                        dedupe_key=None, cooldown_seconds=None):
+    """
+    สร้าง notification ใหม่และ broadcast ผ่าน WebSocket (Thread-safe)
+
+    dedupe_key: key สำหรับกันซ้ำ (เช่น tag_id) - ไม่ระบุจะใช้ related_id หรือข้อความ 60 ตัวแรก
+    cooldown_seconds: ช่วงเวลากันซ้ำ (ค่าเริ่มต้น alert 30 วินาที, อื่น ๆ 5 วินาที)
+    """
+    claimed = False
     try:
         conn, cur = _open_dict_cursor()
         try:
@@ -41,33 +72,35 @@ def create_notification(type: str, title: str, message: str, asset_id=None, user
                 if related_id is None and not any(k in msg_l for k in allowed_keywords):
                     type = "movement"
 
-            # ป้องกัน duplicate - แก้ไข SQL สำหรับ database ที่แตกต่างกัน
-            cooldown_seconds = 30 if type == "alert" else 5
-            
-            # ตรวจสอบประเภทของ database
-            db_type = getattr(conn, 'get_server_info', lambda: 'sqlite')()
-            if 'mysql' in db_type.lower() or hasattr(conn, 'get_server_info'):
-                # MySQL syntax
-                cur.execute("""
-                    SELECT id FROM notifications
-                    WHERE type = %s AND message LIKE %s AND created_at >= (NOW() - INTERVAL %s SECOND)
-                    LIMIT 1
-                """, (type, f"%{(message or '')[:60]}%", cooldown_seconds))
-            else:
-                # SQLite syntax
-                cur.execute("""
-                    SELECT id FROM notifications
-                    WHERE type = ? AND message LIKE ? AND created_at >= datetime('now', '-' || ? || ' seconds')
-                    LIMIT 1
-                """, (type, f"%{(message or '')[:60]}%", cooldown_seconds))
-            
-            if cur.fetchone():
-                logger.debug("Skipping duplicate notification insert (type=%s, msg=%s)", type, (message or "")[:60])
+            # ป้องกัน duplicate ด้วย dedupe index ในหน่วยความจำ (ไม่ต้อง query)
+            if cooldown_seconds is None:
+                cooldown_seconds = 30 if type == "alert" else 5
+            if dedupe_key is None:
+                dedupe_key = f"related:{related_id}" if related_id is not None else message
+            if not notification_dedupe.claim(type, dedupe_key, cooldown_seconds):
+                logger.debug("Skipping duplicate notification insert (type=%s, key=%s)", type, str(dedupe_key)[:60])
                 return None
+            claimed = True
+
+            db_type = getattr(conn, 'get_server_info', lambda: 'sqlite')()
 
             # Insert notification - แก้ไข SQL สำหรับ database ที่แตกต่างกัน
-            if 'mysql' in db_type.lower() or hasattr(conn, 'get_server_info'):
+            if ('mysql' in db_type.lower() or hasattr(conn, 'get_server_info')) and _has_dedupe_column(cur):
                 # MySQL syntax
+                # dedupe_key (UNIQUE) กันซ้ำข้าม process ในช่วง cooldown เดียวกัน
+                cur.execute("""
+                    INSERT INTO notifications
+                    (type, title, message, asset_id, user_id, location_id, related_id, priority, dedupe_key, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+                    ON DUPLICATE KEY UPDATE id = id
+                """, (type, title, message, asset_id, user_id, location_id, related_id, priority,
+                      notification_dedupe.db_key(type, dedupe_key, cooldown_seconds)))
+                if cur.rowcount == 0:
+                    conn.commit()
+                    logger.debug("Duplicate notification rejected by dedupe_key (type=%s)", type)
+                    return None
+            elif 'mysql' in db_type.lower() or hasattr(conn, 'get_server_info'):
+                # MySQL ที่ยังไม่มีคอลัมน์ dedupe_key: กันซ้ำด้วย dedupe index ในหน่วยความจำอย่างเดียว
                 cur.execute("""
                     INSERT INTO notifications
                     (type, title, message, asset_id, user_id, location_id, related_id, priority, created_at)
@@ -82,6 +115,7 @@ def create_notification(type: str, title: str, message: str, asset_id=None, user
                 """, (type, title, message, asset_id, user_id, location_id, related_id, priority))
             
             conn.commit()
+            claimed = False
             notif_id = cur.lastrowid
 
             # อ่าน row ที่เพิ่งสร้าง สำหรับ broadcast
@@ -139,6 +173,9 @@ def create_notification(type: str, title: str, message: str, asset_id=None, user
             conn.close()
     except Exception as e:
         logger.exception("create_notification failed")
+        if claimed:
+            # INSERT ไม่สำเร็จ - ปล่อย key ให้สร้างใหม่ได้
+            notification_dedupe.release(type, dedupe_key)
         return None
 
 @router.get("/debug/ping")
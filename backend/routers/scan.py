@@ -5,7 +5,7 @@ from uhf.handle import Api
 from uhf.struct import TagInfo
 from datetime import datetime
 from typing import Dict, Optional
-from config.database import get_db_connection
+from config.database import get_db_connection, is_connection_error, get_pool_stats, POOL_INGESTION
 from testapi import get_device_sn
 from ws_manager import manager  # ⭐ เพิ่มบรรทัดนี้
 import logging
@@ -17,6 +17,17 @@ from multiprocessing import Queue, Process
 from device_scanner_service import run_device_scanner
 from routers.notifications import create_notification
 from routers.alerts import check_unauthorized_movement
+from config.settings import settings
+from tag_state_cache import tag_cache, TagState
+from ingestion_pool import IngestionPool, DEPARTURE as DEPARTURE_WORK
+from scan_spool import ScanSpool
+from scan_transport import ReadRing, ControlChannel
+from presence_index import PresenceIndex
+from location_rules import transition_table, READ, ARRIVAL, DEPARTURE
+from location_directory import location_directory
+from flap_guard import flap_guard
+from notification_buffer import notification_buffer
+from runtime_config import runtime_config
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/scan", tags=["scan"])
@@ -28,15 +39,22 @@ class DeviceSession:
         self.device_id = None
         self.device_sn = None
         self.process = None  # Process object แทน api
-        self.result_queue = None  # Queue รับผลจาก subprocess
-        self.cmd_queue = None     # <- NEW: command queue เพื่อสั่ง subprocess
+        self.ring = None          # ReadRing (shared memory) รับผลสแกนจาก subprocess (อ่านโดย ingestion_pool)
+        self.cmd_queue = None     # command queue เพื่อสั่ง subprocess
+        self.reply_queue = None   # คำตอบของคำสั่ง (แยกจากผลสแกน)
+        self.control = None       # ControlChannel: request/reply พร้อม correlation id
         self.is_connected = False
         self.location_id = None
         self.connection_type = "network"
         self.connection_info = ""
-        self.current_scanned_tags = set()
-        self.last_db_update_time = {}
-        self.db_thread = None
+        # tag ที่อยู่ในพื้นที่ตอนนี้ (tag_id -> TagRead ล่าสุด) หมดอายุเมื่อไม่เห็นเกิน PRESENCE_TTL
+        self.presence = PresenceIndex(
+            ttl=settings.presence_ttl,
+            max_entries=settings.presence_max_tags,
+            track_expired=settings.scan_exit_mode == "absence",
+        )
+        # tag_id -> เวลาที่บันทึกลง DB ล่าสุด (ttl = DELAY_SECONDS ถูกตั้งทุก batch)
+        self.last_db_update_time = PresenceIndex(ttl=20, max_entries=settings.presence_max_tags)
         self.thread_stop = threading.Event()
         self.device_lock = threading.Lock()
         # ค่า runtime ที่อ่านจากระบบ (จะถูกตั้งตอนสร้าง session)
@@ -48,6 +66,22 @@ device_sessions: Dict[int, DeviceSession] = {}
 device_lock = threading.Lock()
 uhf_global_lock = threading.Lock()   # <-- เพิ่ม global lock สำหรับการใช้งาน UHF ที่ต้องป้องกัน
 
+# จำนวน tag สูงสุดต่อ statement ในโหมด batch (จำกัดขนาด IN (...) list)
+BATCH_CHUNK_SIZE = 500
+
+# movements.event_id เป็น UNIQUE: event ที่เคยเขียนแล้ว (retry / replay จาก spool) ไม่เพิ่มแถวซ้ำ
+# timestamp ใช้เวลาของเครื่องอ่าน (ถ้ามี) แทนเวลาที่เขียน จึงไม่เลื่อนตามความล่าช้าของ batch
+MOVEMENT_INSERT_SQL = """
+    INSERT INTO movements (tag_id, from_location_id, to_location_id, timestamp, operator, event_type, event_id)
+    VALUES (%s, %s, %s, COALESCE(FROM_UNIXTIME(%s), NOW()), %s, %s, %s)
+    ON DUPLICATE KEY UPDATE movement_id = movement_id
+"""
+
+# event id ที่ commit แล้ว: ข้าม event ที่ถูกส่งซ้ำโดยไม่ต้อง SELECT
+# (เช่น commit สำเร็จแต่การเชื่อมต่อหลุดก่อนได้คำตอบ แล้ว batch ถูก replay จาก spool)
+applied_events = PresenceIndex(ttl=3600, max_entries=settings.presence_max_tags)
+NO_EVENT = (None, None)  # (event_id, reader_ts) เมื่อไม่มี event id (เช่น record รุ่นเก่าใน spool)
+
 # Pydantic models
 class ConnectRequest(BaseModel):
     location_id: int
@@ -64,59 +98,12 @@ class DeviceConfigRequest(BaseModel):
 
 # =============== CONFIGURATION ===============
 def get_system_config(key: str, default_value=None):
-    """ดึงค่าการตั้งค่าระบบจากฐานข้อมูล"""
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT `value` FROM system_config WHERE `key` = %s", (key,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-        
-        if row:
-            value = row['value']
-            if default_value is not None:
-                if isinstance(default_value, int):
-                    return int(float(value))
-                elif isinstance(default_value, float):
-                    return float(value)
-                else:
-                    return str(value)
-            return value
-        else:
-            return default_value
-    except Exception as e:
-        logger.error(f"Error getting system config {key}: {e}")
-        return default_value
+    """ดึงค่าการตั้งค่าระบบ (จากแคช runtime_config ไม่ query ฐานข้อมูล)"""
+    return runtime_config.get_system(key, default_value)
 
 def get_device_config(device_id: int, config_key: str, default_value=None):
-    """ดึงค่าการตั้งค่าของเครื่องจากฐานข้อมูล"""
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            "SELECT config_value FROM device_configs WHERE device_id = %s AND config_key = %s", 
-            (device_id, config_key)
-        )
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-        
-        if row:
-            value = row['config_value']
-            if default_value is not None:
-                if isinstance(default_value, int):
-                    return int(float(value))
-                elif isinstance(default_value, float):
-                    return float(value)
-                else:
-                    return str(value)
-            return value
-        else:
-            return get_system_config(config_key, default_value)
-    except Exception as e:
-        logger.error(f"Error getting device config {device_id}.{config_key}: {e}")
-        return default_value
+    """ดึงค่าการตั้งค่าของเครื่อง (จากแคช runtime_config; ไม่มี override ใช้ค่าระบบ)"""
+    return runtime_config.get_device(device_id, config_key, default_value)
 
 def set_device_config(device_id: int, config_key: str, config_value: str):
     """ตั้งค่าเฉพาะเครื่อง"""
@@ -133,6 +120,8 @@ def set_device_config(device_id: int, config_key: str, config_value: str):
         conn.commit()
         cur.close()
         conn.close()
+        # อัปเดตแคชและแจ้ง listener (เช่น push interval ใหม่ให้ subprocess)
+        runtime_config.set_device(device_id, config_key, config_value)
         return True
     except Exception as e:
         logger.error(f"Error setting device config {device_id}.{config_key}: {e}")
@@ -167,6 +156,9 @@ def create_device_session(device_id: int) -> DeviceSession:
         session.db_update_interval = float(get_system_config('DB_UPDATE_INTERVAL', 1))
     except Exception:
         session.db_update_interval = 1.0
+    if settings.scan_exit_mode == "absence":
+        # tag ที่ไม่เห็นเกิน ABSENCE_TIMEOUT (ตั้งแยกต่อเครื่อง/location ได้ใน device_configs) = ออกจากพื้นที่
+        session.presence.ttl = float(get_device_config(device_id, 'ABSENCE_TIMEOUT', settings.absence_timeout))
 
     # เพิ่ม flag ป้องกัน enqueue ซ้ำซ้อน (เดิมมีในไฟล์)
     session.scan_pending = threading.Event()  # set() = งานอยู่ในคิว/กำลังสแกน
@@ -187,6 +179,7 @@ def remove_device_session(device_id: int):
             session = device_sessions[device_id]
             session.thread_stop.set()
             session.is_connected = False
+            ingestion_pool.unregister(device_id)
             
             # หยุด subprocess
             if session.process and session.process.is_alive():
@@ -196,6 +189,10 @@ def remove_device_session(device_id: int):
                     session.process.kill()
             
             time.sleep(1)
+            # คืน shared memory หลัง intake หยุดอ่านแล้ว
+            if session.ring:
+                session.ring.close()
+                session.ring = None
             del device_sessions[device_id]
 
 # =============== CONNECTION FUNCTIONS ===============
@@ -285,8 +282,14 @@ def attempt_reconnect(session: DeviceSession):
         return False
 
 # =============== SCANNING FUNCTIONS ===============
-def create_movement_notification(cur, tag_id: str, from_location_id, to_location_id, event_type: str, device_id: str):
-    """สร้าง notification สำหรับการเคลื่อนไหว และ broadcast ทันที"""
+def create_movement_notification(cur, tag_id: str, from_location_id, to_location_id, event_type: str, device_id: str,
+                                 pending: list = None):
+    """
+    สร้าง notification สำหรับการเคลื่อนไหว และ broadcast ทันที
+
+    pending (ถ้ามี): โหมด buffer จะเก็บ notification ไว้ใน list นี้แทนการส่งเข้า notification_buffer
+    ให้ผู้เรียก add_many หลัง commit (batch ที่ rollback/ถูก spool จึงไม่มี notification หลุดออกไป)
+    """
     try:
         # สร้างข้อความแจ้งเตือน
         from_name = get_location_name(from_location_id) if from_location_id else "ไม่ระบุ"
@@ -302,6 +305,16 @@ def create_movement_notification(cur, tag_id: str, from_location_id, to_location
             title = f"🚚 Tag เคลื่อนย้าย"
             message = f"Tag {tag_id} เคลื่อนย้ายจาก {from_name} ไป {to_name}"
 
+        # โหมด buffer: เขียนและ broadcast รวมเป็นชุดโดย notification_buffer
+        if notification_buffer.enabled():
+            notif = {"type": "movement", "title": title, "message": message,
+                     "location_id": to_location_id, "tag_id": tag_id}
+            if pending is not None:
+                pending.append(notif)
+            else:
+                notification_buffer.add(notif)
+            return None
+
         # บันทึกลง database
         cur.execute("""
             INSERT INTO notifications 
@@ -343,70 +356,78 @@ def create_movement_notification(cur, tag_id: str, from_location_id, to_location
         logger.error(f"Failed to create movement notification for tag {tag_id}: {e}")
         return None
 
-def handle_tag_movement(session: DeviceSession, conn, cur, tid: str, row: dict) -> bool:
-    """ประมวลผลการเคลื่อนไหวของ tag เดียว"""
+def _resolve_transition(reader_location_id, current_location_id, current_status):
+    """
+    คำนวณการเปลี่ยนตำแหน่งของ tag จาก location ของเครื่องอ่านและสถานะปัจจุบัน (ไม่แตะฐานข้อมูล)
+    ใช้ตารางกฎใน location_rules (สร้างจากตาราง locations)
+
+    Returns:
+        tuple: (to_loc, event_type, new_status, action) หรือ None ถ้าไม่มีการเคลื่อนไหว
+    """
+    return transition_table.resolve(READ, reader_location_id, current_location_id, current_status)
+
+def _resolve_arrival(reader_location_id, current_location_id, current_status):
+    """โหมด absence: tag เพิ่งปรากฏที่เครื่องอ่าน -> ENTER ถ้ายังไม่ได้อยู่ที่ location นี้"""
+    return transition_table.resolve(ARRIVAL, reader_location_id, current_location_id, current_status)
+
+def _resolve_departure(reader_location_id, current_location_id, current_status):
+    """
+    โหมด absence: tag หายจากเครื่องอ่านเกิน ABSENCE_TIMEOUT -> EXIT ไปนอกพื้นที่
+    เฉพาะเมื่อ tag ยังอยู่ที่ location ของเครื่องนี้ (ถ้าไปโผล่ที่อื่นแล้วไม่ต้องทำอะไร)
+    """
+    return transition_table.resolve(DEPARTURE, reader_location_id, current_location_id, current_status)
+
+def handle_tag_movement(session: DeviceSession, conn, cur, tid: str, row: dict, state_out: dict = None,
+                        event: tuple = None, moved_out: list = None, notifications_out: list = None) -> bool:
+    """
+    ประมวลผลการเคลื่อนไหวของ tag เดียว
+
+    state_out (ถ้ามี) จะได้รับ tag_id -> (location, status) ที่เขียนลง DB
+    เพื่อให้ผู้เรียก write-through เข้า tag_cache หลัง commit
+    event: (event_id, reader_ts) ของ read ที่ทำให้เกิดการเคลื่อนไหว
+    moved_out (ถ้ามี) จะได้รับ tag_id ที่บันทึก movement แล้ว เพื่อให้ผู้เรียก flap_guard.record_many หลัง commit
+    notifications_out (ถ้ามี) จะได้รับ notification ที่รอส่งเข้า notification_buffer หลัง commit
+    """
+    event_id, event_ts = event or NO_EVENT
     try:
         current_tag_location = row.get("current_location_id")
         current_status = row.get("status")
 
         from_loc = current_tag_location
-        to_loc = None
-        event_type = None
-        new_status = current_status
-        action = ""
-
-        if session.location_id == 1:
-            if current_tag_location == 1:
-                to_loc = 3
-                event_type = "exit"
-                new_status = "idle"
-                action = "EXIT"
-            elif current_tag_location == 3:
-                to_loc = 1
-                event_type = "enter"
-                new_status = "in_use" if current_status != "borrowed" else "borrowed"
-                action = "ENTER"
-        elif session.location_id == 2:
-            if current_tag_location == 2:
-                to_loc = 3
-                event_type = "exit"
-                new_status = "idle"
-                action = "EXIT"
-            elif current_tag_location == 3:
-                to_loc = 2
-                event_type = "enter"
-                new_status = "in_use" if current_status != "borrowed" else "borrowed"
-                action = "ENTER"
-        elif session.location_id == 3:
-            # กรณีเข้าโซนกลาง (to location = 3)
+        transition = _resolve_transition(session.location_id, current_tag_location, current_status)
+        outside = transition_table.outside_location_id
+        if transition is not None:
+            if not flap_guard.allow(tid):
+                return False
+
+        if session.location_id == outside:
+            # กรณีเข้าโซนนอกพื้นที่
             cur.execute("""
                 UPDATE tags 
                 SET current_location_id = %s, status = 'idle', device_id = %s, last_seen = NOW(), updated_at = NOW() 
                 WHERE tag_id = %s
-            """, (3, session.device_id, tid))
-
-            if current_tag_location != 3:
-                cur.execute("""
-                    INSERT INTO movements (tag_id, from_location_id, to_location_id, timestamp, operator, event_type)
-                    VALUES (%s, %s, %s, NOW(), %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        to_location_id = VALUES(to_location_id),
-                        timestamp = NOW(),
-                        operator = %s,
-                        event_type = %s
-                """, (tid, current_tag_location, 3, "system", "enter", "system", "enter"))
+            """, (outside, session.device_id, tid))
+            if state_out is not None:
+                state_out[tid] = (outside, 'idle')
+
+            if transition is not None:
+                cur.execute(MOVEMENT_INSERT_SQL, (tid, current_tag_location, outside, event_ts, "system", "enter", event_id))
+                if moved_out is not None:
+                    moved_out.append(tid)
 
                 # ⭐ สร้าง notification และ broadcast ทันที
                 try:
-                    create_movement_notification(cur, tid, current_tag_location, 3, "enter", session.device_id)
+                    create_movement_notification(cur, tid, current_tag_location, outside, "enter", session.device_id,
+                                                 pending=notifications_out)
                 except Exception as e:
                     logger.error(f"Failed to create enter notification for {tid}: {e}")
 
-            logger.info(f"Device {session.device_id}: Tag {tid[:8]}... UPDATE location 3")
+            logger.info(f"Device {session.device_id}: Tag {tid[:8]}... UPDATE location {outside}")
             return True
 
         # ถ้ามีการย้ายจาก/ไป
-        if to_loc is not None:
+        if transition is not None:
+            to_loc, event_type, new_status, action = transition
             cur.execute("""
                 UPDATE tags
                 SET current_location_id = %s,
@@ -416,20 +437,17 @@ def handle_tag_movement(session: DeviceSession, conn, cur, tid: str, row: dict)
                     updated_at = NOW()
                 WHERE tag_id = %s
             """, (to_loc, new_status, session.device_id, tid))
+            if state_out is not None:
+                state_out[tid] = (to_loc, new_status)
 
-            cur.execute("""
-                INSERT INTO movements (tag_id, from_location_id, to_location_id, timestamp, operator, event_type)
-                VALUES (%s, %s, %s, NOW(), %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    to_location_id = VALUES(to_location_id),
-                    timestamp = NOW(),
-                    operator = %s,
-                    event_type = %s
-            """, (tid, from_loc, to_loc, "system", event_type, "system", event_type))
+            cur.execute(MOVEMENT_INSERT_SQL, (tid, from_loc, to_loc, event_ts, "system", event_type, event_id))
+            if moved_out is not None:
+                moved_out.append(tid)
 
             # ⭐ สร้าง notification และ broadcast ทันที
             try:
-                create_movement_notification(cur, tid, from_loc, to_loc, event_type, session.device_id)
+                create_movement_notification(cur, tid, from_loc, to_loc, event_type, session.device_id,
+                                             pending=notifications_out)
             except Exception as e:
                 logger.error(f"Failed to create movement notification for {tid}: {e}")
 
@@ -449,28 +467,78 @@ def handle_tag_movement(session: DeviceSession, conn, cur, tid: str, row: dict)
         logger.error(f"Error in handle_tag_movement for {tid}: {e}")
         return False
 
-def process_tags_to_db(session: DeviceSession, to_process: set):
-    """ประมวลผล tags สำหรับเครื่องที่ระบุ"""
+def _filter_due_tags(session: DeviceSession, to_process, delay_seconds: int) -> list:
+    """คัดเฉพาะ tag ที่พ้นช่วง DELAY_SECONDS นับจากการบันทึกครั้งล่าสุด"""
+    now = datetime.now()
+    due = []
+    for tid in to_process:
+        last = session.last_db_update_time.get(tid)
+        if last is not None and (now - last).total_seconds() < delay_seconds:
+            continue
+        due.append(tid)
+    return due
+
+def process_tags_to_db(session: DeviceSession, to_process: dict):
+    """
+    ประมวลผล tags สำหรับเครื่องที่ระบุ
+
+    to_process: tag_id -> (event_id, reader_ts) จาก ingestion_pool
+
+    - SCAN_EXIT_MODE=absence: to_process คือ tag ที่เพิ่งปรากฏ -> ENTER (ไม่ผ่าน DELAY_SECONDS)
+    - SCAN_EXIT_MODE=toggle: เลือกโหมด batch หรือทีละ tag ตาม settings
+    """
+    if settings.scan_exit_mode == "absence":
+        suppressed = []
+        processed_tags = _apply_tag_batch(session, list(to_process), _resolve_arrival, insert_new=True,
+                                          suppressed_out=suppressed, events=to_process)
+        # ลบ tag ที่ถูกกันออกจาก presence เพื่อให้ read ครั้งถัดไปนับเป็น ARRIVAL อีกครั้ง
+        # (ลองใหม่เมื่อพ้น min dwell แทนที่จะค้างอยู่ที่ตำแหน่งเดิม)
+        for tid in suppressed:
+            session.presence.discard(tid)
+        return processed_tags
+    session.last_db_update_time.ttl = float(get_device_config(session.device_id, 'DELAY_SECONDS', 20))
+    if settings.scan_batch_ingestion:
+        return process_tags_to_db_batch(session, to_process)
+    return process_tags_to_db_per_tag(session, to_process)
+
+def process_tags_to_db_per_tag(session: DeviceSession, to_process: dict):
+    """ประมวลผล tags ทีละตัว (SELECT + INSERT/UPDATE ต่อ tag)"""
     processed_tags = []
+    events = to_process if isinstance(to_process, dict) else {}
     delay_seconds = get_device_config(session.device_id, 'DELAY_SECONDS', 20)
+    written = {}  # tag_id -> (location, status) สำหรับ write-through หลัง commit
+    authorized_of = {}
+    moved = []    # tag ที่บันทึก movement แล้ว - นับเข้า flap_guard หลัง commit
+    pending_notifications = []  # notification โหมด buffer - ส่งเข้า notification_buffer หลัง commit
 
-    conn = get_db_connection()
+    conn = get_db_connection(POOL_INGESTION)
     cur = conn.cursor(dictionary=True)
     try:
         for tid in list(to_process):
             try:
+                if events.get(tid, NO_EVENT)[0] in applied_events:
+                    continue
                 # ตรวจสอบ delay
-                if tid in session.last_db_update_time:
-                    time_diff = (datetime.now() - session.last_db_update_time[tid]).total_seconds()
+                last_update = session.last_db_update_time.get(tid)
+                if last_update is not None:
+                    time_diff = (datetime.now() - last_update).total_seconds()
                     if time_diff < delay_seconds:
                         continue
 
-                # ประมวลผล tag
-                cur.execute(
-                    "SELECT current_location_id, status, asset_id, COALESCE(authorized,0) as authorized FROM tags WHERE tag_id = %s",
-                    (tid,)
-                )
-                row = cur.fetchone()
+                # ประมวลผล tag (อ่านจาก tag_cache ก่อน)
+                state = tag_cache.get(tid)
+                if state is not None:
+                    row = state._asdict()
+                elif tag_cache.is_known_absent(tid):
+                    row = None
+                else:
+                    cur.execute(
+                        "SELECT current_location_id, status, asset_id, COALESCE(authorized,0) as authorized FROM tags WHERE tag_id = %s",
+                        (tid,)
+                    )
+                    row = cur.fetchone()
+                    if row:
+                        tag_cache.load_rows([dict(row, tag_id=tid)])
 
                 if not row:
                     # Tag ใหม่ - ENTER event
@@ -479,20 +547,16 @@ def process_tags_to_db(session: DeviceSession, to_process: set):
                             (tag_id, status, current_location_id, device_id, first_seen, last_seen, authorized)
                         VALUES (%s, %s, %s, %s, NOW(), NOW(), 0)
                     """, (tid, 'in_use', session.location_id, session.device_id))
+                    written[tid] = (session.location_id, 'in_use')
+                    authorized_of[tid] = 0
                     
-                    cur.execute("""
-                        INSERT INTO movements (tag_id, from_location_id, to_location_id, timestamp, operator, event_type)
-                        VALUES (%s, %s, %s, NOW(), %s, %s)
-                        ON DUPLICATE KEY UPDATE
-                            to_location_id = VALUES(to_location_id),
-                            timestamp = NOW(),
-                            operator = %s,
-                            event_type = %s
-                    """, (tid, None, session.location_id, "system", "enter", "system", "enter"))
+                    event_id, event_ts = events.get(tid, NO_EVENT)
+                    cur.execute(MOVEMENT_INSERT_SQL, (tid, None, session.location_id, event_ts, "system", "enter", event_id))
                     
                     # ⭐ สร้าง notification และ broadcast ทันที
                     try:
-                        create_movement_notification(cur, tid, None, session.location_id, "enter", session.device_id)
+                        create_movement_notification(cur, tid, None, session.location_id, "enter", session.device_id,
+                                                     pending=pending_notifications)
                     except Exception as e:
                         logger.error(f"Failed to create enter notification for {tid}: {e}")
 
@@ -500,7 +564,9 @@ def process_tags_to_db(session: DeviceSession, to_process: set):
                     processed_tags.append(tid)
                 else:
                     # Tag มีอยู่แล้ว - ตรวจสอบ movement
-                    processed = handle_tag_movement(session, conn, cur, tid, row)
+                    authorized_of[tid] = row.get("authorized")
+                    processed = handle_tag_movement(session, conn, cur, tid, row, state_out=written, event=events.get(tid),
+                                                    moved_out=moved, notifications_out=pending_notifications)
                     if processed:
                         processed_tags.append(tid)
 
@@ -508,15 +574,30 @@ def process_tags_to_db(session: DeviceSession, to_process: set):
                 session.last_db_update_time[tid] = datetime.now()
 
             except Exception as e:
+                if is_connection_error(e):
+                    raise
                 logger.error(f"Error processing tag {tid}: {e}")
                 continue
 
         conn.commit()
 
+        # write-through หลัง commit
+        for tid, (location_id, status) in written.items():
+            tag_cache.put(tid, location_id, status, authorized_of.get(tid, 0))
+        flap_guard.record_many(moved)
+        if pending_notifications:
+            notification_buffer.add_many(pending_notifications)
+        applied_events.touch_many({events[tid][0]: True for tid in processed_tags if events.get(tid, NO_EVENT)[0]})
+
     except Exception as e:
         logger.error(f"Database error in process_tags_to_db: {e}")
         if conn:
-            conn.rollback()
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        if is_connection_error(e):
+            raise  # ให้ ingestion_pool เก็บ batch ลง spool แทนการทิ้ง
     finally:
         try:
             if cur:
@@ -528,6 +609,388 @@ def process_tags_to_db(session: DeviceSession, to_process: set):
 
     return processed_tags
 
+def _movement_message(tag_id: str, from_location_id, to_location_id, event_type: str):
+    """สร้าง title/message ของ notification การเคลื่อนไหว"""
+    from_name = get_location_name(from_location_id) if from_location_id else "ไม่ระบุ"
+    to_name = get_location_name(to_location_id) if to_location_id else "ไม่ระบุ"
+    if event_type == "enter":
+        return "🔍 Tag เข้าพื้นที่", f"Tag {tag_id} เข้าสู่ {to_name}"
+    if event_type == "exit":
+        return "📤 Tag ออกจากพื้นที่", f"Tag {tag_id} ออกจาก {from_name}"
+    return "🚚 Tag เคลื่อนย้าย", f"Tag {tag_id} เคลื่อนย้ายจาก {from_name} ไป {to_name}"
+
+def process_departures_to_db(session: DeviceSession, departed: dict):
+    """
+    โหมด absence: tag ที่ไม่ถูกอ่านเกิน ABSENCE_TIMEOUT -> EXIT
+
+    ไม่ผ่าน flap_guard เพราะ ABSENCE_TIMEOUT กรองการสลับอยู่แล้ว และ DEPARTURE ที่ถูกตัดจะไม่ถูกส่งซ้ำ
+    """
+    return _apply_tag_batch(session, list(departed), _resolve_departure, insert_new=False, guard=False,
+                            events=departed)
+
+def process_tags_to_db_batch(session: DeviceSession, to_process: dict):
+    """
+    ประมวลผล tags ทั้ง batch แบบ set-based (โหมด toggle)
+
+    คัด tag ที่พ้น DELAY_SECONDS แล้วส่งให้ _apply_tag_batch ด้วย _resolve_transition
+    """
+    delay_seconds = get_device_config(session.device_id, 'DELAY_SECONDS', 20)
+    due = _filter_due_tags(session, to_process, delay_seconds)
+    if not due:
+        return []
+    processed_tags = _apply_tag_batch(session, due, _resolve_transition, insert_new=True, events=to_process)
+    session.last_db_update_time.touch_many(dict.fromkeys(due, datetime.now()))
+    return processed_tags
+
+def _apply_tag_batch(session: DeviceSession, due: list, resolve, insert_new: bool,
+                     guard: bool = True, suppressed_out: list = None, events: dict = None) -> list:
+    """
+    ประมวลผล tags ทั้ง batch แบบ set-based
+
+    - อ่านสถานะจาก tag_cache ก่อน และ SELECT ด้วย WHERE tag_id IN (...) เฉพาะ tag ที่แคชไม่ทราบ
+    - คำนวณการเปลี่ยนตำแหน่งใน memory ผ่าน resolve(reader_loc, current_loc, status)
+    - guard: ตัดการเปลี่ยนตำแหน่งที่ flap_guard ไม่อนุญาต (tag ที่สลับโซนถี่เกินไป)
+      suppressed_out (ถ้ามี) จะได้รับ tag_id ที่ถูกตัด
+    - events: tag_id -> (event_id, reader_ts) ข้าม event ที่ commit ไปแล้ว และเขียน event_id ลง movements
+    - insert_new: tag ที่ยังไม่มีในระบบจะถูกเพิ่มเป็น ENTER ที่ location ของเครื่อง
+    - เขียน tags/movements/notifications ด้วย multi-row statements
+    - broadcast หลัง commit สำเร็จเท่านั้น
+    """
+    processed_tags = []
+    events = events if isinstance(events, dict) else {}
+    if events:
+        due = [tid for tid in due if events.get(tid, NO_EVENT)[0] not in applied_events]
+    if not due:
+        return processed_tags
+
+    new_tags = []           # tag ที่ยังไม่มีในระบบ
+    touched = []            # เครื่องอ่านนอกพื้นที่ ที่ tag อยู่นอกพื้นที่แล้ว (อัปเดต last_seen)
+    updates = {}            # (to_loc, new_status) -> [tag_id]
+    movements = []          # (tag_id, from_loc, to_loc, event_type)
+    unauthorized_exits = [] # (tag_id, to_loc)
+
+    conn = get_db_connection(POOL_INGESTION)
+    cur = conn.cursor(dictionary=True)
+    try:
+        states, _absent, unknown = tag_cache.get_many(due)
+        for start in range(0, len(unknown), BATCH_CHUNK_SIZE):
+            chunk = unknown[start:start + BATCH_CHUNK_SIZE]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cur.execute(f"""
+                SELECT tag_id, current_location_id, status, COALESCE(authorized,0) AS authorized
+                FROM tags WHERE tag_id IN ({placeholders})
+            """, tuple(chunk))
+            fetched = cur.fetchall()
+            tag_cache.load_rows(fetched)
+            for row in fetched:
+                states[row['tag_id']] = TagState(row['current_location_id'], row['status'], row['authorized'])
+
+        for tid in due:
+            state = states.get(tid)
+            if state is None:
+                if insert_new:
+                    new_tags.append(tid)
+                    movements.append((tid, None, session.location_id, "enter"))
+                continue
+
+            current_loc = state.current_location_id
+            transition = resolve(session.location_id, current_loc, state.status)
+            if transition is None:
+                if transition_table.is_outside(session.location_id) and insert_new:
+                    touched.append(tid)
+                continue
+
+            if guard and not flap_guard.allow(tid):
+                if suppressed_out is not None:
+                    suppressed_out.append(tid)
+                continue
+
+            to_loc, event_type, new_status, _action = transition
+            updates.setdefault((to_loc, new_status), []).append(tid)
+            movements.append((tid, current_loc, to_loc, event_type))
+            if event_type == "exit" and not state.authorized:
+                unauthorized_exits.append((tid, to_loc))
+
+        if new_tags:
+            cur.executemany("""
+                INSERT INTO tags
+                    (tag_id, status, current_location_id, device_id, first_seen, last_seen, authorized)
+                VALUES (%s, %s, %s, %s, NOW(), NOW(), 0)
+            """, [(tid, 'in_use', session.location_id, session.device_id) for tid in new_tags])
+
+        for (to_loc, new_status), tids in updates.items():
+            _update_tags_in(cur, tids, to_loc, new_status, session.device_id)
+        if touched:
+            _update_tags_in(cur, touched, session.location_id, 'idle', session.device_id)
+
+        notifications = []
+        first_notif_id = None
+        # โหมด buffer: notification ถูกเขียน/broadcast รวมกับ batch อื่นหลัง commit
+        buffered_notifications = notification_buffer.enabled()
+        if movements:
+            rows = []
+            for tid, from_loc, to_loc, event_type in movements:
+                event_id, event_ts = events.get(tid, NO_EVENT)
+                rows.append((tid, from_loc, to_loc, event_ts, "system", event_type, event_id))
+            cur.executemany(MOVEMENT_INSERT_SQL, rows)
+
+            for tid, from_loc, to_loc, event_type in movements:
+                title, message = _movement_message(tid, from_loc, to_loc, event_type)
+                notifications.append((tid, title, message, to_loc))
+            if not buffered_notifications:
+                cur.executemany("""
+                    INSERT INTO notifications
+                    (type, title, message, asset_id, location_id, related_id, priority, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+                """, [("movement", title, message, None, to_loc, None, "normal") for _tid, title, message, to_loc in notifications])
+                # multi-row INSERT ได้ auto-increment ต่อเนื่อง: lastrowid คือ id ของแถวแรก
+                first_notif_id = cur.lastrowid
+
+        conn.commit()
+
+        # write-through หลัง commit
+        for tid in new_tags:
+            tag_cache.put(tid, session.location_id, 'in_use', 0)
+        for (to_loc, new_status), tids in updates.items():
+            for tid in tids:
+                tag_cache.put(tid, to_loc, new_status, states[tid].authorized)
+        for tid in touched:
+            tag_cache.put(tid, session.location_id, 'idle', states[tid].authorized)
+        flap_guard.record_many(m[0] for m in movements)
+        applied_events.touch_many({events[m[0]][0]: True for m in movements if events.get(m[0], NO_EVENT)[0]})
+
+        now = datetime.now()
+        processed_tags = [m[0] for m in movements] + touched
+
+        if buffered_notifications:
+            notification_buffer.add_many(
+                {"type": "movement", "title": title, "message": message, "location_id": to_loc, "tag_id": tid}
+                for tid, title, message, to_loc in notifications
+            )
+            notifications = []
+
+        for offset, (tid, title, message, to_loc) in enumerate(notifications):
+            notif_id = first_notif_id + offset if first_notif_id else None
+            manager.queue_message({
+                "notif_id": notif_id,
+                "id": notif_id,
+                "type": "movement",
+                "title": title,
+                "message": message,
+                "asset_id": None,
+                "user_id": None,
+                "location_id": to_loc,
+                "related_id": None,
+                "is_read": False,
+                "is_acknowledged": False,
+                "priority": "normal",
+                "timestamp": now.isoformat(),
+                "created_at": now.isoformat()
+            })
+
+        for tid, to_loc in unauthorized_exits:
+            try:
+                check_unauthorized_movement(None, None, tid, to_loc, operator="system")
+            except Exception as e:
+                logger.error(f"check_unauthorized_movement failed for {tid}: {e}")
+
+        if movements:
+            logger.info(f"Device {session.device_id}: batch {len(due)} tags -> {len(new_tags)} new, {len(movements)} movements")
+
+    except Exception as e:
+        logger.error(f"Database error in _apply_tag_batch: {e}")
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        if is_connection_error(e):
+            raise  # ให้ ingestion_pool เก็บ batch ลง spool แทนการทิ้ง
+    finally:
+        try:
+            if cur:
+                cur.close()
+            if conn:
+                conn.close()
+        except Exception as e:
+            logger.error(f"Error closing database connection: {e}")
+
+    return processed_tags
+
+def _update_tags_in(cur, tag_ids: list, to_loc, new_status: str, device_id):
+    """UPDATE หลาย tag ที่ได้ผลลัพธ์เดียวกันใน statement เดียว"""
+    for start in range(0, len(tag_ids), BATCH_CHUNK_SIZE):
+        chunk = tag_ids[start:start + BATCH_CHUNK_SIZE]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cur.execute(f"""
+            UPDATE tags
+            SET current_location_id = %s,
+                status = %s,
+                device_id = %s,
+                last_seen = NOW(),
+                updated_at = NOW()
+            WHERE tag_id IN ({placeholders})
+        """, (to_loc, new_status, device_id, *chunk))
+
+# ingestion stage กลาง: intake เดียวสำหรับทุกเครื่อง + worker pool แบ่งตาม tag
+def _scanner_device_config(session: DeviceSession) -> dict:
+    """ค่าที่ส่งให้ scanner subprocess (run_device_scanner)"""
+    return {
+        'device_id': session.device_id,
+        'location_id': session.location_id,
+        'connection_type': session.connection_type,
+        'connection_info': session.connection_info,
+        # ส่งค่า scan/db interval ให้ subprocess ใช้
+        'scan_interval': session.scan_interval,
+        'db_update_interval': session.db_update_interval,
+        'streaming': settings.scan_streaming,
+        'flush_interval': settings.scan_flush_interval,
+        'flush_max_records': settings.scan_flush_max_records,
+        'edge_debounce': settings.scan_edge_debounce,
+        'report_window': float(get_device_config(session.device_id, 'DELAY_SECONDS', 20)),
+        'keepalive_interval': settings.scan_keepalive_interval,
+    }
+
+def _push_scanner_config(session: DeviceSession, update: dict):
+    """ส่งค่า runtime ใหม่ให้ scanner subprocess ผ่าน control channel (ไม่ restart) ใน background thread"""
+    control = session.control
+    if control is None or not (session.process and session.process.is_alive()):
+        return
+
+    def _send():
+        try:
+            reply = control.request({'cmd': 'update_config', 'config': update}, timeout=5.0)
+            if reply.get('error'):
+                logger.error(f"Device {session.device_id} rejected config update {update}: {reply['error']}")
+            else:
+                logger.info(f"Device {session.device_id} config pushed: {reply.get('applied')}")
+        except Exception as e:
+            logger.error(f"Failed to push config to device {session.device_id}: {e}")
+
+    threading.Thread(target=_send, name=f"config-push-{session.device_id}", daemon=True).start()
+
+def _on_runtime_config_change(device_id, key, value):
+    """
+    listener ของ runtime_config: อัปเดต session ที่ได้รับผลและ push ค่าให้ subprocess
+
+    device_id = None คือค่าระดับระบบ (มีผลกับทุกเครื่อง ยกเว้นเครื่องที่มี override)
+    """
+    if key not in ('SCAN_INTERVAL', 'DB_UPDATE_INTERVAL', 'DELAY_SECONDS', 'ABSENCE_TIMEOUT'):
+        return
+    with device_lock:
+        sessions = [s for did, s in device_sessions.items() if device_id is None or did == device_id]
+    for session in sessions:
+        update = {}
+        try:
+            if key == 'SCAN_INTERVAL':
+                session.scan_interval = float(get_system_config('SCAN_INTERVAL', 0.1))
+                update['scan_interval'] = session.scan_interval
+            elif key == 'DB_UPDATE_INTERVAL':
+                session.db_update_interval = float(get_system_config('DB_UPDATE_INTERVAL', 1))
+                update['db_update_interval'] = session.db_update_interval
+            elif key == 'DELAY_SECONDS':
+                delay = float(get_device_config(session.device_id, 'DELAY_SECONDS', 20))
+                session.last_db_update_time.ttl = delay
+                update['report_window'] = delay
+            elif settings.scan_exit_mode == "absence":
+                session.presence.ttl = float(get_device_config(session.device_id, 'ABSENCE_TIMEOUT', settings.absence_timeout))
+        except (TypeError, ValueError) as e:
+            logger.error(f"Invalid {key}={value!r} for device {session.device_id}: {e}")
+            continue
+        if update:
+            _push_scanner_config(session, update)
+
+runtime_config.subscribe(_on_runtime_config_change)
+
+# spool บนดิสก์สำหรับผลสแกนระหว่างที่ DB ใช้งานไม่ได้
+scan_spool = ScanSpool(
+    settings.data_dir / "spool",
+    max_bytes=settings.scan_spool_max_mb * 1024 * 1024,
+    segment_bytes=settings.scan_spool_segment_mb * 1024 * 1024,
+    fsync_interval=settings.scan_spool_fsync_interval,
+    replay_rate=settings.scan_spool_replay_rate,
+) if settings.scan_spool_enabled else None
+
+ingestion_pool = IngestionPool(
+    process_tags_to_db,
+    workers=settings.ingestion_workers,
+    min_rssi=settings.scan_min_rssi,
+    min_read_count=settings.scan_min_read_count,
+    departure_fn=process_departures_to_db if settings.scan_exit_mode == "absence" else None,
+    arbitration_window=settings.scan_arbitration_window,
+    arbitration_count_weight=settings.scan_arbitration_count_weight,
+    spool=scan_spool,
+)
+
+def _probe_database():
+    """ตรวจว่าเชื่อมต่อฐานข้อมูลได้ (ใช้โดย scan_spool ก่อน replay)"""
+    conn = get_db_connection(POOL_INGESTION)
+    try:
+        conn.ping(reconnect=False)
+    finally:
+        conn.close()
+
+def _drop_persisted_events(events: dict) -> dict:
+    """
+    ตัด tag ที่ event id มีแถวใน movements แล้วออกจาก batch ที่ replay จาก spool
+
+    applied_events อยู่ใน memory - หลัง restart INSERT movements ถูก UNIQUE key ตัดทิ้ง
+    แต่ UPDATE tags และ notification ของ event เดิมจะถูกทำซ้ำ จึงต้องตรวจกับฐานข้อมูลก่อน
+    (error การเชื่อมต่อส่งต่อให้ spool retry)
+    """
+    event_ids = [event[0] for event in events.values() if event[0] and event[0] not in applied_events]
+    if not event_ids:
+        return events
+    persisted = set()
+    conn = get_db_connection(POOL_INGESTION)
+    cur = conn.cursor()
+    try:
+        for start in range(0, len(event_ids), BATCH_CHUNK_SIZE):
+            chunk = event_ids[start:start + BATCH_CHUNK_SIZE]
+            cur.execute(
+                f"SELECT event_id FROM movements WHERE event_id IN ({','.join(['%s'] * len(chunk))})",
+                chunk,
+            )
+            persisted.update(row[0] for row in cur.fetchall())
+    finally:
+        cur.close()
+        conn.close()
+    if not persisted:
+        return events
+    applied_events.touch_many(dict.fromkeys(persisted, True))
+    logger.info(f"Spool replay: skipped {len(persisted)} event(s) already in movements")
+    return {tid: event for tid, event in events.items() if event[0] not in persisted}
+
+def replay_spooled_batch(record: dict):
+    """
+    เขียน batch ที่ค้างใน spool ลง DB ตามลำดับเดิม
+
+    ใช้ session ปัจจุบันของเครื่องถ้ายังเชื่อมต่ออยู่ ไม่เช่นนั้นสร้าง session ชั่วคราวจาก device/location ใน record
+    """
+    session = get_device_session(record["device_id"])
+    if session is None:
+        session = DeviceSession()
+        session.device_id = record["device_id"]
+        session.location_id = record["location_id"]
+    tags = record["tags"]
+    # record รุ่นก่อนเก็บเป็น list ของ tag_id (ไม่มี event id)
+    tags = {tid: tuple(event) for tid, event in tags.items()} if isinstance(tags, dict) else dict.fromkeys(tags, NO_EVENT)
+    tags = _drop_persisted_events(tags)
+    if not tags:
+        return
+    if record["kind"] == DEPARTURE_WORK:
+        process_departures_to_db(session, tags)
+    elif settings.scan_exit_mode == "absence":
+        # ไม่ผ่าน flap_guard: record ถูก replay ติดกันเร็วกว่าเวลาจริงที่เกิด
+        _apply_tag_batch(session, list(tags), _resolve_arrival, insert_new=True, guard=False, events=tags)
+    else:
+        process_tags_to_db(session, tags)
+
+def start_scan_spool():
+    """เริ่ม thread replay ของ spool (replay งานที่ค้างจากการทำงานครั้งก่อนด้วย)"""
+    if scan_spool is not None:
+        scan_spool.start(replay_spooled_batch, _probe_database)
+
 def get_real_device_sn(connection_type: str, connection_info: str) -> str:
     """ดึง SN จริงจากเครื่อง RFID โดยใช้ testapi.get_device_sn แบบปลอดภัย"""
     api = Api()
@@ -634,21 +1097,15 @@ def connect_scanner(request: ConnectRequest):
         session.connection_info = connection_info
         
         # สร้าง subprocess สำหรับ device นี้
-        session.result_queue = Queue()
-        session.cmd_queue = Queue()  # <-- สร้าง command queue และส่งเข้า subprocess
-        device_config = {
-            'device_id': device_id,
-            'location_id': request.location_id,
-            'connection_type': request.connection_type,
-            'connection_info': connection_info,
-            # ส่งค่า scan/db interval ให้ subprocess ใช้
-            'scan_interval': session.scan_interval,
-            'db_update_interval': session.db_update_interval
-        }
+        session.ring = ReadRing.create(settings.scan_ring_capacity)
+        session.cmd_queue = Queue()
+        session.reply_queue = Queue()
+        session.control = ControlChannel(session.cmd_queue, session.reply_queue)
+        device_config = _scanner_device_config(session)
         
         session.process = Process(
             target=run_device_scanner, 
-            args=(device_config, session.result_queue, session.cmd_queue),
+            args=(device_config, session.ring.name, session.cmd_queue, session.reply_queue),
             daemon=True
         )
         session.process.start()
@@ -665,9 +1122,8 @@ def connect_scanner(request: ConnectRequest):
         
         session.is_connected = True
         
-        # เริ่ม DB thread (รับผลจาก queue)
-        session.db_thread = threading.Thread(target=result_processor_loop, args=(session,), daemon=True)
-        session.db_thread.start()
+        # ส่ง ring เข้า ingestion pool กลาง (ไม่มี thread ต่อเครื่องแล้ว)
+        ingestion_pool.register(session)
         
         logger.info(f"✅ Device {device_id} connected successfully: SN={sn}, Location={request.location_id}")
         
@@ -687,68 +1143,6 @@ def connect_scanner(request: ConnectRequest):
         logger.error(f"Error in connect_scanner: {e}")
         raise HTTPException(500, f"เกิดข้อผิดพลาดในการเชื่อมต่อ: {str(e)}")
 
-def result_processor_loop(session: DeviceSession):
-    """Thread รับผลจาก subprocess และประมวลผล DB"""
-    #logger.info(f"Result processor started for device {session.device_id}")
-    
-    # ค่า fallback ถ้าไม่กำหนด
-    db_interval = float(session.db_update_interval or 1.0)
-    
-    while not session.thread_stop.is_set() and session.is_connected:
-        try:
-            # รับผลจาก subprocess (timeout ตาม DB_UPDATE_INTERVAL)
-            if session.result_queue:
-                try:
-                    result_data = session.result_queue.get(timeout=max(0.1, db_interval))
-                except queue.Empty:
-                    # ไม่มีข้อมูลภายในช่วงเวลา ให้วน loop อีกครั้ง
-                    continue
-                
-                # ถ้ามีสัญญาณสถานะจาก subprocess (เชื่อมต่อ/ล้มเหลว)
-                if isinstance(result_data, dict) and result_data.get('status'):
-                    status = result_data.get('status')
-                    if status == 'connection_failed':
-                        logger.error(f"Device {session.device_id} subprocess connection failed")
-                        session.is_connected = False
-                        break
-                    elif status == 'connected':
-                        logger.info(f"Device {session.device_id} subprocess connected successfully")
-                        # ถ้า subprocess ส่ง real_sn ให้เก็บ
-                        real_sn = result_data.get('real_sn')
-                        if real_sn:
-                            session.device_sn = real_sn
-                        continue
-                
-                # ⭐ ถ้าเป็น params response ให้ข้าม - ปล่อยให้ get_scanner_config จัดการ
-                if isinstance(result_data, dict) and result_data.get('cmd') == 'params':
-                    # ไม่ประมวลผลที่นี่ - ปล่อยให้ get_scanner_config อ่านจาก queue
-                    # แต่ต้องส่งกลับไปใน queue เพราะเราอ่านออกมาแล้ว
-                    try:
-                        session.result_queue.put(result_data, timeout=0.1)
-                    except:
-                        pass
-                    continue
-                
-                # ปกติ: ประมวลผล tags
-                if isinstance(result_data, dict) and 'tags' in result_data:
-                    tags = set(result_data['tags'])
-                    if tags:
-                        with session.device_lock:
-                            session.current_scanned_tags.update(tags)
-                        # ประมวลผล DB (ใช้การคัดกรอง DELAY_SECONDS ภายใน)
-                        process_tags_to_db(session, tags)
-                else:
-                    # ถ้า message รูปแบบอื่น ๆ ให้ข้าม
-                    continue
-            else:
-                time.sleep(max(0.1, db_interval))
-                
-        except Exception as e:
-            logger.error(f"Device {session.device_id} result processor error: {e}")
-            time.sleep(1.0)
-    
-    logger.info(f"Result processor stopped for device {session.device_id}")
-
 @router.post("/disconnect/{device_id}")
 def disconnect_device(device_id: int):
     """ตัดการเชื่อมต่อเครื่องที่ระบุ"""
@@ -793,7 +1187,7 @@ def list_devices():
             device_id = device['device_id']
             session = get_device_session(device_id)
             device['is_connected'] = session.is_connected if session else False
-            device['current_tags_count'] = len(session.current_scanned_tags) if session else 0
+            device['current_tags_count'] = len(session.presence) if session else 0
         
         return {"devices": devices}
         
@@ -837,7 +1231,7 @@ def get_overall_status():
             device_id = db_device['device_id']
             session = get_device_session(device_id)
             
-            scanned_count = len(session.current_scanned_tags) if session else 0
+            scanned_count = len(session.presence) if session else 0
             tracked_count = db_device['tracked_count'] or 0
             
             device_info = {
@@ -849,7 +1243,7 @@ def get_overall_status():
                 "scanned_count": scanned_count,
                 "tracked_count": tracked_count,
                 "process_alive": session.process.is_alive() if session and session.process else False,
-                "db_thread_alive": session.db_thread.is_alive() if session and session.db_thread else False,
+                "db_thread_alive": ingestion_pool.is_running() if session else False,
                 "connection_type": db_device['connection_type'],
                 "connection_info": db_device['connection_info']
             }
@@ -861,7 +1255,7 @@ def get_overall_status():
     except Exception as e:
         logger.error(f"Error getting status from database: {e}")
         for device_id, session in device_sessions.items():
-            scanned_count = len(session.current_scanned_tags)
+            scanned_count = len(session.presence)
             device_status.append({
                 "device_id": device_id,
                 "device_sn": session.device_sn,
@@ -871,7 +1265,7 @@ def get_overall_status():
                 "scanned_count": scanned_count,
                 "tracked_count": 0,
                 "process_alive": session.process.is_alive() if session.process else False,
-                "db_thread_alive": session.db_thread.is_alive() if session.db_thread else False,
+                "db_thread_alive": ingestion_pool.is_running(),
                 "connection_type": session.connection_type,
                 "connection_info": session.connection_info
             })
@@ -885,6 +1279,51 @@ def get_overall_status():
         "devices": device_status
     }
 
+@router.get("/present/{device_id}")
+def get_present_tags(device_id: int, limit: int = 1000):
+    """รายการ tag ที่เครื่องนี้เห็นอยู่ตอนนี้ (จาก presence index ใน memory ไม่แตะฐานข้อมูล)"""
+    session = get_device_session(device_id)
+    if not session:
+        raise HTTPException(404, f"ไม่พบ device {device_id}")
+    
+    tags = []
+    for tag_id, read in session.presence.items(limit=limit):
+        entry = {"tag_id": tag_id}
+        if read is not None:
+            entry.update({
+                "first_seen": read.first_seen,
+                "last_seen": read.last_seen,
+                "read_count": read.read_count,
+                "rssi_peak": read.rssi_peak / 10,
+                "antenna_mask": read.antenna_mask,
+            })
+        tags.append(entry)
+    
+    return {
+        "device_id": device_id,
+        "location_id": session.location_id,
+        "count": len(session.presence),
+        "ttl_seconds": session.presence.ttl,
+        "tags": tags
+    }
+
+@router.get("/metrics")
+def get_pipeline_metrics():
+    """ตัวชี้วัดของ scan pipeline (ใช้ตรวจสอบประสิทธิภาพ)"""
+    with device_lock:
+        sessions = list(device_sessions.items())
+    return {
+        "presence": {device_id: session.presence.stats() for device_id, session in sessions},
+        "tag_cache": tag_cache.stats(),
+        "location_rules": transition_table.stats(),
+        "location_directory": location_directory.stats(),
+        "flap_guard": flap_guard.stats(),
+        "notification_buffer": notification_buffer.stats(),
+        "runtime_config": runtime_config.stats(),
+        "db_pool": get_pool_stats(),
+        "ingestion": ingestion_pool.stats()
+    }
+
 @router.get("/scanner-config/{device_id}")
 def get_scanner_config(device_id: int):
     """ดึงการตั้งค่าของ scanner เฉพาะเครื่องที่ระบุ โดยไม่ restart ถ้าไม่มีการเปลี่ยนแปลง"""
@@ -899,47 +1338,20 @@ def get_scanner_config(device_id: int):
     try:
         #logger.info(f"Requesting device params for device {device_id} via IPC...")
         
-        # ส่งคำสั่งให้ subprocess อ่านพารามิเตอร์ (ไม่ต้อง kill)
-        cmd = {'cmd': 'get_params', 'device_id': device_id}
+        # ส่งคำสั่งให้ subprocess อ่านพารามิเตอร์ (ไม่ต้อง kill) แล้วรอคำตอบที่ id ตรงกัน
         try:
-            session.cmd_queue.put(cmd, timeout=1.0)
-            #logger.info(f"Command sent to device {device_id}")
-        except Exception as e:
-            logger.error(f"Failed to send get_params command: {e}")
+            reply = session.control.request({'cmd': 'get_params', 'device_id': device_id}, timeout=8.0)
+        except TimeoutError:
+            logger.error(f"Device {device_id} timeout waiting for params")
+            raise HTTPException(504, "Timeout waiting for device params")
+        except queue.Full:
+            logger.error(f"Failed to send get_params command to device {device_id}")
             raise HTTPException(500, "ไม่สามารถส่งคำสั่งไปยัง subprocess ได้")
         
-        # รอผลจาก result_queue (กรอง message อื่น ๆ ที่มาจาก scan)
-        timeout = 8.0
-        start = time.time()
-        params = None
-        attempts = 0
-        while time.time() - start < timeout:
-            attempts += 1
-            try:
-                remaining_time = max(0.5, timeout - (time.time() - start))
-                item = session.result_queue.get(timeout=remaining_time)
-                #logger.debug(f"Device {device_id} received item (attempt {attempts}): {type(item)} - {item.get('cmd') if isinstance(item, dict) else 'not dict'}")
-            except queue.Empty:
-                #logger.warning(f"Device {device_id} queue timeout after {attempts} attempts")
-                break
-            if isinstance(item, dict) and item.get('cmd') == 'params' and item.get('device_id') == device_id:
-                if 'error' in item:
-                    logger.error(f"Device {device_id} params error: {item['error']}")
-                    raise HTTPException(500, f"Device error: {item['error']}")
-                params = item.get('params')
-                #logger.info(f"Device {device_id} received params successfully")
-                break
-            else:
-                # ส่งกลับ message ที่ไม่ใช่ params เพื่อให้ result_processor_loop ประมวลผล
-                try:
-                    session.result_queue.put(item, timeout=0.1)
-                except:
-                    pass
-                continue
-        
-        if params is None:
-            logger.error(f"Device {device_id} timeout waiting for params after {attempts} attempts")
-            raise HTTPException(504, "Timeout waiting for device params")
+        if 'error' in reply:
+            logger.error(f"Device {device_id} params error: {reply['error']}")
+            raise HTTPException(500, f"Device error: {reply['error']}")
+        params = reply.get('params') or {}
         
         # แปลงเป็น list ตาม format เดิม
         configs = [
@@ -1047,9 +1459,8 @@ def update_scanner_config(device_id: int, config: DeviceConfigRequest):
                 session.process.kill()
                 session.process.join(timeout=2.0)
 
-        if session.db_thread and session.db_thread.is_alive():
-            session.thread_stop.set()
-            session.db_thread.join(timeout=3.0)
+        # หยุดรับผลจากเครื่องนี้ชั่วคราว (ingestion intake ข้าม session ที่ thread_stop ถูก set)
+        session.thread_stop.set()
 
         # give hardware time to free the port
         time.sleep(2.0)
@@ -1178,35 +1589,32 @@ def update_scanner_config(device_id: int, config: DeviceConfigRequest):
 def _restart_device_subprocess(session: DeviceSession):
     """เริ่ม subprocess ของ device ใหม่หลังหยุดชั่วคราว"""
     try:
-        # รีเซ็ทสถานะ
-        session.thread_stop.clear()
-        
-        # สร้าง queue ใหม่
-        session.result_queue = Queue()
-        # ถ้าคำสั่งเก่าไม่มีหรือปิด ให้สร้างใหม่
+        # ล้าง ring เดิม (subprocess เก่าหยุดแล้ว) หรือสร้างใหม่ถ้ายังไม่มี
+        if session.ring:
+            session.ring.reset()
+        else:
+            session.ring = ReadRing.create(settings.scan_ring_capacity)
+        # ถ้าคำสั่งเก่าไม่มีหรือปิด ให้สร้างใหม่ / reply queue ใหม่เพื่อทิ้งคำตอบค้าง
         if not getattr(session, 'cmd_queue', None):
             session.cmd_queue = Queue()
+        session.reply_queue = Queue()
+        session.control = ControlChannel(session.cmd_queue, session.reply_queue)
+        
+        # รีเซ็ทสถานะ
+        session.thread_stop.clear()
         
         # สร้าง subprocess ใหม่
-        device_config = {
-            'device_id': session.device_id,
-            'location_id': session.location_id,
-            'connection_type': session.connection_type,
-            'connection_info': session.connection_info,
-            'scan_interval': session.scan_interval,
-            'db_update_interval': session.db_update_interval
-        }
+        device_config = _scanner_device_config(session)
         
         session.process = Process(
             target=run_device_scanner, 
-            args=(device_config, session.result_queue, session.cmd_queue),
+            args=(device_config, session.ring.name, session.cmd_queue, session.reply_queue),
             daemon=True
         )
         session.process.start()
         
-        # เริ่ม DB thread ใหม่
-        session.db_thread = threading.Thread(target=result_processor_loop, args=(session,), daemon=True)
-        session.db_thread.start()
+        # ลงทะเบียนกับ ingestion pool อีกครั้ง
+        ingestion_pool.register(session)
         
         # รอให้ subprocess เชื่อมต่อ
         time.sleep(2.0)
@@ -1223,13 +1631,5 @@ def _restart_device_subprocess(session: DeviceSession):
         session.is_connected = False
 
 def get_location_name(location_id):
-    """แปลง location_id เป็นชื่อ location"""
-    if location_id is None:
-        return "ไม่ระบุ"
-    
-    location_names = {
-        1: "โรงงาน", 
-        2: "ห้องช่าง",
-        3: "นอกพื้นที่"
-    }
-    return location_names.get(location_id, f"Location {location_id}")
\ No newline at end of file
+    """แปลง location_id เป็นชื่อ location (จาก location_directory ไม่ query ฐานข้อมูล)"""
+    return location_directory.name(location_id)
\ No newline at end of file
@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import List
 from config.database import get_db_connection  # ✅ แก้ไข import
 from models import SystemConfig
+from runtime_config import runtime_config
 
 router = APIRouter(prefix="/api/system-config", tags=["system_config"])
 
@@ -56,7 +57,7 @@ def update_system_config(key: str, cfg: SystemConfigUpdate):
             raise HTTPException(status_code=404, detail="Config key not found")
         
         # ตรวจสอบค่าที่ใส่เข้ามา
-        if key in ['SCAN_INTERVAL', 'DB_UPDATE_INTERVAL']:
+        if key in ['SCAN_INTERVAL', 'DB_UPDATE_INTERVAL', 'ABSENCE_TIMEOUT']:
             try:
                 value = float(cfg.value)
                 if value <= 0:
@@ -81,6 +82,8 @@ def update_system_config(key: str, cfg: SystemConfigUpdate):
         
         cur.execute(update_query, params)
         conn.commit()
+        # อัปเดตแคช + push ค่าให้ scanner ที่กำลังทำงาน (ไม่ต้อง restart)
+        runtime_config.set_system(key, cfg.value)
         
         # ดึงข้อมูลที่อัปเดตแล้ว
         cur.execute(
@@ -108,6 +111,8 @@ def reset_to_defaults():
                 (value, key)
             )
         conn.commit()
+        for key, value in default_values.items():
+            runtime_config.set_system(key, value)
         return {"message": "Reset to default values successfully", "defaults": default_values}
     finally:
         cur.close(); conn.close()
\ No newline at end of file
@@ -6,6 +6,7 @@ from models import Tag, TagOp, BindModel
 from routers.notifications import create_notification
 from routers.alerts import check_unauthorized_movement
 from ws_manager import manager
+from tag_state_cache import tag_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -60,6 +61,18 @@ def _broadcast_tag_update(tag_obj):
         logger.error(f"Failed to broadcast tag update: {e}")
 
 
+def _cache_tag(tag_obj):
+    """write-through สถานะ tag ล่าสุดเข้า tag_cache (เรียกหลัง commit)"""
+    if not tag_obj:
+        return
+    tag_cache.put(
+        tag_obj["tag_id"],
+        tag_obj.get("current_location_id"),
+        tag_obj.get("status"),
+        1 if tag_obj.get("authorized") else 0,
+    )
+
+
 def _get_canonical_tag(cur, tag_id: str):
     """ดึงข้อมูล tag แบบครบถ้วนจาก database"""
     cur.execute("""
@@ -279,6 +292,7 @@ def tag_operation(op: TagOp):
 
             cur.execute("DELETE FROM tag_bindings WHERE tag_id=%s", (op.tag_id,))
             cur.execute("UPDATE tags SET asset_id=NULL, status='idle', last_seen=%s, authorized=0, updated_at=NOW() WHERE tag_id=%s", (ts, op.tag_id))
+            tag_cache.invalidate(op.tag_id)  # ให้ check_unauthorized_movement อ่านค่าใหม่จาก cur
             if aid:
                 cur.execute("UPDATE assets SET status='idle', updated_at=NOW() WHERE asset_id=%s", (aid,))
 
@@ -308,6 +322,7 @@ def tag_operation(op: TagOp):
         if not tag_obj:
             raise HTTPException(status_code=500, detail="Failed to load tag after operation")
 
+        _cache_tag(tag_obj)
         _broadcast_tag_update(tag_obj)
         return tag_obj
 
@@ -365,6 +380,7 @@ def bind_tag(tag_id: str, b: BindModel):
         if not tag_obj:
             raise HTTPException(status_code=500, detail="Failed to create/update tag")
         
+        _cache_tag(tag_obj)
         _broadcast_tag_update(tag_obj)
         return tag_obj
 
@@ -396,6 +412,7 @@ def unbind_tag(tag_id: str):
 
         cur.execute("DELETE FROM tag_bindings WHERE tag_id=%s", (tag_id,))
         cur.execute("UPDATE tags SET asset_id=NULL, status='idle', last_seen=%s, authorized=0, updated_at=NOW() WHERE tag_id=%s", (ts, tag_id))
+        tag_cache.invalidate(tag_id)  # ให้ check_unauthorized_movement อ่านค่าใหม่จาก cur
         if aid:
             cur.execute("UPDATE assets SET status='idle', updated_at=NOW() WHERE asset_id=%s", (aid,))
         conn.commit()
@@ -421,6 +438,7 @@ def unbind_tag(tag_id: str):
         if not tag_obj:
             raise HTTPException(status_code=404, detail="Tag not found after unbind")
         
+        _cache_tag(tag_obj)
         _broadcast_tag_update(tag_obj)
         return tag_obj
 
@@ -461,6 +479,7 @@ def set_tag_authorized(tag_id: str, payload: dict):
         # ดึงข้อมูล tag ล่าสุดและ broadcast
         tag_obj = _get_canonical_tag(cur, tag_id)
         if tag_obj:
+            _cache_tag(tag_obj)
             _broadcast_tag_update(tag_obj)
 
         # สร้าง notification
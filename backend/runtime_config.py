@@ -0,0 +1,213 @@
+"""
+Runtime Config - แคชค่า system_config และ device_configs ในหน่วยความจำ
+==================================================================
+
+เดิม get_device_config(device_id, 'DELAY_SECONDS') query ฐานข้อมูลทุกครั้งที่ประมวลผล batch
+และ get_system_config query ทุกครั้งที่สร้าง session
+
+หลักการ:
+- โหลดทั้งสองตารางครั้งเดียว (SELECT 2 ครั้ง) เก็บเป็น snapshot (dict) แล้วสลับทั้งก้อนตอน reload
+- get_system() / get_device(): อ่านจาก memory เท่านั้น (device override -> system -> default)
+- set_system() / set_device(): เรียกหลังเขียน DB สำเร็จ อัปเดตแคชทันทีและแจ้ง listener
+- reload เป็นระยะ (start_auto_refresh) เพื่อรับค่าที่ถูกแก้จาก process อื่นหรือแก้ตรงใน DB
+  ค่าที่เปลี่ยนหรือถูกลบจากการ reload ก็ถูกแจ้ง listener เช่นกัน
+- listener: fn(device_id, key, value) - device_id = None คือค่าระดับระบบ
+- โหลดไม่สำเร็จ (DB ล่ม): ใช้ค่า default และลองใหม่หลัง RETRY_INTERVAL
+
+การใช้งาน:
+    from runtime_config import runtime_config
+
+    delay = runtime_config.get_device(device_id, 'DELAY_SECONDS', 20)
+    runtime_config.subscribe(on_change)
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config.database import get_db_connection, POOL_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+RETRY_INTERVAL = 5.0  # วินาที - เว้นระยะการโหลดใหม่เมื่อ DB ใช้งานไม่ได้
+
+def cast_config_value(value, default_value=None):
+    """แปลงค่า (string จาก DB) ตามชนิดของ default เหมือน get_system_config เดิม"""
+    if default_value is None or value is None:
+        return value
+    if isinstance(default_value, bool):
+        return str(value).strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(default_value, int):
+        return int(float(value))
+    if isinstance(default_value, float):
+        return float(value)
+    return str(value)
+
+class RuntimeConfig:
+    """
+    แคช config แบบ snapshot (thread-safe: อ่านไม่ต้องล็อก สลับ snapshot ภายใต้ lock)
+    """
+
+    def __init__(self):
+        self._system: Dict[str, str] = {}
+        self._device: Dict[Tuple[int, str], str] = {}
+        self._loaded = False
+        self._next_retry = 0.0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable] = []
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.loads = 0
+        self.load_errors = 0
+        self.hits = 0
+        self.last_loaded_at: Optional[float] = None
+
+    # ---------- load ----------
+    def reload(self) -> bool:
+        """โหลดทั้งสองตารางใหม่ แจ้ง listener สำหรับค่าที่เปลี่ยน คืน False ถ้าโหลดไม่สำเร็จ"""
+        try:
+            conn = get_db_connection(POOL_BACKGROUND)
+            cur = conn.cursor(dictionary=True)
+            try:
+                cur.execute("SELECT `key`, `value` FROM system_config")
+                system = {row['key']: row['value'] for row in cur.fetchall()}
+                cur.execute("SELECT device_id, config_key, config_value FROM device_configs")
+                device = {(int(row['device_id']), row['config_key']): row['config_value'] for row in cur.fetchall()}
+            finally:
+                cur.close()
+                conn.close()
+        except Exception as e:
+            self.load_errors += 1
+            self._next_retry = time.time() + RETRY_INTERVAL
+            logger.error(f"Failed to load runtime config: {e}")
+            return False
+
+        with self._lock:
+            was_loaded = self._loaded
+            old_system, old_device = self._system, self._device
+            self._system, self._device = system, device
+            self._loaded = True
+            self.loads += 1
+            self.last_loaded_at = time.time()
+
+        if was_loaded:
+            for key, value in system.items():
+                if old_system.get(key) != value:
+                    self._notify(None, key, value)
+            for (device_id, key), value in device.items():
+                if old_device.get((device_id, key)) != value:
+                    self._notify(device_id, key, value)
+            # ค่าที่ถูกลบ: แจ้งด้วยค่าที่มีผลแทน (override ที่ลบ -> ค่าระดับระบบ, ค่าระบบที่ลบ -> None = default)
+            for key in old_system.keys() - system.keys():
+                self._notify(None, key, None)
+            for device_id, key in old_device.keys() - device.keys():
+                self._notify(device_id, key, system.get(key))
+        logger.info(f"Runtime config loaded: {len(system)} system keys, {len(device)} device overrides")
+        return True
+
+    def _ensure_loaded(self):
+        if not self._loaded and time.time() >= self._next_retry:
+            self.reload()
+
+    # ---------- read ----------
+    def get_system(self, key: str, default_value=None):
+        self._ensure_loaded()
+        value = self._system.get(key)
+        if value is None:
+            return default_value
+        self.hits += 1
+        try:
+            return cast_config_value(value, default_value)
+        except (TypeError, ValueError):
+            logger.error(f"Invalid system config {key}={value!r}")
+            return default_value
+
+    def get_device(self, device_id: int, key: str, default_value=None):
+        """ค่าของเครื่อง ถ้าไม่มี override ใช้ค่าระดับระบบ"""
+        self._ensure_loaded()
+        value = self._device.get((device_id, key))
+        if value is None:
+            return self.get_system(key, default_value)
+        self.hits += 1
+        try:
+            return cast_config_value(value, default_value)
+        except (TypeError, ValueError):
+            logger.error(f"Invalid device config {device_id}.{key}={value!r}")
+            return default_value
+
+    # ---------- write-through ----------
+    def set_system(self, key: str, value):
+        """อัปเดตแคชหลังเขียน system_config สำเร็จ"""
+        value = None if value is None else str(value)
+        with self._lock:
+            system = dict(self._system)
+            changed = system.get(key) != value
+            system[key] = value
+            self._system = system
+        if changed:
+            self._notify(None, key, value)
+
+    def set_device(self, device_id: int, key: str, value):
+        """อัปเดตแคชหลังเขียน device_configs สำเร็จ"""
+        value = None if value is None else str(value)
+        with self._lock:
+            device = dict(self._device)
+            changed = device.get((device_id, key)) != value
+            device[(device_id, key)] = value
+            self._device = device
+        if changed:
+            self._notify(device_id, key, value)
+
+    def invalidate(self):
+        """ทิ้งแคชทั้งหมด ครั้งถัดไปที่อ่านจะโหลดใหม่"""
+        with self._lock:
+            self._loaded = False
+            self._next_retry = 0.0
+
+    # ---------- listeners ----------
+    def subscribe(self, fn: Callable):
+        """fn(device_id, key, value) ถูกเรียกเมื่อค่าเปลี่ยน (device_id = None คือค่าระดับระบบ)"""
+        if fn not in self._listeners:
+            self._listeners.append(fn)
+
+    def _notify(self, device_id, key, value):
+        for fn in list(self._listeners):
+            try:
+                fn(device_id, key, value)
+            except Exception as e:
+                logger.error(f"Runtime config listener failed for {key}: {e}")
+
+    # ---------- background refresh ----------
+    def start_auto_refresh(self, interval: float = 60.0):
+        """reload เป็นระยะ (0 = ไม่ refresh)"""
+        if interval <= 0:
+            return None
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return self._refresh_thread
+        self._stop.clear()
+
+        def _loop():
+            while not self._stop.wait(interval):
+                self.reload()
+
+        self._refresh_thread = threading.Thread(target=_loop, name="runtime-config-refresh", daemon=True)
+        self._refresh_thread.start()
+        return self._refresh_thread
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self._loaded,
+            "system_keys": len(self._system),
+            "device_overrides": len(self._device),
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "hits": self.hits,
+            "last_loaded_at": self.last_loaded_at,
+        }
+
+# Global instance
+runtime_config = RuntimeConfig()
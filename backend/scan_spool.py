@@ -0,0 +1,327 @@
+"""
+Scan Spool - คิวบนดิสก์แบบ append-only สำหรับผลสแกนเมื่อฐานข้อมูลช้าหรือล่ม
+=========================================================================
+
+เดิม worker ที่เขียน DB ไม่สำเร็จจะ rollback แล้วทิ้ง batch ทำให้ movement หายระหว่าง MySQL failover
+และ worker ค้างอยู่กับการเชื่อมต่อที่ล้มเหลวทุก batch
+
+หลักการ:
+- ingestion worker เรียก should_spool() ก่อนเขียน DB ถ้า DB ใช้งานไม่ได้ หรือยังมีงานค้างใน spool
+  (เพื่อรักษาลำดับ) ให้ append() ลง spool แทน
+- ไฟล์ถูกแบ่งเป็น segment (<seq>.seg) ขนาดไม่เกิน segment_bytes
+  แต่ละ record = header (ความยาว, CRC32 ของ payload) + payload JSON
+- fsync แบบรวม: fsync เมื่อครบ fsync_batch records หรือผ่านไป fsync_interval วินาที
+- thread replay ตรวจ DB ทุก retry_interval วินาที เมื่อกลับมาใช้ได้จะ replay ตามลำดับ
+  ไม่เกิน replay_rate records/วินาที และบันทึกตำแหน่งไว้ในไฟล์ cursor
+- record ที่ CRC ไม่ตรง (เช่นเขียนค้างตอนไฟดับ) ถูกข้ามส่วนที่เหลือของ segment และนับใน corrupt
+- spool เต็ม (max_bytes) record ใหม่จะถูกทิ้งและนับใน dropped
+
+การ replay เป็นแบบ at-least-once: handler ต้อง idempotent (resolver ของ location_rules
+คืน None เมื่อ tag อยู่ที่ตำแหน่งปลายทางแล้ว)
+
+การใช้งาน:
+    spool.start(replay_fn, probe_fn)
+    if spool.should_spool():
+        spool.append(device_id, location_id, kind, tags)
+"""
+
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from config.database import is_connection_error
+
+logger = logging.getLogger(__name__)
+
+# length(u32) crc32(u32)
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_SUFFIX = ".seg"
+CURSOR_FILE = "cursor.json"
+
+class ScanSpool:
+    """
+    Spool บนดิสก์ระหว่าง ingestion worker กับการเขียน DB
+
+    Args:
+        directory: โฟลเดอร์เก็บ segment
+        max_bytes: ขนาดรวมสูงสุดของ spool
+        segment_bytes: ขนาดสูงสุดต่อ segment
+        fsync_interval: fsync ข้อมูลที่ค้างทุกกี่วินาที
+        fsync_batch: fsync เมื่อมี record ที่ยังไม่ fsync ครบจำนวนนี้
+        replay_rate: จำนวน record สูงสุดที่ replay ต่อวินาที
+        retry_interval: ระยะเวลาระหว่างการตรวจว่า DB กลับมาแล้ว (วินาที)
+    """
+
+    def __init__(self, directory, max_bytes: int = 512 * 1024 * 1024, segment_bytes: int = 16 * 1024 * 1024,
+                 fsync_interval: float = 0.2, fsync_batch: int = 256, replay_rate: float = 200.0,
+                 retry_interval: float = 1.0):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.replay_rate = replay_rate
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._replay_fn: Optional[Callable] = None
+        self._probe_fn: Optional[Callable] = None
+        # segment ที่กำลังเขียน
+        self._write_fd: Optional[int] = None
+        self._write_segment: Optional[int] = None
+        self._write_offset = 0
+        self._next_segment = 1
+        self._unsynced = 0
+        self._last_fsync = time.time()
+        self._total_bytes = 0
+        self._backlog = False
+        self.db_available = True
+        self.last_error: Optional[str] = None
+        self.appended = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.corrupt = 0
+        self.replay_errors = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = self._segments()
+        self._total_bytes = sum((self.directory / self._segment_name(n)).stat().st_size for n in segments)
+        self._backlog = bool(segments)
+        if segments:
+            logger.warning(f"Scan spool has {len(segments)} segment(s) ({self._total_bytes} bytes) pending replay")
+
+    # ---------- files ----------
+    @staticmethod
+    def _segment_name(number: int) -> str:
+        return f"{number:012d}{SEGMENT_SUFFIX}"
+
+    def _segments(self) -> list:
+        return sorted(int(p.stem) for p in self.directory.glob(f"*{SEGMENT_SUFFIX}") if p.stem.isdigit())
+
+    def _read_cursor(self):
+        try:
+            data = json.loads((self.directory / CURSOR_FILE).read_text())
+            return int(data["segment"]), int(data["offset"])
+        except Exception:
+            return None, 0
+
+    def _write_cursor(self, segment: int, offset: int):
+        path = self.directory / CURSOR_FILE
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"segment": segment, "offset": offset}))
+        os.replace(tmp, path)
+
+    def _open_segment(self):
+        """เปิด segment ใหม่สำหรับเขียน (เรียกภายใต้ lock)"""
+        self._close_segment()
+        segments = self._segments()
+        number = max((segments[-1] + 1) if segments else 1, self._next_segment)
+        self._next_segment = number + 1
+        self._write_fd = os.open(self.directory / self._segment_name(number), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._write_segment = number
+        self._write_offset = 0
+
+    def _close_segment(self):
+        if self._write_fd is not None:
+            os.fsync(self._write_fd)
+            os.close(self._write_fd)
+            self._write_fd = None
+            self._write_segment = None
+            self._unsynced = 0
+
+    def _maybe_fsync(self, force: bool = False):
+        """fsync แบบรวมหลาย record (เรียกภายใต้ lock)"""
+        if self._write_fd is None or not self._unsynced:
+            return
+        if force or self._unsynced >= self.fsync_batch or time.time() - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._write_fd)
+            self._unsynced = 0
+            self._last_fsync = time.time()
+
+    # ---------- write ----------
+    def should_spool(self) -> bool:
+        """True ถ้าต้องเขียนลง spool แทน DB (DB ใช้ไม่ได้ หรือยังมีงานค้างที่ต้อง replay ก่อน)"""
+        return not self.db_available or self._backlog
+
+    def mark_unavailable(self, error):
+        if self.db_available:
+            logger.error(f"Database unavailable - spooling scan events to {self.directory}: {error}")
+        self.db_available = False
+        self.last_error = str(error)
+        self._wakeup.set()
+
+    def append(self, device_id: int, location_id, kind: str, tags: Dict[str, tuple], ts: Optional[float] = None) -> bool:
+        """เพิ่ม batch (tag_id -> (event_id, reader_ts)) ลง spool คืน False ถ้า spool เต็ม"""
+        payload = json.dumps({
+            "device_id": device_id,
+            "location_id": location_id,
+            "kind": kind,
+            "tags": tags,
+            "ts": time.time() if ts is None else ts,
+        }, separators=(",", ":")).encode("utf-8")
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._total_bytes + len(record) > self.max_bytes:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    logger.error(f"Scan spool full ({self._total_bytes} bytes) - dropped {self.dropped} batches")
+                return False
+            if self._write_fd is None or self._write_offset + len(record) > self.segment_bytes:
+                self._open_segment()
+            os.write(self._write_fd, record)
+            self._write_offset += len(record)
+            self._total_bytes += len(record)
+            self._unsynced += 1
+            self._backlog = True
+            self.appended += 1
+            self._maybe_fsync()
+        self._wakeup.set()
+        return True
+
+    # ---------- replay ----------
+    def start(self, replay_fn: Callable, probe_fn: Callable):
+        """
+        เริ่ม thread replay
+
+        Args:
+            replay_fn: ฟังก์ชัน (record_dict) ที่เขียน record ลง DB (โยน exception ถ้าล้มเหลว)
+            probe_fn: ฟังก์ชันตรวจว่า DB ใช้งานได้ (โยน exception ถ้าไม่ได้)
+        """
+        self._replay_fn = replay_fn
+        self._probe_fn = probe_fn
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._replay_loop, name="scan-spool-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        with self._lock:
+            self._close_segment()
+
+    def _replay_loop(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.retry_interval)
+            self._wakeup.clear()
+            try:
+                with self._lock:
+                    self._maybe_fsync()
+                if not self._backlog and self.db_available:
+                    continue
+                if not self.db_available:
+                    try:
+                        self._probe_fn()
+                    except Exception as e:
+                        self.last_error = str(e)
+                        continue
+                    logger.info("Database available again - replaying scan spool")
+                    self.db_available = True
+                self._replay()
+            except Exception as e:
+                logger.error(f"Scan spool replay error: {e}")
+
+    def _replay(self):
+        """replay ทุก segment ตามลำดับจนหมด หรือจน DB ล่มอีกครั้ง"""
+        min_gap = 1.0 / self.replay_rate if self.replay_rate else 0.0
+        while not self._stop.is_set():
+            segments = self._segments()
+            if not segments:
+                with self._lock:
+                    self._backlog = bool(self._segments())
+                return
+            cursor_segment, offset = self._read_cursor()
+            segment = segments[0]
+            if cursor_segment != segment:
+                offset = 0
+            path = self.directory / self._segment_name(segment)
+
+            with self._lock:
+                active = segment == self._write_segment
+                limit = self._write_offset if active else path.stat().st_size
+
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while offset < limit and not self._stop.is_set():
+                    header = f.read(RECORD_HEADER.size)
+                    length, crc = RECORD_HEADER.unpack(header) if len(header) == RECORD_HEADER.size else (0, None)
+                    payload = f.read(length) if crc is not None else b""
+                    if crc is None or len(payload) < length or zlib.crc32(payload) != crc:
+                        # record เสีย/เขียนไม่ครบ: ข้ามส่วนที่เหลือของ segment
+                        self.corrupt += 1
+                        logger.error(f"Corrupt record in spool segment {segment} at offset {offset} - skipping rest of segment")
+                        offset = limit
+                        break
+                    started = time.perf_counter()
+                    try:
+                        self._replay_fn(json.loads(payload))
+                    except Exception as e:
+                        if is_connection_error(e):
+                            self.mark_unavailable(e)
+                            self._write_cursor(segment, offset)
+                            return
+                        self.replay_errors += 1
+                        logger.error(f"Failed to replay spooled batch (skipped): {e}")
+                    offset += RECORD_HEADER.size + length
+                    self.replayed += 1
+                    if self.replayed % 100 == 0:
+                        self._write_cursor(segment, offset)
+                    elapsed = time.perf_counter() - started
+                    if elapsed < min_gap:
+                        time.sleep(min_gap - elapsed)
+
+            self._write_cursor(segment, offset)
+            if self._stop.is_set():
+                return
+            with self._lock:
+                if segment == self._write_segment:
+                    if offset < self._write_offset:
+                        continue  # มี record ใหม่เขียนเข้ามาระหว่าง replay
+                    # replay ถึงจุดที่เขียนล่าสุด: ปิด segment แล้วกลับไปเขียน DB โดยตรง
+                    self._close_segment()
+                elif offset < path.stat().st_size:
+                    continue  # segment ถูกปิดหลังจากอ่าน limit: ยังมี record ที่เขียนเพิ่ม
+                size = path.stat().st_size
+                path.unlink()
+                self._total_bytes = max(0, self._total_bytes - size)
+                self._write_cursor(segment + 1, 0)
+                if not self._segments():
+                    self._backlog = False
+                    logger.info(f"Scan spool drained ({self.replayed} batches replayed)")
+                    return
+
+    # ---------- metrics ----------
+    def stats(self) -> dict:
+        with self._lock:
+            segments = len(self._segments())
+            total = self._total_bytes
+        if not self.db_available:
+            state = "spooling"
+        elif self._backlog:
+            state = "replaying"
+        else:
+            state = "direct"
+        return {
+            "state": state,
+            "db_available": self.db_available,
+            "backlog_bytes": total,
+            "max_bytes": self.max_bytes,
+            "segments": segments,
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+            "corrupt": self.corrupt,
+            "replay_errors": self.replay_errors,
+            "replay_rate": self.replay_rate,
+            "last_error": self.last_error,
+        }
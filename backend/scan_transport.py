@@ -0,0 +1,284 @@
+"""
+Scan Transport - ช่องทางส่งผลสแกนระหว่าง scanner subprocess กับ API process
+==========================================================================
+
+แทนที่การส่ง dict ผ่าน multiprocessing.Queue (ต้อง pickle ทุกรอบ) ด้วย
+
+1. ReadRing: ring buffer บน shared memory ต่อเครื่อง
+   - record ขนาดคงที่ 1 record ต่อ tag ต่อ window (ดู TagRead)
+   - producer เดียว (subprocess) / consumer เดียว (ingestion intake)
+   - header เก็บ head/tail, จำนวน record ที่ทิ้งเพราะ ring เต็ม,
+     สถานะการเชื่อมต่อของเครื่อง และ Serial Number จริง
+2. ControlChannel: คำสั่ง request/reply ที่มี correlation id
+   ใช้ queue แยกจากผลสแกน ผู้ขอคำสั่งจึงไม่แย่ง message กับ intake
+
+Layout ของ shared memory:
+    [header 64 bytes][record 0][record 1]...[record capacity-1]
+"""
+
+import itertools
+import logging
+import queue
+import struct
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ---------- record ----------
+EPC_MAX_BYTES = 62  # EPC สูงสุด 496 bits
+# first_seen(f64) last_seen(f64) read_count(u16) rssi_peak(i16) rssi_mean(i16)
+# antenna_mask(u8) channel(u8) flags(u8) epc_len(u8) epc(62 bytes) - RSSI หน่วย 0.1 dBm
+RECORD_FORMAT = struct.Struct(f"<ddHhhBBBB{EPC_MAX_BYTES}s")
+RECORD_SIZE = RECORD_FORMAT.size
+
+# ---------- header ----------
+# magic(u32) record_size(u32) capacity(u32) state(u32) head(u64) tail(u64) dropped(u64) sn(24 bytes)
+HEADER_FORMAT = struct.Struct("<IIIIQQQ24s")
+HEADER_SIZE = 64
+RING_MAGIC = 0x52464944  # "RFID"
+
+_OFF_STATE = 12
+_OFF_HEAD = 16
+_OFF_TAIL = 24
+_OFF_DROPPED = 32
+_OFF_SN = 40
+
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+# สถานะการเชื่อมต่อของเครื่องใน header
+STATE_STARTING = 0
+STATE_CONNECTED = 1
+STATE_CONNECTION_FAILED = 2
+STATE_STOPPED = 3
+
+# ผลรวมการอ่าน tag หนึ่งตัวใน window หนึ่ง
+# antenna_mask: bit (ant - 1) = เสาที่อ่านเจอ, channel: channel ของการอ่านครั้งล่าสุด
+# flags: FLAG_KEEPALIVE = tag ที่เคย report แล้ว ส่งมาในรอบ keep-alive summary
+TagRead = namedtuple("TagRead", [
+    "epc", "first_seen", "last_seen", "read_count", "rssi_peak", "rssi_mean", "antenna_mask", "channel", "flags",
+], defaults=(0,))
+
+FLAG_KEEPALIVE = 0x01
+
+class ReadAggregator:
+    """
+    รวมการอ่านดิบของแต่ละ EPC ใน window ปัจจุบัน (ใช้ใน scanner subprocess)
+
+    เก็บเป็น list [first, last, count, peak, rssi_sum, mask, channel] เพื่อให้ add() เร็ว
+    """
+
+    def __init__(self):
+        self._tags = {}
+
+    def __len__(self):
+        return len(self._tags)
+
+    def add(self, epc: bytes, antenna: int, rssi: int, channel: int, ts: float):
+        entry = self._tags.get(epc)
+        if entry is None:
+            self._tags[epc] = [ts, ts, 1, rssi, rssi, 1 << (antenna - 1), channel]
+            return
+        entry[1] = ts
+        entry[2] += 1
+        if rssi > entry[3]:
+            entry[3] = rssi
+        entry[4] += rssi
+        entry[5] |= 1 << (antenna - 1)
+        entry[6] = channel
+
+    def drain(self) -> List[TagRead]:
+        """คืน TagRead ของทุก EPC แล้วเริ่ม window ใหม่"""
+        reads = [
+            TagRead(epc, first, last, min(count, 0xFFFF), peak, int(total / count), mask & 0xFF, channel)
+            for epc, (first, last, count, peak, total, mask, channel) in self._tags.items()
+        ]
+        self._tags = {}
+        return reads
+
+def merge_reads(a: TagRead, b: TagRead) -> TagRead:
+    """รวม TagRead ของ EPC เดียวกันจากหลาย window"""
+    count = a.read_count + b.read_count
+    newer = b if b.last_seen >= a.last_seen else a
+    return TagRead(
+        epc=a.epc,
+        first_seen=min(a.first_seen, b.first_seen),
+        last_seen=newer.last_seen,
+        read_count=count,
+        rssi_peak=max(a.rssi_peak, b.rssi_peak),
+        rssi_mean=int((a.rssi_mean * a.read_count + b.rssi_mean * b.read_count) / count) if count else a.rssi_mean,
+        antenna_mask=a.antenna_mask | b.antenna_mask,
+        channel=newer.channel,
+        flags=a.flags | b.flags,
+    )
+
+class ReadRing:
+    """
+    Ring buffer ของ read record บน multiprocessing.shared_memory
+
+    head นับจำนวน record ที่เขียนทั้งหมด (producer เขียนเท่านั้น)
+    tail นับจำนวน record ที่อ่านแล้ว (consumer เขียนเท่านั้น)
+    ring เต็มเมื่อ head - tail == capacity: record ใหม่จะถูกทิ้งและนับใน dropped
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._buf = shm.buf
+        self.owner = owner
+        magic, record_size, capacity, *_ = HEADER_FORMAT.unpack_from(self._buf, 0)
+        if magic != RING_MAGIC or record_size != RECORD_SIZE:
+            raise ValueError(f"Shared memory {shm.name} is not a scan ring")
+        self.capacity = capacity
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    # ---------- lifecycle ----------
+    @classmethod
+    def create(cls, capacity: int = 8192) -> "ReadRing":
+        """สร้าง ring ใหม่ (ฝั่ง API process เป็นเจ้าของ)"""
+        shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + capacity * RECORD_SIZE)
+        HEADER_FORMAT.pack_into(shm.buf, 0, RING_MAGIC, RECORD_SIZE, capacity, STATE_STARTING, 0, 0, 0, b"")
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "ReadRing":
+        """เปิด ring ที่มีอยู่แล้ว (ฝั่ง subprocess)"""
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            # ป้องกัน resource_tracker ของ subprocess ลบ segment ตอนจบ process (POSIX)
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return cls(shm, owner=False)
+
+    def reset(self):
+        """ล้าง ring ก่อนเริ่ม subprocess ใหม่ (เรียกเมื่อไม่มี producer ทำงานอยู่เท่านั้น)"""
+        HEADER_FORMAT.pack_into(self._buf, 0, RING_MAGIC, RECORD_SIZE, self.capacity, STATE_STARTING, 0, 0, 0, b"")
+
+    def close(self):
+        try:
+            self._buf = None
+            self._shm.close()
+            if self.owner:
+                self._shm.unlink()
+        except Exception as e:
+            logger.debug(f"ReadRing close error: {e}")
+
+    # ---------- header fields ----------
+    def _get_u64(self, offset: int) -> int:
+        return _U64.unpack_from(self._buf, offset)[0]
+
+    def _set_u64(self, offset: int, value: int):
+        _U64.pack_into(self._buf, offset, value)
+
+    @property
+    def state(self) -> int:
+        return _U32.unpack_from(self._buf, _OFF_STATE)[0]
+
+    def set_state(self, state: int, real_sn: Optional[str] = None):
+        if real_sn is not None:
+            struct.pack_into("<24s", self._buf, _OFF_SN, real_sn.encode("ascii", "ignore")[:24])
+        _U32.pack_into(self._buf, _OFF_STATE, state)
+
+    @property
+    def real_sn(self) -> Optional[str]:
+        raw = struct.unpack_from("<24s", self._buf, _OFF_SN)[0].rstrip(b"\x00")
+        return raw.decode("ascii") if raw else None
+
+    @property
+    def dropped(self) -> int:
+        return self._get_u64(_OFF_DROPPED)
+
+    def pending(self) -> int:
+        return self._get_u64(_OFF_HEAD) - self._get_u64(_OFF_TAIL)
+
+    # ---------- producer ----------
+    def push_many(self, records: List[TagRead]) -> int:
+        """
+        เขียน record หลายตัว แล้วเลื่อน head ครั้งเดียว
+
+        Returns:
+            int: จำนวน record ที่เขียนได้ (ที่เหลือถูกนับเป็น dropped)
+        """
+        head = self._get_u64(_OFF_HEAD)
+        tail = self._get_u64(_OFF_TAIL)
+        free = self.capacity - (head - tail)
+        written = 0
+        for r in records:
+            if written >= free:
+                break
+            offset = HEADER_SIZE + ((head + written) % self.capacity) * RECORD_SIZE
+            RECORD_FORMAT.pack_into(
+                self._buf, offset, r.first_seen, r.last_seen, r.read_count, r.rssi_peak, r.rssi_mean,
+                r.antenna_mask, r.channel, r.flags, len(r.epc), r.epc,
+            )
+            written += 1
+        # เขียน record ให้เสร็จก่อนแล้วค่อยประกาศ head ใหม่
+        self._set_u64(_OFF_HEAD, head + written)
+        lost = len(records) - written
+        if lost:
+            self._set_u64(_OFF_DROPPED, self.dropped + lost)
+        return written
+
+    # ---------- consumer ----------
+    def pop_many(self, limit: int = 4096) -> List[TagRead]:
+        """อ่าน record ที่ยังไม่ได้อ่าน สูงสุด limit ตัว"""
+        head = self._get_u64(_OFF_HEAD)
+        tail = self._get_u64(_OFF_TAIL)
+        count = min(head - tail, limit)
+        if count <= 0:
+            return []
+        records = []
+        for i in range(count):
+            offset = HEADER_SIZE + ((tail + i) % self.capacity) * RECORD_SIZE
+            first, last, read_count, peak, mean, mask, channel, flags, length, epc = RECORD_FORMAT.unpack_from(self._buf, offset)
+            records.append(TagRead(epc[:length], first, last, read_count, peak, mean, mask, channel, flags))
+        self._set_u64(_OFF_TAIL, tail + count)
+        return records
+
+class ControlChannel:
+    """
+    Request/reply ระหว่าง API process กับ scanner subprocess
+
+    - ทุกคำขอมี 'id' ไม่ซ้ำกัน และคำตอบต้องมี 'id' เดียวกัน
+    - คำตอบที่ id ไม่ตรง (เช่นค้างจากคำขอที่ timeout ไปแล้ว) จะถูกทิ้ง
+    - คำขอของเครื่องเดียวกันทำทีละรายการ (lock) เพราะใช้ reply queue เดียว
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, cmd_queue, reply_queue):
+        self.cmd_queue = cmd_queue
+        self.reply_queue = reply_queue
+        self._lock = threading.Lock()
+
+    def request(self, message: dict, timeout: float = 8.0) -> dict:
+        """
+        ส่งคำสั่งและรอคำตอบที่ id ตรงกัน
+
+        Raises:
+            TimeoutError: ถ้าไม่ได้รับคำตอบภายใน timeout
+        """
+        request_id = next(self._ids)
+        payload = dict(message, id=request_id)
+        with self._lock:
+            self.cmd_queue.put(payload, timeout=1.0)
+            deadline = time.time() + timeout
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"No reply for {message.get('cmd')} (id={request_id})")
+                try:
+                    reply = self.reply_queue.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if isinstance(reply, dict) and reply.get('id') == request_id:
+                    return reply
+                logger.debug(f"Discarding stale control reply: {reply.get('id') if isinstance(reply, dict) else reply}")
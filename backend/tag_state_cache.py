@@ -0,0 +1,252 @@
+"""
+Tag State Cache - แคชสถานะ tag ใน memory สำหรับ scan pipeline
+=============================================================
+
+เก็บ current_location_id, status และ authorized ของ tag ทุกตัวไว้ใน memory
+เพื่อให้ scan pipeline ตัดสินใจได้โดยไม่ต้อง SELECT จากฐานข้อมูล
+
+หลักการ:
+- warm(): โหลดข้อมูลทั้งหมดตอน startup ด้วย streaming cursor (fetchmany ทีละชุด)
+- write-through: ผู้เขียนตาราง tags ต้องเรียก put()/invalidate() หลัง commit
+- จำกัดจำนวน entry (LRU) และเก็บค่าแบบ packed เพื่อให้รองรับหลายล้าน tag
+- ถ้าโหลดครบและยังไม่เคย evict (complete) การ miss หมายถึง tag ยังไม่มีในระบบ
+  จึงไม่ต้อง SELECT ซ้ำ
+
+การใช้งาน:
+    from tag_state_cache import tag_cache
+
+    state = tag_cache.get(tag_id)         # TagState หรือ None
+    tag_cache.put(tag_id, 1, "in_use", 0) # หลัง commit
+"""
+
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config.database import get_db_connection, POOL_BACKGROUND
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+TagState = namedtuple("TagState", ["current_location_id", "status", "authorized"])
+
+# status ที่รู้จัก - index ใช้เป็นรหัสใน packed value (status ใหม่จะถูกต่อท้ายอัตโนมัติ)
+_STATUS_CODES: List[Optional[str]] = [None, "idle", "available", "in_use", "borrowed", "removed", "maintenance"]
+_STATUS_INDEX: Dict[Optional[str], int] = {s: i for i, s in enumerate(_STATUS_CODES)}
+
+def _tag_key(tag_id: str):
+    """EPC แบบ hex เก็บเป็น bytes (ใช้ memory ครึ่งหนึ่งของ str) ถ้าแปลงไม่ได้ใช้ str เดิม"""
+    try:
+        return bytes.fromhex(tag_id)
+    except (ValueError, TypeError):
+        return tag_id
+
+class TagStateCache:
+    """
+    แคชสถานะ tag แบบ thread-safe พร้อม LRU eviction
+
+    Attributes:
+        max_entries: จำนวน tag สูงสุดที่เก็บได้
+        hits / misses: ตัวนับการค้นหา
+        evictions: จำนวน entry ที่ถูกลบเพราะเกินขนาด
+    """
+
+    def __init__(self, max_entries: int = 2_000_000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[object, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stale = set()  # key ที่ถูก invalidate: ต้องอ่านจาก DB แม้แคชจะ complete
+        self._complete = False
+        self._warming = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---------- packing ----------
+    @staticmethod
+    def _pack(current_location_id, status, authorized) -> int:
+        code = _STATUS_INDEX.get(status)
+        if code is None:
+            with _status_lock:
+                code = _STATUS_INDEX.get(status)
+                if code is None:
+                    _STATUS_CODES.append(status)
+                    code = _STATUS_INDEX[status] = len(_STATUS_CODES) - 1
+        loc = 0 if current_location_id is None else int(current_location_id) + 1
+        return (loc << 9) | (code << 1) | (1 if authorized else 0)
+
+    @staticmethod
+    def _unpack(value: int) -> TagState:
+        loc = value >> 9
+        return TagState(
+            current_location_id=None if loc == 0 else loc - 1,
+            status=_STATUS_CODES[(value >> 1) & 0xFF],
+            authorized=value & 1,
+        )
+
+    def _store(self, key, value: int):
+        """เรียกภายใต้ lock"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._stale.discard(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+            self._complete = False
+
+    # ---------- read ----------
+    def get(self, tag_id: str) -> Optional[TagState]:
+        """คืน TagState ถ้ามีในแคช (None = ไม่ทราบ หรือไม่มี tag นี้ ดู is_known_absent)"""
+        key = _tag_key(tag_id)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return self._unpack(value)
+
+    def is_known_absent(self, tag_id: str) -> bool:
+        """True เมื่อแคชโหลดครบแล้วและไม่มี tag นี้ = tag ยังไม่มีในฐานข้อมูลแน่นอน"""
+        key = _tag_key(tag_id)
+        with self._lock:
+            return self._complete and key not in self._entries and key not in self._stale
+
+    def get_many(self, tag_ids: Iterable[str]) -> Tuple[Dict[str, TagState], List[str], List[str]]:
+        """
+        ค้นหาหลาย tag พร้อมกัน
+
+        Returns:
+            (found, absent, unknown)
+            - found: tag_id -> TagState
+            - absent: tag ที่ทราบแน่ชัดว่ายังไม่มีในระบบ
+            - unknown: tag ที่ต้อง SELECT จากฐานข้อมูล
+        """
+        found: Dict[str, TagState] = {}
+        absent: List[str] = []
+        unknown: List[str] = []
+        with self._lock:
+            complete = self._complete
+            for tid in tag_ids:
+                key = _tag_key(tid)
+                value = self._entries.get(key)
+                if value is None:
+                    self.misses += 1
+                    if complete and key not in self._stale:
+                        absent.append(tid)
+                    else:
+                        unknown.append(tid)
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[tid] = value
+        return {tid: self._unpack(v) for tid, v in found.items()}, absent, unknown
+
+    # ---------- write-through ----------
+    def put(self, tag_id: str, current_location_id, status, authorized):
+        """บันทึกสถานะล่าสุดของ tag (เรียกหลัง commit เท่านั้น)"""
+        value = self._pack(current_location_id, status, authorized)
+        with self._lock:
+            self._store(_tag_key(tag_id), value)
+
+    def update(self, tag_id: str, **fields):
+        """แก้บาง field ของ tag ที่อยู่ในแคช ถ้าไม่มีในแคชจะ invalidate แทน"""
+        key = _tag_key(tag_id)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._stale.add(key)
+                return
+            state = self._unpack(value)._replace(**fields)
+            self._store(key, self._pack(*state))
+
+    def invalidate(self, tag_id: str):
+        """ลบ tag ออกจากแคช - ครั้งถัดไปจะอ่านจากฐานข้อมูล"""
+        key = _tag_key(tag_id)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._stale.add(key)
+
+    def load_rows(self, rows: Iterable[dict]):
+        """เติมแคชจากผล SELECT (ไม่ทับค่าที่ถูก write-through ไปแล้ว)"""
+        with self._lock:
+            for row in rows:
+                key = _tag_key(row["tag_id"])
+                if key in self._entries:
+                    continue
+                self._store(key, self._pack(row.get("current_location_id"), row.get("status"), row.get("authorized")))
+
+    # ---------- warm-up ----------
+    def warm(self, fetch_size: int = 5000) -> int:
+        """
+        โหลดสถานะ tag ทั้งหมดจากฐานข้อมูลด้วย streaming cursor
+
+        Returns:
+            int: จำนวนแถวที่อ่าน
+        """
+        with self._lock:
+            if self._warming:
+                return 0
+            self._warming = True
+            evictions_before = self.evictions
+        loaded = 0
+        conn = cur = None
+        try:
+            conn = get_db_connection(POOL_BACKGROUND)
+            try:
+                cur = conn.cursor(dictionary=True, buffered=False)
+            except TypeError:
+                cur = conn.cursor()
+            cur.execute("SELECT tag_id, current_location_id, status, COALESCE(authorized,0) AS authorized FROM tags")
+            while True:
+                rows = cur.fetchmany(fetch_size)
+                if not rows:
+                    break
+                if not isinstance(rows[0], dict):
+                    rows = [dict(r) for r in rows]
+                self.load_rows(rows)
+                loaded += len(rows)
+            with self._lock:
+                self._complete = self.evictions == evictions_before and loaded <= self.max_entries
+            logger.info(f"Tag state cache warmed: {loaded} tags (complete={self._complete})")
+        except Exception as e:
+            logger.error(f"Tag state cache warm-up failed: {e}")
+        finally:
+            with self._lock:
+                self._warming = False
+            try:
+                if cur:
+                    cur.close()
+                if conn:
+                    conn.close()
+            except Exception:
+                pass
+        return loaded
+
+    def start_warm(self):
+        """warm() ใน background thread เพื่อไม่ให้ startup ค้าง"""
+        thread = threading.Thread(target=self.warm, name="tag-cache-warm", daemon=True)
+        thread.start()
+        return thread
+
+    # ---------- metrics ----------
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "complete": self._complete,
+                "warming": self._warming,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+_status_lock = threading.Lock()
+
+# Global instance
+tag_cache = TagStateCache(max_entries=settings.tag_cache_max_entries)
@@ -1,20 +1,229 @@
 """
 WebSocket Manager - Enhanced Real-time Support with Thread Safety
 ==============================================================
+
+การส่ง broadcast:
+- payload ถูก serialize เป็น JSON ครั้งเดียว แล้วใส่คิวของแต่ละ client (ClientSender) โดยไม่รอการส่ง
+- แต่ละ client มี sender task และคิวจำกัดขนาด (WS_CLIENT_QUEUE_SIZE) ของตัวเอง
+  client ที่ช้าไม่ทำให้ client อื่นหรือ message ถัดไปช้าตาม
+- คิวเต็ม: frame ที่มี coalesce key เดียวกัน (tag_update ของ tag เดียวกัน, heartbeat, device_status ของเครื่องเดียวกัน)
+  ถูกแทนที่ด้วยค่าล่าสุด นอกนั้นทิ้ง frame เก่าสุด - client ที่ถูกทิ้ง frame (ยกเว้น heartbeat) มีช่องว่างใน seq
+  จึงถูกล้างคิวและได้ {"type": "snapshot_required", "reason": "client_queue_overflow"} แทน
+- ส่ง frame เดียวนานเกิน WS_SEND_TIMEOUT: ถือว่า client ค้าง ตัดการเชื่อมต่อ
+- โหมด batch (client ขอด้วย ?batch=1 หรือ {"type": "batching", "enabled": true}):
+  sender รอ WS_BATCH_WINDOW วินาทีหลัง frame แรก แล้วส่งทุกอย่างในคิวเป็น frame เดียว
+  {"type": "batch", "count": n, "messages": [...]} - tag_update ของ tag เดียวกันในช่วงนั้นเหลือค่าล่าสุด (coalesce)
+
+การ resume:
+- ทุก broadcast (ยกเว้น heartbeat) ได้ "seq" เพิ่มขึ้นทีละ 1 และถูกเก็บใน replay ring (WS_REPLAY_SIZE ข้อความล่าสุด)
+  seq นับใหม่เมื่อ server restart - connection_established / heartbeat บอก "epoch" และ "seq" ปัจจุบัน
+- client ที่เชื่อมต่อใหม่ด้วย /ws/realtime?resume=<seq ล่าสุด>&epoch=<epoch> ได้รับเฉพาะข้อความที่พลาด
+  (กรองตาม subscription) ตามด้วย {"type": "resumed", ...} ก่อนข้อความสด
+  ข้อความที่ replay ได้โควตาคิวเพิ่มจาก WS_CLIENT_QUEUE_SIZE (ลดลงเมื่อส่งออกไป) ทุก entry ใน ring จึง replay ได้จริง
+- epoch ไม่ตรง / seq หลุดจาก ring: ได้ {"type": "snapshot_required", ...}
+  แทน client จึงโหลดข้อมูลทั้งหมดใหม่เฉพาะกรณีนี้
 """
 
 import asyncio
 import json
 import logging
+import time
+import uuid
+from itertools import islice
 from typing import List, Dict, Any, Optional, Set
 from fastapi import WebSocket
 from datetime import datetime
 import weakref
 import threading
+from collections import deque
 from fastapi.encoders import jsonable_encoder
+from config.settings import settings
+from ws_subscriptions import SubscriptionIndex
 
 logger = logging.getLogger(__name__)
 
+def coalesce_key(payload: dict):
+    """key สำหรับรวม frame ที่ค้างในคิว (frame ใหม่ที่ key ตรงกันแทนที่ของเก่า) - None = รวมไม่ได้"""
+    if not isinstance(payload, dict):
+        return None
+    payload_type = payload.get("type")
+    if payload_type == "heartbeat":
+        return ("heartbeat",)
+    if payload_type == "tag_update":
+        data = payload.get("data")
+        tag_id = data.get("tag_id") if isinstance(data, dict) else None
+        return ("tag_update", tag_id) if tag_id is not None else None
+    if payload_type == "device_status" and payload.get("device_id") is not None:
+        return ("device_status", payload.get("device_id"))
+    return None
+
+class ClientSender:
+    """
+    คิว outbound ของ client หนึ่งตัว + sender task (ใช้บน event loop ของ manager เท่านั้น)
+
+    Args:
+        websocket: connection ของ client
+        max_queue: จำนวน frame สูงสุดที่ค้างได้
+        send_timeout: เวลาสูงสุดต่อการส่งหนึ่ง frame
+        on_failure: เรียกด้วย websocket เมื่อส่งไม่สำเร็จหรือค้าง
+        batch_window: > 0 = รวม frame ในคิวส่งเป็น frame เดียวทุก batch_window วินาที
+    """
+
+    RATE_INTERVAL = 1.0  # วินาที - ช่วงคำนวณ frames/bytes ต่อวินาที
+
+    def __init__(self, websocket: WebSocket, max_queue: int, send_timeout: float, on_failure,
+                 batch_window: float = 0.0):
+        self.websocket = websocket
+        self.max_queue = max(1, int(max_queue))
+        self.send_timeout = send_timeout
+        self.batch_window = max(0.0, float(batch_window))
+        self._on_failure = on_failure
+        self._frames = deque()  # [key, text]
+        self._keyed = {}        # key -> entry ที่ยังอยู่ในคิว
+        self._live = 0          # จำนวน entry ที่ยังไม่ถูกแทนที่ (entry ที่ถูก coalesce มี text = None)
+        self._reserved = 0      # โควตาเพิ่มจาก max_queue สำหรับข้อความที่ replay (ลดลงเมื่อส่งออกไป)
+        self.needs_resync = False  # ทิ้ง frame ที่ไม่ใช่ heartbeat ไปแล้ว - client ต้องโหลดข้อมูลใหม่
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.resyncs = 0
+        self.max_depth = 0
+        self.messages_sent = 0
+        self.frames_per_sec = 0.0
+        self.bytes_per_sec = 0.0
+        self._rate_started = time.monotonic()
+        self._rate_frames = 0
+        self._rate_bytes = 0
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def offer(self, text: str, key=None) -> bool:
+        """ใส่ frame เข้าคิว (ไม่ block) คืน False ถ้าต้องทิ้ง frame เก่าเพื่อให้มีที่"""
+        if key is not None:
+            old = self._keyed.get(key)
+            if old is not None:
+                # ทิ้งค่าเก่าแล้วส่งค่าใหม่ท้ายคิว - ลำดับ seq ที่ client เห็นจึงไม่ย้อน
+                old[1] = None
+                self._live -= 1
+                self.coalesced += 1
+        accepted = True
+        while self._live >= self.max_queue + self._reserved:
+            old_key, old_text = self._frames.popleft()
+            if old_text is None:
+                continue
+            if old_key is not None:
+                self._keyed.pop(old_key, None)
+            self._live -= 1
+            self.dropped += 1
+            accepted = False
+            if old_key != ("heartbeat",):
+                self.needs_resync = True
+        entry = [key, text]
+        self._frames.append(entry)
+        self._live += 1
+        if key is not None:
+            self._keyed[key] = entry
+        self.max_depth = max(self.max_depth, self._live)
+        self._wake.set()
+        return accepted
+
+    def reserve(self, count: int):
+        """เพิ่มโควตาคิวชั่วคราว count frame (ใช้ตอน replay) - frame เหล่านี้ไม่ทำให้ frame อื่นถูกทิ้ง"""
+        self._reserved += max(0, int(count))
+
+    def reset(self):
+        """ล้างคิวทั้งหมด (ก่อนส่ง snapshot_required - client จะโหลดข้อมูลใหม่อยู่แล้ว)"""
+        self._frames.clear()
+        self._keyed.clear()
+        self._live = 0
+        self._reserved = 0
+        self.needs_resync = False
+
+    async def _run(self):
+        client = getattr(self.websocket, "client", None)
+        try:
+            while True:
+                if not self._frames:
+                    self._wake.clear()
+                    await self._wake.wait()
+                    continue
+                if self.batch_window > 0:
+                    # รวบรวม frame ที่ตามมาภายใน window แล้วส่งทั้งคิวเป็น frame เดียว (JSON ของแต่ละข้อความถูกต่อกันตรง ๆ)
+                    await asyncio.sleep(self.batch_window)
+                    texts = [entry[1] for entry in self._frames if entry[1] is not None]
+                    self._frames.clear()
+                    self._keyed.clear()
+                    self._live = 0
+                    if not texts:
+                        continue
+                    messages = len(texts)
+                    text = '{"type":"batch","count":%d,"messages":[%s]}' % (messages, ",".join(texts))
+                else:
+                    entry = self._frames.popleft()
+                    key, text = entry
+                    if text is None:
+                        continue
+                    self._live -= 1
+                    if key is not None and self._keyed.get(key) is entry:
+                        del self._keyed[key]
+                    messages = 1
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(text), timeout=self.send_timeout)
+                except asyncio.TimeoutError:
+                    logger.warning("WS send timeout to client=%s (%d frames queued) -> disconnecting",
+                                   client, self._live)
+                    self._on_failure(self.websocket)
+                    return
+                except Exception as e:
+                    logger.warning("Error sending WS message to client=%s: %s -> disconnecting", client, e)
+                    self._on_failure(self.websocket)
+                    return
+                self._reserved = max(0, self._reserved - messages)
+                self.sent += 1
+                self.messages_sent += messages
+                self.bytes_sent += len(text)
+                self._rate_frames += 1
+                self._rate_bytes += len(text)
+                self._roll_rates()
+        except asyncio.CancelledError:
+            pass
+
+    def _roll_rates(self):
+        now = time.monotonic()
+        elapsed = now - self._rate_started
+        if elapsed < self.RATE_INTERVAL:
+            return
+        self.frames_per_sec = self._rate_frames / elapsed
+        self.bytes_per_sec = self._rate_bytes / elapsed
+        self._rate_started = now
+        self._rate_frames = 0
+        self._rate_bytes = 0
+
+    def close(self):
+        self.reset()
+        if self._task and not self._task.done() and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    def stats(self) -> dict:
+        self._roll_rates()
+        return {
+            "batch_window": self.batch_window,
+            "queued": self._live,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "messages_sent": self.messages_sent,
+            "bytes_sent": self.bytes_sent,
+            "frames_per_sec": round(self.frames_per_sec, 1),
+            "bytes_per_sec": round(self.bytes_per_sec, 1),
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "resyncs": self.resyncs,
+        }
+
 class WebSocketManager:
     """Enhanced WebSocket Manager with better real-time support and thread safety"""
     
@@ -25,22 +234,45 @@ class WebSocketManager:
         self._bg_task: Optional[asyncio.Task] = None
         self._loop: Optional[asyncio.AbstractEventLoop] = None
         self._running = False
-        self._send_timeout = 5.0  # seconds per client send
+        self._send_timeout = settings.ws_send_timeout  # seconds per client send
+        self._client_queue_size = settings.ws_client_queue_size
+        self._batch_window = settings.ws_batch_window
+        self._epoch = uuid.uuid4().hex[:12]  # เปลี่ยนทุกครั้งที่ server เริ่มใหม่ (seq นับใหม่)
+        self._seq = 0
+        self._replay = deque(maxlen=max(1, settings.ws_replay_size))  # (seq, payload, text, coalesce key)
+        self.resumes = 0
+        self.replayed = 0
+        self.snapshots_required = 0
+        self._senders: Dict[WebSocket, ClientSender] = {}
+        self._subscriptions = SubscriptionIndex()  # topic filter ต่อ client (ไม่สมัคร = รับทุกอย่าง)
         logger.info("WebSocketManager initialized")
 
-    async def connect(self, websocket: WebSocket, client_id: str = None):
-        """เชื่อมต่อ WebSocket"""
+    async def connect(self, websocket: WebSocket, client_id: str = None, topics: Optional[dict] = None,
+                      batch: bool = False, resume_seq: Optional[int] = None, epoch: Optional[str] = None):
+        """
+        เชื่อมต่อ WebSocket (ค่าจาก query string)
+
+        Args:
+            topics: subscription เริ่มต้น
+            batch: ขอโหมด batch
+            resume_seq, epoch: seq ล่าสุดที่ client ได้รับ - ส่งข้อความที่พลาดจาก replay ring ก่อนข้อความสด
+        """
         try:
             # Initialize queue/task on first connection using running loop
             if self._queue is None:
                 self._loop = asyncio.get_running_loop()
                 self._queue = asyncio.Queue()
-                self._bg_task = self._loop.create_task(self._broadcast_loop())
+            # (เริ่มใหม่ด้วย ถ้า task ถูกหยุดไปตอน client ตัวสุดท้ายออก)
+            if self._bg_task is None or self._bg_task.done():
                 self._running = True
+                self._bg_task = self._loop.create_task(self._broadcast_loop())
                 logger.info("WebSocket background task started")
             
             await websocket.accept()
-            self.active_connections.add(websocket)
+            sender = ClientSender(websocket, self._client_queue_size, self._send_timeout, self.disconnect,
+                                  batch_window=self._batch_window if batch else 0.0)
+            sender.start()
+            self._senders[websocket] = sender
             
             if not client_id:
                 client_id = f"client_{len(self.active_connections)}_{datetime.now().strftime('%H%M%S')}"
@@ -50,28 +282,43 @@ class WebSocketManager:
                 'connected_at': datetime.now(),
                 'client_address': websocket.client.host if websocket.client else 'unknown'
             }
+            if topics:
+                self._subscriptions.subscribe(websocket, topics)
             
-            client_address = websocket.client.host if websocket.client else 'unknown'
-            logger.info(f"WebSocket connected (client={client_address}). Total: {len(self.active_connections)}")
-            
-            # ส่งข้อความต้อนรับ
-            await self.send_to_websocket(websocket, {
+            # ข้อความต้อนรับ + ข้อความที่พลาด ใส่คิวก่อนเพิ่มเข้า active_connections (ไม่มี await คั่น)
+            # ข้อความสดจึงตามหลังข้อความที่ replay เสมอ
+            self._offer_direct(sender, {
                 'type': 'connection_established',
                 'client_id': client_id,
                 'message': 'Connected to RFID Management System',
-                'server_time': datetime.now().isoformat()
+                'server_time': datetime.now().isoformat(),
+                'epoch': self._epoch,
+                'seq': self._seq
             })
+            if resume_seq is not None:
+                self._resume(websocket, sender, resume_seq, epoch)
+            self.active_connections.add(websocket)
+            
+            client_address = websocket.client.host if websocket.client else 'unknown'
+            logger.info(f"WebSocket connected (client={client_address}). Total: {len(self.active_connections)}")
                 
         except Exception as e:
             logger.error(f"Failed to connect WebSocket: {e}")
             if websocket in self.active_connections:
                 self.active_connections.discard(websocket)
+            sender = self._senders.pop(websocket, None)
+            if sender:
+                sender.close()
 
     def disconnect(self, websocket: WebSocket):
         """ตัดการเชื่อมต่อ WebSocket"""
         try:
             client = websocket.client if hasattr(websocket, "client") else None
             self.active_connections.discard(websocket)
+            self._subscriptions.remove(websocket)
+            sender = self._senders.pop(websocket, None)
+            if sender:
+                sender.close()
             
             # ลบข้อมูล client
             client_id_to_remove = None
@@ -85,12 +332,7 @@ class WebSocketManager:
             
             logger.info(f"WebSocket disconnected (client={client}). Remaining: {len(self.active_connections)}")
             
-            # หยุด background task ถ้าไม่มี connection
-            if len(self.active_connections) == 0:
-                self._running = False
-                if self._bg_task and not self._bg_task.done():
-                    self._bg_task.cancel()
-                logger.info("WebSocket background task stopped")
+            # background task ทำงานต่อแม้ไม่มี connection เพื่อให้ replay ring มีข้อความช่วงที่ client หลุดครบ
                 
             # Ensure socket closed
             try:
@@ -102,11 +344,89 @@ class WebSocketManager:
         except Exception as e:
             logger.error(f"Error during disconnect: {e}")
 
+    def subscribe(self, websocket: WebSocket, topics: Optional[dict]) -> Dict[str, List[str]]:
+        """ตั้ง subscription ของ client (topics ว่าง/None = รับทุกอย่าง) คืน topic ที่ใช้จริง"""
+        normalized = self._subscriptions.subscribe(websocket, topics)
+        return {dim: sorted(values) for dim, values in normalized.items()}
+
+    def _offer_direct(self, sender: ClientSender, data: Dict[Any, Any]):
+        data['timestamp'] = datetime.now().isoformat()
+        sender.offer(json.dumps(data, ensure_ascii=False, default=str))
+
+    def _resume(self, websocket: WebSocket, sender: ClientSender, last_seq, epoch):
+        """ใส่ข้อความที่ seq > last_seq จาก replay ring เข้าคิวของ client หรือแจ้ง snapshot_required"""
+        self.resumes += 1
+        oldest = self._replay[0][0] if self._replay else self._seq + 1
+        reason = None
+        try:
+            last_seq = int(last_seq)
+        except (TypeError, ValueError):
+            reason = "invalid_seq"
+        if reason is None:
+            if epoch != self._epoch:
+                reason = "server_restarted"
+            elif last_seq > self._seq:
+                reason = "invalid_seq"
+            elif last_seq < oldest - 1:
+                reason = "fell_off_replay_ring"
+        if reason:
+            logger.info(f"WebSocket resume from seq={last_seq} epoch={epoch} -> snapshot required ({reason})")
+            self._require_snapshot(sender, reason)
+            return
+
+        # seq ใน ring ต่อเนื่องกัน: ข้ามไปยังตำแหน่งของ last_seq + 1 ได้เลย
+        missed = [(text, key) for seq, payload, text, key in islice(self._replay, max(0, last_seq + 1 - oldest), None)
+                  if self._subscriptions.match(payload, (websocket,))]
+        # โควตาสำหรับข้อความที่พลาด + resumed - replay จึงไม่ดัน connection_established หรือกันเองออกจากคิว
+        sender.reserve(len(missed) + 1)
+        for text, key in missed:
+            sender.offer(text, key)
+        count = len(missed)
+        self.replayed += count
+        logger.info(f"WebSocket resumed from seq={last_seq} to {self._seq}: replayed {count} messages")
+        self._offer_direct(sender, {
+            'type': 'resumed',
+            'from_seq': last_seq,
+            'seq': self._seq,
+            'count': count,
+            'epoch': self._epoch
+        })
+
+    def _require_snapshot(self, sender: ClientSender, reason: str, reset: bool = False):
+        """แจ้ง client ให้โหลดข้อมูลทั้งหมดใหม่ (reset = ล้างคิวก่อน ใช้เมื่อ client ถูกทิ้ง frame ไปแล้ว)"""
+        self.snapshots_required += 1
+        if reset:
+            sender.reset()
+            sender.resyncs += 1
+        else:
+            sender.reserve(1)
+        self._offer_direct(sender, {
+            'type': 'snapshot_required',
+            'reason': reason,
+            'epoch': self._epoch,
+            'seq': self._seq
+        })
+
+    def set_batching(self, websocket: WebSocket, enabled: bool) -> float:
+        """เปิด/ปิดโหมด batch ของ client คืน window ที่ใช้จริง (0 = ส่งทีละ frame)"""
+        sender = self._senders.get(websocket)
+        if sender is None:
+            return 0.0
+        sender.batch_window = self._batch_window if enabled else 0.0
+        return sender.batch_window
+
+    def get_subscriptions(self, websocket: WebSocket) -> Dict[str, List[str]]:
+        return {dim: sorted(values) for dim, values in self._subscriptions.topics_of(websocket).items()}
+
     async def send_to_websocket(self, websocket: WebSocket, data: Dict[Any, Any]):
-        """ส่งข้อความไปยัง WebSocket เฉพาะตัว"""
+        """ส่งข้อความไปยัง WebSocket เฉพาะตัว (ผ่านคิวของ client ถ้ามี)"""
         try:
             data['timestamp'] = datetime.now().isoformat()
             message = json.dumps(data, ensure_ascii=False, default=str)
+            sender = self._senders.get(websocket)
+            if sender:
+                sender.offer(message)
+                return
             await websocket.send_text(message)
             
         except Exception as e:
@@ -154,39 +474,51 @@ class WebSocketManager:
                     
                     logger.debug("ws_manager: dequeued payload type=%s", payload_type)
 
+                    # ใส่ seq และเก็บเข้า replay ring ก่อน (แม้ไม่มี client) - heartbeat บอกแค่ seq ปัจจุบัน
+                    sequenced = isinstance(payload, dict) and payload_type != "heartbeat"
+                    if isinstance(payload, dict):
+                        if sequenced:
+                            payload = {**payload, "seq": self._seq + 1}
+                        else:
+                            payload = {**payload, "seq": self._seq, "epoch": self._epoch}
+
+                    # serialize ครั้งเดียว แล้วกระจายเข้าคิวของแต่ละ client (ไม่รอการส่ง)
+                    safe_payload = jsonable_encoder(payload)
+                    text = json.dumps(safe_payload, ensure_ascii=False, separators=(",", ":"))
+                    key = coalesce_key(payload)
+                    if sequenced:
+                        # ใช้ seq เมื่อ serialize สำเร็จเท่านั้น - seq ใน ring จึงต่อเนื่องเสมอ (_resume อาศัยข้อนี้)
+                        self._seq += 1
+                        self._replay.append((self._seq, payload, text, key))
+
                     if not self.active_connections:
                         logger.debug("No WS clients, skipping broadcast (type=%s)", payload_type)
                         continue
 
-                    # Make payload JSON-serializable
-                    safe_payload = jsonable_encoder(payload)
-                    text = json.dumps(safe_payload, ensure_ascii=False, separators=(",", ":"))
+                    # กรองตาม subscription - ส่งเฉพาะ client ที่ topic ตรง
+                    recipients = self._subscriptions.match(payload, self.active_connections)
+                    if not recipients:
+                        logger.debug("No subscribed WS clients for payload type=%s", payload_type)
+                        continue
 
-                    disconnected = []
-                    success_count = 0
-                    
-                    # Send to each connection with timeout
-                    for ws in list(self.active_connections):
-                        client = getattr(ws, "client", None)
-                        try:
-                            # Protect per-client send with timeout
-                            await asyncio.wait_for(ws.send_text(text), timeout=self._send_timeout)
-                            success_count += 1
-                        except asyncio.TimeoutError:
-                            logger.warning("WS send timeout to client=%s (type=%s) -> marking disconnected", 
-                                          client, payload_type)
-                            disconnected.append(ws)
-                        except Exception:
-                            logger.exception("Error sending WS message to client=%s (type=%s). will disconnect", 
-                                           client, payload_type)
-                            disconnected.append(ws)
-
-                    # Remove disconnected clients
-                    for ws in disconnected:
-                        self.disconnect(ws)
-
-                    logger.info("Broadcasted payload type=%s to %d clients (%d failed)", 
-                              payload_type, success_count, len(disconnected))
+                    queued = dropped = 0
+                    for ws in recipients:
+                        sender = self._senders.get(ws)
+                        if sender is None:
+                            continue
+                        if sender.offer(text, key):
+                            queued += 1
+                        else:
+                            dropped += 1
+                        if sender.needs_resync:
+                            # seq ที่ client เห็นมีช่องว่างแล้ว - ให้โหลดข้อมูลใหม่แทนการส่งต่อแบบขาดหาย
+                            logger.info("WS client=%s dropped frames -> snapshot required",
+                                        getattr(ws, "client", None))
+                            self._require_snapshot(sender, "client_queue_overflow", reset=True)
+
+                    # client ที่คิวเต็มทิ้ง frame เก่าสุด (ดูได้จาก dropped ใน /api/websocket/status)
+                    logger.debug("Broadcast payload type=%s queued for %d clients (%d dropped old frames)",
+                                 payload_type, queued + dropped, dropped)
                     
                 except asyncio.TimeoutError:
                     # Send heartbeat every 30 seconds during timeout
@@ -272,6 +604,10 @@ class WebSocketManager:
         except Exception:
             logger.exception("Error shutting down ws_manager background task")
         
+        for sender in list(self._senders.values()):
+            sender.close()
+        self._senders.clear()
+
         # Close active connections
         for ws in list(self.active_connections):
             try:
@@ -281,6 +617,7 @@ class WebSocketManager:
         
         self.active_connections.clear()
         self.client_info.clear()
+        self._subscriptions = SubscriptionIndex()
         logger.info("ws_manager shutdown complete")
 
     def get_connection_count(self) -> int:
@@ -291,5 +628,24 @@ class WebSocketManager:
         """ข้อมูล clients ทั้งหมด"""
         return self.client_info.copy()
 
+    def get_sender_stats(self, websocket: WebSocket) -> Optional[dict]:
+        sender = self._senders.get(websocket)
+        return sender.stats() if sender else None
+
+    def get_subscription_stats(self) -> dict:
+        return self._subscriptions.stats()
+
+    def get_replay_stats(self) -> dict:
+        return {
+            "epoch": self._epoch,
+            "seq": self._seq,
+            "oldest_seq": self._replay[0][0] if self._replay else None,
+            "buffered": len(self._replay),
+            "capacity": self._replay.maxlen,
+            "resumes": self.resumes,
+            "replayed": self.replayed,
+            "snapshots_required": self.snapshots_required,
+        }
+
 # Global instance
 manager = WebSocketManager()
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+WebSocket Subscriptions - กรอง broadcast ตาม topic ที่ client สมัครไว้
+=================================================================
+
+เดิมทุก payload (tag_update, notification, heartbeat, device_status) ถูกส่งให้ทุก client
+แท็บเล็ตที่ดูประตูเดียวก็ได้รับผลสแกนจากทุกประตู
+
+หลักการ:
+- topic มี 4 มิติ: location, device, type, priority (ค่าเก็บเป็น string จึง "1" กับ 1 ตรงกัน)
+- client ที่ไม่ได้สมัคร = รับทุกอย่าง (พฤติกรรมเดิม)
+- client ที่สมัคร: มิติที่ไม่ได้ระบุ = ไม่กรองมิตินั้น, มิติที่ระบุ = ต้องตรงอย่างน้อยหนึ่งค่า
+- payload ที่ไม่มีค่าของมิติใด (เช่น heartbeat ไม่มี location) ไม่ถูกกรองด้วยมิตินั้น
+- ดัชนี: มิติ -> ค่า -> set ของ client และ set ของ client ที่ไม่กรองมิตินั้น
+  match() ใช้ union/intersection ของ set จึงไม่ต้องวนตรวจทุก client
+- frame แบบชุด (notifications_batch) ใช้ topic รวมของทุกรายการ - ส่งทั้งชุดถ้ามีรายการที่ตรง
+
+การใช้งาน (จาก client):
+    {"type": "subscribe", "topics": {"location": [1], "type": ["tag_update", "alert"]}}
+    {"type": "unsubscribe"}   # กลับไปรับทุกอย่าง
+"""
+
+from typing import Dict, Iterable, Optional, Set
+
+DIMENSIONS = ("location", "device", "type", "priority")
+
+# frame ควบคุมที่ส่งให้ทุก client เสมอ ไม่ว่าจะสมัคร type อะไรไว้
+ALWAYS_DELIVER = {"heartbeat", "connection_established", "subscribed", "pong"}
+
+_LOCATION_FIELDS = ("location_id", "current_location_id", "to_location_id", "from_location_id")
+
+def normalize_topics(topics: Optional[dict]) -> Dict[str, Set[str]]:
+    """แปลง {"location": [1, 2], "type": "alert"} เป็น {"location": {"1", "2"}, "type": {"alert"}}"""
+    normalized = {}
+    for dim, values in (topics or {}).items():
+        if dim not in DIMENSIONS or values is None:
+            continue
+        if isinstance(values, (str, int)):
+            values = str(values).split(",")
+        values = {str(v).strip() for v in values if v is not None and str(v).strip()}
+        if values:
+            normalized[dim] = values
+    return normalized
+
+def _collect(record: dict, topics: Dict[str, Set[str]]):
+    if not isinstance(record, dict):
+        return
+    for field in _LOCATION_FIELDS:
+        if record.get(field) is not None:
+            topics["location"].add(str(record[field]))
+    if record.get("device_id") is not None:
+        topics["device"].add(str(record["device_id"]))
+    if record.get("priority") is not None:
+        topics["priority"].add(str(record["priority"]))
+
+def payload_topics(payload: dict) -> Dict[str, Set[str]]:
+    """ดึง topic ของ payload (ทั้งระดับบนสุด, data และรายการใน notifications)"""
+    topics = {dim: set() for dim in DIMENSIONS}
+    if not isinstance(payload, dict):
+        return topics
+    if payload.get("type") is not None:
+        topics["type"].add(str(payload["type"]))
+    _collect(payload, topics)
+    _collect(payload.get("data"), topics)
+    for item in payload.get("notifications") or ():
+        _collect(item, topics)
+    return topics
+
+class SubscriptionIndex:
+    """
+    ดัชนี subscription ของ client (ใช้บน event loop ของ ws_manager เท่านั้น ไม่ต้องล็อก)
+    """
+
+    def __init__(self):
+        self._topics: Dict[object, Dict[str, Set[str]]] = {}
+        self._by_value: Dict[str, Dict[str, Set[object]]] = {dim: {} for dim in DIMENSIONS}
+        self._wildcard: Dict[str, Set[object]] = {dim: set() for dim in DIMENSIONS}
+        self.filtered = 0
+        self.delivered = 0
+
+    def subscribe(self, client, topics: Optional[dict]) -> Dict[str, Set[str]]:
+        """แทนที่ subscription ของ client (topics ว่าง = รับทุกอย่าง) คืน topic ที่ normalize แล้ว"""
+        self.remove(client)
+        normalized = normalize_topics(topics)
+        if not normalized:
+            return normalized
+        self._topics[client] = normalized
+        for dim in DIMENSIONS:
+            values = normalized.get(dim)
+            if not values:
+                self._wildcard[dim].add(client)
+                continue
+            for value in values:
+                self._by_value[dim].setdefault(value, set()).add(client)
+        return normalized
+
+    def remove(self, client):
+        topics = self._topics.pop(client, None)
+        if topics is None:
+            return
+        for dim in DIMENSIONS:
+            self._wildcard[dim].discard(client)
+            for value in topics.get(dim, ()):
+                members = self._by_value[dim].get(value)
+                if members is not None:
+                    members.discard(client)
+                    if not members:
+                        del self._by_value[dim][value]
+
+    def topics_of(self, client) -> Dict[str, Set[str]]:
+        return self._topics.get(client, {})
+
+    def match(self, payload: dict, clients: Iterable) -> Set:
+        """client ที่ควรได้รับ payload: client ที่ไม่ได้สมัคร + client ที่ topic ตรง"""
+        clients = set(clients)
+        subscribed = clients.intersection(self._topics)
+        recipients = clients - subscribed
+        if not subscribed:
+            return recipients
+
+        topics = payload_topics(payload)
+        if topics["type"] & ALWAYS_DELIVER:
+            return clients
+
+        candidates = None
+        for dim in DIMENSIONS:
+            values = topics[dim]
+            if not values:
+                continue
+            matched = set(self._wildcard[dim])
+            index = self._by_value[dim]
+            for value in values:
+                matched |= index.get(value, set())
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                break
+        matched_subscribers = subscribed if candidates is None else subscribed & candidates
+        self.delivered += len(matched_subscribers)
+        self.filtered += len(subscribed) - len(matched_subscribers)
+        return recipients | matched_subscribers
+
+    def stats(self) -> dict:
+        return {
+            "subscribed_clients": len(self._topics),
+            "indexed_values": {dim: len(self._by_value[dim]) for dim in DIMENSIONS},
+            "delivered": self.delivered,
+            "filtered": self.filtered,
+        }
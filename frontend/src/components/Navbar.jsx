@@ -62,6 +62,7 @@ export default function Sidebar() {
           data.notif_id || 
           data.id || 
           data.type === 'notification_update' ||
+          data.type === 'notifications_batch' ||
           data.type === 'tag_update' ||
           data.type === 'asset_update' ||
           data.type === 'borrowing_update'
@@ -157,6 +157,26 @@ export default function Notifications() {
           }
         };
 
+        // notification ที่ถูกรวมเป็นชุด (notifications_batch): refresh stats ครั้งเดียวแล้วเพิ่มทั้งชุด
+        if (data && data.type === "notifications_batch" && Array.isArray(data.notifications)) {
+          const currentFilter = filterRef.current;
+          const currentTypeFilter = typeFilterRef.current;
+          const items = data.notifications
+            .map(normalize)
+            .filter((item) => matchesFiltersWithState(item, currentFilter, currentTypeFilter));
+
+          await refreshStatsOnly();
+
+          if (items.length) {
+            setNotifications((prev) => {
+              const known = new Set(prev.map((n) => n.notif_id));
+              const fresh = items.filter((item) => !known.has(item.notif_id)).reverse();
+              return fresh.length ? [...fresh, ...prev] : prev;
+            });
+          }
+          return;
+        }
+
         if (data && (data.notif_id || data.id)) {
           const item = normalize(data);
           console.debug("🔄 Processing notification item:", item);
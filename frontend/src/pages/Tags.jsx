@@ -47,6 +47,9 @@ export default function Tags() {
   const wsRef = useRef(null);
   const reconnectAttempts = useRef(0);
   const shouldReconnect = useRef(true);
+  // seq/epoch ล่าสุดจาก WS - ใช้ resume ตอนเชื่อมต่อใหม่ (รับเฉพาะข้อความที่พลาด ไม่ต้องโหลด tags ใหม่ทั้งหมด)
+  const lastSeq = useRef(null);
+  const wsEpoch = useRef(null);
 
   // add global WS guard name (like Borrowing)
   const GLOBAL_WS_FLAG = "__TAGS_WS_CONNECTED__";
@@ -58,9 +61,13 @@ export default function Tags() {
       const isSecure = base.startsWith("https");
       const host = base.replace(/^https?:\/\//, "").replace(/\/$/, "");
       const proto = isSecure ? "wss" : "ws";
-      return `${proto}://${host}/ws/realtime`;
+      // batch=1: รับข้อความเป็น frame รวม ({type: "batch", messages: [...]}) ทุก ~100ms
+      const resume = lastSeq.current != null && wsEpoch.current
+        ? `&resume=${lastSeq.current}&epoch=${encodeURIComponent(wsEpoch.current)}`
+        : "";
+      return `${proto}://${host}/ws/realtime?batch=1${resume}`;
     } catch (e) {
-      return "ws://localhost:8000/ws/realtime";
+      return "ws://localhost:8000/ws/realtime?batch=1";
     }
   }, []);
 
@@ -82,13 +89,36 @@ export default function Tags() {
       console.info("Tags WS open");
     };
 
-    ws.onmessage = (ev) => {
+    const handleMessage = (data) => {
       try {
-        const data = JSON.parse(ev.data);
         if (!data) return;
 
         console.debug("🔥 Tags WS received:", data);
 
+        // ⭐ ลำดับข้อความ / resume
+        if (data.type === "connection_established") {
+          if (wsEpoch.current == null) {
+            wsEpoch.current = data.epoch;
+            lastSeq.current = data.seq;
+          }
+          return;
+        }
+        if (data.type === "snapshot_required") {
+          // resume ไม่ได้ (server restart, หลุดนานเกินไป หรือคิวของ client ล้นจนข้อความหาย): โหลดทั้งหมดใหม่
+          wsEpoch.current = data.epoch;
+          lastSeq.current = data.seq;
+          loadTags();
+          return;
+        }
+        if (data.type === "resumed") {
+          console.info(`Tags WS resumed: ${data.count} missed messages replayed`);
+          return;
+        }
+        if (typeof data.seq === "number" && data.type !== "heartbeat") {
+          if (lastSeq.current != null && data.seq <= lastSeq.current) return;
+          lastSeq.current = data.seq;
+        }
+
         // ⭐ จัดการ tag_update events (รวมจาก movement)
         if (data.type === "tag_update" || data.tag) {
           const t = data.tag || data;
@@ -124,6 +154,28 @@ export default function Tags() {
           return;
         }
 
+        // ⭐ movement notification ที่ถูกรวมเป็นชุด: ดึงข้อมูลแต่ละ tag ครั้งเดียว
+        if (data.type === "notifications_batch" && Array.isArray(data.notifications)) {
+          const tagIds = new Set(
+            data.notifications
+              .filter((n) => n.type === "movement")
+              .map((n) => n.tag_id || n.message?.match(/Tag\s+([A-F0-9]+)/i)?.[1])
+              .filter(Boolean)
+          );
+          tagIds.forEach((tagId) => {
+            (async () => {
+              try {
+                const res = await api.get(`/api/tags/${encodeURIComponent(tagId)}`);
+                if (res && res.data) upsertTag(res.data, setTags, setFilteredTags);
+              } catch (err) {
+                console.error("❌ Failed to fetch tag after movement:", err);
+              }
+            })();
+          });
+          if (tagIds.size) refreshStats();
+          return;
+        }
+
         // ⭐ จัดการ movement notification events
         if (data.type === "movement" && data.notif_id) {
           console.debug("🚶 Movement notification received:", data);
@@ -158,6 +210,20 @@ export default function Tags() {
           return;
         }
 
+      } catch (e) {
+        console.error("❌ Tags WS handler error", e);
+      }
+    };
+
+    ws.onmessage = (ev) => {
+      try {
+        const data = JSON.parse(ev.data);
+        // frame รวม: ประมวลผลทุกข้อความใน event เดียว (React render ครั้งเดียวต่อ frame)
+        if (data && data.type === "batch" && Array.isArray(data.messages)) {
+          data.messages.forEach(handleMessage);
+        } else {
+          handleMessage(data);
+        }
       } catch (e) {
         console.error("❌ Tags WS parse error", e);
       }
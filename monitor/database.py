@@ -1,6 +1,9 @@
 import mysql.connector
 from datetime import datetime
+from types import MappingProxyType
 import logging
+import threading
+import time
 
 # Database configuration
 DB_CONFIG = {
@@ -19,6 +22,44 @@ def get_db_connection():
         logging.error(f"Database connection error: {err}")
         return None
 
+# ⭐ ข้อมูล locations แบบ snapshot (location_id -> {name, direction}) ใช้แทนการ JOIN locations ทุก query
+LOCATION_CACHE_TTL = 60  # seconds
+_location_snapshot = MappingProxyType({})
+_location_loaded_at = 0.0
+_location_lock = threading.Lock()
+
+def get_location_directory(force=False):
+    """คืน snapshot ของ locations (โหลดใหม่เมื่อเกิน LOCATION_CACHE_TTL หรือ force=True)"""
+    global _location_snapshot, _location_loaded_at
+    if not force and _location_snapshot and time.time() - _location_loaded_at < LOCATION_CACHE_TTL:
+        return _location_snapshot
+    with _location_lock:
+        if not force and _location_snapshot and time.time() - _location_loaded_at < LOCATION_CACHE_TTL:
+            return _location_snapshot
+        conn = get_db_connection()
+        if not conn:
+            return _location_snapshot
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT location_id, name, direction FROM locations ORDER BY location_id")
+            rows = cursor.fetchall()
+            cursor.close()
+            # สลับทั้งก้อน - ผู้อ่านที่ถือ snapshot เดิมอยู่ไม่ได้รับผลกระทบ
+            _location_snapshot = MappingProxyType({
+                row['location_id']: {'name': row['name'], 'direction': row['direction'] or 'gate'}
+                for row in rows
+            })
+            _location_loaded_at = time.time()
+        except Exception as e:
+            logging.error(f"Error loading locations: {e}")
+        finally:
+            conn.close()
+        return _location_snapshot
+
+def _location_name(locations, location_id):
+    info = locations.get(location_id)
+    return info['name'] if info else None
+
 def test_database_connection():
     """ทดสอบการเชื่อมต่อฐานข้อมูล"""
     try:
@@ -50,11 +91,9 @@ def get_recent_scanned_tags(limit=10):
             t.status,
             t.current_location_id,
             t.asset_id,
-            a.name as asset_name,
-            l.name as location_name
+            a.name as asset_name
         FROM tags t
         LEFT JOIN assets a ON t.asset_id = a.asset_id
-        LEFT JOIN locations l ON t.current_location_id = l.location_id
         ORDER BY t.last_seen DESC
         LIMIT %s
         """
@@ -66,6 +105,7 @@ def get_recent_scanned_tags(limit=10):
         conn.close()
         
         # แปลงเป็นรูปแบบที่ต้องการ
+        locations = get_location_directory()
         formatted_results = []
         for row in results:
             formatted_results.append({
@@ -74,7 +114,7 @@ def get_recent_scanned_tags(limit=10):
                 'last_seen': row['last_seen'],
                 'status': row['status'],
                 'current_location_id': row['current_location_id'],
-                'location_name': row['location_name'] or f"Location {row['current_location_id']}",
+                'location_name': _location_name(locations, row['current_location_id']) or f"Location {row['current_location_id']}",
                 'asset_id': row['asset_id']
             })
         
@@ -87,31 +127,9 @@ def get_recent_scanned_tags(limit=10):
         return []
 
 def get_locations():
-    """ดึงรายการ locations ทั้งหมด"""
-    conn = get_db_connection()
-    if not conn:
-        return []
-    
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT location_id, name FROM locations ORDER BY location_id")
-        results = cursor.fetchall()
-        
-        locations = []
-        for row in results:
-            locations.append({
-                'location_id': row[0],
-                'name': row[1]
-            })
-        
-        cursor.close()
-        conn.close()
-        return locations
-        
-    except Exception as e:
-        logging.error(f"Error fetching locations: {e}")
-        conn.close()
-        return []
+    """ดึงรายการ locations ทั้งหมด (โหลดใหม่จากฐานข้อมูลทุกครั้งที่เรียก)"""
+    locations = get_location_directory(force=True)
+    return [{'location_id': loc, 'name': info['name']} for loc, info in locations.items()]
 
 def get_tag_movements(tag_id, limit=5):
     """ดึงประวัติการเคลื่อนไหวของ tag"""
@@ -126,13 +144,9 @@ def get_tag_movements(tag_id, limit=5):
             m.timestamp,
             m.event_type,
             m.from_location_id,
-            l1.name as from_location_name,
             m.to_location_id,
-            l2.name as to_location_name,
             m.operator
         FROM movements m
-        LEFT JOIN locations l1 ON m.from_location_id = l1.location_id
-        LEFT JOIN locations l2 ON m.to_location_id = l2.location_id
         WHERE m.tag_id = %s
         ORDER BY m.timestamp DESC
         LIMIT %s
@@ -140,16 +154,17 @@ def get_tag_movements(tag_id, limit=5):
         cursor.execute(query, (tag_id, limit))
         results = cursor.fetchall()
         
+        locations = get_location_directory()
         movements = []
         for row in results:
             movement = {
                 'timestamp': row[0],
                 'event_type': row[1],
                 'from_location_id': row[2],
-                'from_location_name': row[3],
-                'to_location_id': row[4],
-                'to_location_name': row[5],
-                'operator': row[6]
+                'from_location_name': _location_name(locations, row[2]),
+                'to_location_id': row[3],
+                'to_location_name': _location_name(locations, row[3]),
+                'operator': row[4]
             }
             movements.append(movement)
         
@@ -172,30 +187,35 @@ def get_recent_scanned_tags_by_location(location_id, limit=10):
         cursor = conn.cursor(dictionary=True)
         
         # ⭐ ดึงข้อมูลจาก tags table และแสดงการเข้าออกตาม current_location_id
-        query = """
+        # location นอกพื้นที่ / ทิศทางของเครื่องอ่านมาจาก snapshot แทนการ JOIN locations สองครั้ง
+        locations = get_location_directory()
+        outside_ids = [loc for loc, info in locations.items() if info['direction'] == 'out']
+        reader = locations.get(location_id)
+        include_outside = bool(outside_ids) and reader is not None and reader['direction'] in ('gate', 'both')
+
+        where = "t.current_location_id = %s"
+        params = [location_id]
+        if include_outside:
+            where += f" OR t.current_location_id IN ({', '.join(['%s'] * len(outside_ids))})"
+            params.extend(outside_ids)
+
+        query = f"""
         SELECT 
             t.tag_id,
             t.last_seen,
             t.status,
             t.current_location_id,
             t.asset_id,
-            a.name as asset_name,
-            l.name as location_name,
-            CASE 
-                WHEN t.current_location_id = %s THEN 'เข้า'
-                WHEN t.current_location_id = 3 THEN 'ออก'
-                ELSE 'เคลื่อนไหว'
-            END as movement_status
+            a.name as asset_name
         FROM tags t
         LEFT JOIN assets a ON t.asset_id = a.asset_id
-        LEFT JOIN locations l ON t.current_location_id = l.location_id
-        WHERE (t.current_location_id = %s OR 
-               (t.current_location_id = 3 AND %s IN (1, 2)))
+        WHERE {where}
         ORDER BY t.last_seen DESC
         LIMIT %s
         """
+        params.append(limit)
         
-        cursor.execute(query, (location_id, location_id, location_id, limit))
+        cursor.execute(query, tuple(params))
         results = cursor.fetchall()
         
         cursor.close()
@@ -204,12 +224,19 @@ def get_recent_scanned_tags_by_location(location_id, limit=10):
         # ⭐ แปลงเป็นรูปแบบที่ monitor ต้องการ
         formatted_results = []
         for row in results:
+            current = row['current_location_id']
+            if current == location_id:
+                movement_status = 'เข้า'
+            elif current in outside_ids:
+                movement_status = 'ออก'
+            else:
+                movement_status = 'เคลื่อนไหว'
             formatted_results.append({
                 'tag_id': row['tag_id'],
                 'asset_name': row['asset_name'] or 'ไม่ได้ผูก',
                 'last_seen': row['last_seen'],
-                'status': row['movement_status'],  # เข้า หรือ ออก
-                'current_location_id': row['current_location_id'],
+                'status': movement_status,  # เข้า หรือ ออก
+                'current_location_id': current,
                 'asset_id': row['asset_id']
             })
         